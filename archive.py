@@ -0,0 +1,80 @@
+import argparse
+import time
+from datetime import datetime, timedelta
+
+import database
+from database import run_with_retry, COMPLETION_DATE_ISO, ARCHIVE_REQUEST_COLUMNS, ARCHIVE_COMMENT_COLUMNS
+
+# Заявки в статусе "Готова к выдаче" старше стольких дней переносятся в архив
+ARCHIVE_AFTER_DAYS = 180
+# Размер пачки и пауза между пачками: каждая пачка - короткая транзакция,
+# в паузах рабочие места успевают получить блокировку БД
+ARCHIVE_BATCH_SIZE = 500
+ARCHIVE_BATCH_PAUSE = 0.2
+
+
+def archive_batch(cutoff: str, batch_size: int) -> int:
+    """Переносит одну пачку заявок (вместе с комментариями) в архив; возвращает их число"""
+    def move(conn):
+        ids = [row[0] for row in conn.execute(f"""
+            SELECT IDrequest FROM requests
+            WHERE CAST(requestStatusID AS INTEGER) = 2
+              AND completionDate IS NOT NULL AND completionDate != ''
+              AND {COMPLETION_DATE_ISO} < ?
+            LIMIT ?
+        """, (cutoff, batch_size))]
+        if not ids:
+            return 0
+
+        placeholders = ", ".join("?" * len(ids))
+        requests_columns = ", ".join(ARCHIVE_REQUEST_COLUMNS)
+        comments_columns = ", ".join(ARCHIVE_COMMENT_COLUMNS)
+        conn.execute(f"""
+            INSERT INTO requests_archive ({requests_columns})
+            SELECT {requests_columns} FROM requests WHERE IDrequest IN ({placeholders})
+        """, ids)
+        conn.execute(f"""
+            INSERT INTO comments_archive ({comments_columns})
+            SELECT {comments_columns} FROM comments WHERE requestID IN ({placeholders})
+        """, ids)
+        conn.execute(f"DELETE FROM comments WHERE requestID IN ({placeholders})", ids)
+        conn.execute(f"DELETE FROM requests WHERE IDrequest IN ({placeholders})", ids)
+        return len(ids)
+
+    return run_with_retry(move, write=True)
+
+
+def archive_completed_requests(days: int = ARCHIVE_AFTER_DAYS, batch_size: int = ARCHIVE_BATCH_SIZE,
+                               pause: float = ARCHIVE_BATCH_PAUSE) -> int:
+    """Переносит в архив заявки, выполненные более days дней назад; возвращает их число"""
+    cutoff = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
+    print(f"📦 Архивация заявок, выполненных до {cutoff}...")
+
+    total = 0
+    started = time.perf_counter()
+    while True:
+        moved = archive_batch(cutoff, batch_size)
+        total += moved
+        if moved < batch_size:
+            break
+        print(f"  перенесено {total}...")
+        time.sleep(pause)
+
+    print(f"✅ Перенесено в архив заявок: {total} за {time.perf_counter() - started:.1f} с")
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Перенос выполненных заявок в архив")
+    parser.add_argument('--days', type=int, default=ARCHIVE_AFTER_DAYS,
+                        help="архивировать заявки, выполненные более N дней назад")
+    parser.add_argument('--batch', type=int, default=ARCHIVE_BATCH_SIZE, help="заявок в одной транзакции")
+    parser.add_argument('--db', default=database.DB_PATH, help="путь к файлу БД")
+    args = parser.parse_args()
+
+    database.DB_PATH = args.db
+    archive_completed_requests(args.days, args.batch)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+import http.client
+import json
+from concurrent.futures import Future, ThreadPoolExecutor
+import sqlite3
+import urllib.error
+import urllib.request
+from typing import Optional
+
+import database
+from config import load_config
+from database import DatabaseManager
+from records import RequestRecord
+from replica import MasterReplica
+
+# Методы, доступные через бэкенд (одинаковые для локального и HTTP режима)
+READ_METHODS = ('authenticate', 'get_role_requests', 'get_reference_data', 'get_user',
+                'get_masters', 'get_request_comments', 'get_request_timeline', 'get_transitions',
+                'get_parts_usage', 'get_users_since', 'get_overdue_requests', 'get_daily_stats',
+                'get_sla_deadlines', 'get_master_changes', 'get_model_counts')
+WRITE_METHODS = ('create_request', 'create_requests', 'apply_writes', 'set_sla_deadline',
+                 'apply_master_changes')
+
+
+class LocalBackend:
+    """Работа напрямую с файлом БД через DatabaseManager"""
+
+    def call(self, method: str, **params):
+        if method not in READ_METHODS and method not in WRITE_METHODS:
+            raise ValueError(f"Неизвестный метод: {method}")
+        return getattr(DatabaseManager, method)(**params)
+
+    def batch(self, calls: list) -> list:
+        """Выполняет несколько вызовов [(метод, параметры), ...]"""
+        return [self.call(method, **params) for method, params in calls]
+
+    def __getattr__(self, method):
+        if method in READ_METHODS or method in WRITE_METHODS:
+            return lambda **params: self.call(method, **params)
+        raise AttributeError(method)
+
+
+class ServerUnavailable(sqlite3.OperationalError):
+    """
+    Сервер не ответил (нет связи, таймаут, ответ 5xx). В отличие от ошибки,
+    пришедшей в ответе сервера, изменение не отклонено и его можно повторить.
+    """
+
+
+class HttpBackend(LocalBackend):
+    """
+    Работа через сервер server.py.
+    Ошибки сервера превращаются в исключения sqlite3 с тем же текстом,
+    поэтому вызывающий код обрабатывает их так же, как в локальном режиме.
+    """
+
+    def __init__(self, url: str, timeout: float = 10):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+
+    def post(self, path: str, payload):
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        request = urllib.request.Request(f"{self.url}{path}", data=data,
+                                         headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read().decode('utf-8'))
+        except urllib.error.HTTPError as e:
+            if e.code >= 500:
+                raise ServerUnavailable(f"Сервер недоступен: {e}")
+            # 4xx: сервер отклонил сам запрос (неизвестный метод, некорректные параметры),
+            # повтор не поможет
+            raise ValueError(f"Сервер отклонил запрос ({e.code}): {self.error_message(e)}")
+        except (urllib.error.URLError, TimeoutError, ConnectionError, http.client.HTTPException) as e:
+            # Нет соединения, таймаут, обрыв соединения или ответа
+            raise ServerUnavailable(f"Сервер недоступен: {e}")
+
+    @staticmethod
+    def error_message(error: urllib.error.HTTPError) -> str:
+        """Текст ошибки из JSON-ответа сервера (или стандартное описание кода)"""
+        try:
+            return json.loads(error.read().decode('utf-8'))['error']
+        except (OSError, ValueError, KeyError, TypeError):
+            return error.reason
+
+    @staticmethod
+    def unpack(answer):
+        """Возвращает результат вызова или поднимает исключение из ответа сервера"""
+        if 'error' in answer:
+            error_class = getattr(sqlite3, answer.get('kind', ''), None)
+            if not (isinstance(error_class, type) and issubclass(error_class, sqlite3.Error)):
+                error_class = sqlite3.DatabaseError
+            raise error_class(answer['error'])
+        return answer['result']
+
+    @staticmethod
+    def convert(method, result):
+        """Восстанавливает записи заявок из списков, пришедших от сервера"""
+        if method == 'get_role_requests':
+            return [RequestRecord.from_row(row) for row in result]
+        return result
+
+    def call(self, method: str, **params):
+        return self.convert(method, self.unpack(self.post(f"/api/{method}", params)))
+
+    def batch(self, calls: list) -> list:
+        answers = self.post("/api/batch", {'calls': [{'method': method, 'params': params}
+                                                     for method, params in calls]})
+        return [self.convert(method, self.unpack(answer)) for (method, _), answer in zip(calls, answers['results'])]
+
+
+class OfflineBackend(LocalBackend):
+    """
+    Мастер без связи: чтение из локальной реплики (database.DB_PATH указывает на нее),
+    изменения статусов - в реплику и очередь на отправку. Остальные изменения
+    недоступны до появления связи. sync() отправляет и получает изменения через сервер.
+    """
+
+    def __init__(self, replica_path: str, url: str, timeout: float = 10):
+        self.replica = MasterReplica(replica_path)
+        self.central = HttpBackend(url, timeout)
+
+    def call(self, method: str, **params):
+        if method == 'apply_writes':
+            return self.replica.record_writes(params['writes'])
+        if method in WRITE_METHODS:
+            raise sqlite3.OperationalError("Операция недоступна без связи с центральной БД")
+        return super().call(method, **params)
+
+    def sync(self) -> dict:
+        return self.replica.sync(self.central)
+
+
+_backend = None
+
+
+def get_backend():
+    """Возвращает бэкенд, выбранный в settings.ini (создается один раз)"""
+    global _backend
+    if _backend is None:
+        config = load_config()
+        if config.get('backend', 'mode') == 'http':
+            _backend = HttpBackend(config.get('backend', 'url'), config.getfloat('backend', 'timeout'))
+            print(f"🌐 Работа через сервер: {_backend.url}")
+        elif config.get('backend', 'mode') == 'offline':
+            database.DB_PATH = config.get('backend', 'replica')
+            _backend = OfflineBackend(database.DB_PATH, config.get('backend', 'url'),
+                                      config.getfloat('backend', 'timeout'))
+            print(f"📴 Работа без связи: реплика {database.DB_PATH}, синхронизация через {_backend.central.url}")
+        else:
+            _backend = LocalBackend()
+    return _backend
+
+
+def set_backend(backend: Optional[LocalBackend]):
+    """Подменяет бэкенд (например, для нагрузочного теста)"""
+    global _backend
+    _backend = backend
+
+
+# Фоновый поток для предварительной загрузки данных при входе
+_prefetch_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
+
+
+def prefetch_role_data(role_id: int, user_id: int) -> Future:
+    """
+    Начинает в фоне загрузку справочников и заявок роли.
+    Результат Future: {'reference': ..., 'requests': [RequestRecord, ...]}.
+    """
+    def load():
+        reference, requests = get_backend().batch([
+            ('get_reference_data', {}),
+            ('get_role_requests', {'role_id': role_id, 'user_id': user_id}),
+        ])
+        return {'reference': reference, 'requests': requests}
+
+    return _prefetch_executor.submit(load)
@@ -0,0 +1,174 @@
+import argparse
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+import database
+from database import connect, run_with_retry
+
+# Каталог снимков и сколько последних снимков хранить
+BACKUP_DIR = "backups"
+KEEP_SNAPSHOTS = 14
+# Страниц за один шаг копирования и пауза между шагами: между шагами
+# блокировка БД отпускается, и рабочие места продолжают работать
+BACKUP_PAGES_PER_STEP = 1024
+BACKUP_STEP_PAUSE = 0.005
+
+# Сколько раз копирование может начаться заново из-за записи в БД, прежде чем
+# копия будет сделана одним чтением через VACUUM INTO
+MAX_BACKUP_RESTARTS = 3
+
+# Файл с отметкой последнего снимка (для пропуска, если БД не менялась)
+STATE_FILE = "last_snapshot.json"
+
+
+class BackupRestarted(sqlite3.OperationalError):
+    """Пошаговое копирование слишком часто начиналось заново из-за записи в БД"""
+
+
+def get_change_stamp(db_path: str) -> list:
+    """
+    Отметка изменений БД: версия схемы и счетчик изменений данных (data_changes,
+    ведется триггерами). Оба значения хранятся в самой БД и читаются в одной транзакции.
+    """
+    def load(conn):
+        conn.execute("BEGIN")
+        stamp = [conn.execute("PRAGMA schema_version").fetchone()[0],
+                 conn.execute("SELECT counter FROM data_changes WHERE id = 1").fetchone()[0]]
+        conn.execute("COMMIT")
+        return stamp
+    return run_with_retry(load, db_path=db_path)
+
+
+def backup_database(target_path: str, db_path: str = None,
+                    pages: int = BACKUP_PAGES_PER_STEP, pause: float = BACKUP_STEP_PAUSE) -> dict:
+    """
+    Копирует работающую БД через онлайн-бэкап SQLite небольшими шагами
+    и проверяет целостность копии. Возвращает статистику копирования.
+
+    Запись в БД другим соединением заставляет бэкап начать копирование заново.
+    После MAX_BACKUP_RESTARTS таких перезапусков копия делается через VACUUM INTO:
+    одно чтение в своей транзакции, которое записи не прерывают.
+    """
+    db_path = db_path or database.DB_PATH
+    temp_path = target_path + ".part"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+
+    source = connect(db_path)
+    steps = [0]
+    restarts = [0]
+    last_remaining = [None]
+
+    def progress(status, remaining, total):
+        steps[0] += 1
+        # Осталось больше страниц, чем после прошлого шага: копирование началось заново
+        if last_remaining[0] is not None and remaining > last_remaining[0]:
+            restarts[0] += 1
+            if restarts[0] > MAX_BACKUP_RESTARTS:
+                raise BackupRestarted(f"копирование начиналось заново {restarts[0]} раз")
+        last_remaining[0] = remaining
+
+    method = 'backup'
+    started = time.perf_counter()
+    try:
+        target = sqlite3.connect(temp_path)
+        try:
+            source.backup(target, pages=pages, progress=progress, sleep=pause)
+        except BackupRestarted as e:
+            print(f"⚠️ БД постоянно меняется ({e}), копирую через VACUUM INTO")
+            target.close()
+            os.remove(temp_path)
+            source.execute("VACUUM INTO ?", (temp_path,))
+            target = sqlite3.connect(temp_path)
+            method = 'vacuum_into'
+        try:
+            page_size = target.execute("PRAGMA page_size").fetchone()[0]
+            page_count = target.execute("PRAGMA page_count").fetchone()[0]
+            check = target.execute("PRAGMA quick_check").fetchone()[0]
+        finally:
+            target.close()
+    finally:
+        source.close()
+    elapsed = time.perf_counter() - started
+
+    if check != 'ok':
+        os.remove(temp_path)
+        raise sqlite3.DatabaseError(f"Копия не прошла проверку целостности: {check}")
+
+    # Готовый файл появляется только после успешной проверки
+    os.replace(temp_path, target_path)
+    size = page_size * page_count
+    stats = {
+        'path': target_path,
+        'bytes': size,
+        'seconds': round(elapsed, 3),
+        'steps': steps[0],
+        'restarts': restarts[0],
+        'method': method,
+        'mb_per_second': round(size / 1024 / 1024 / elapsed, 1) if elapsed else None,
+        'integrity': check,
+    }
+    print(f"💾 Резервная копия {target_path}: {size / 1024 / 1024:.1f} МБ за {elapsed:.2f} с "
+          f"({stats['mb_per_second']} МБ/с, шагов {steps[0]}, перезапусков {restarts[0]}), проверка: {check}")
+    return stats
+
+
+def take_snapshot(backup_dir: str = BACKUP_DIR, keep: int = KEEP_SNAPSHOTS, db_path: str = None,
+                  force: bool = False):
+    """
+    Делает снимок БД в backup_dir, если с прошлого снимка были изменения,
+    и удаляет старые снимки сверх keep. Возвращает статистику или None.
+    """
+    db_path = db_path or database.DB_PATH
+    os.makedirs(backup_dir, exist_ok=True)
+    state_path = os.path.join(backup_dir, STATE_FILE)
+
+    stamp = get_change_stamp(db_path)
+    if not force and os.path.exists(state_path):
+        with open(state_path, encoding='utf-8') as state_file:
+            if json.load(state_file).get('stamp') == stamp:
+                print("💾 БД не менялась с прошлого снимка, снимок пропущен")
+                return None
+
+    name = f"uchet_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db"
+    stats = backup_database(os.path.join(backup_dir, name), db_path)
+    with open(state_path, 'w', encoding='utf-8') as state_file:
+        json.dump({'stamp': stamp, 'snapshot': name}, state_file)
+
+    snapshots = sorted(f for f in os.listdir(backup_dir) if f.startswith("uchet_") and f.endswith(".db"))
+    for old_name in snapshots[:-keep]:
+        os.remove(os.path.join(backup_dir, old_name))
+        print(f"🗑️ Удален старый снимок {old_name}")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Резервное копирование БД без остановки программы")
+    parser.add_argument('--db', default=database.DB_PATH, help="путь к файлу БД")
+    parser.add_argument('--to', help="сделать одну копию в указанный файл")
+    parser.add_argument('--dir', default=BACKUP_DIR, help="каталог снимков")
+    parser.add_argument('--keep', type=int, default=KEEP_SNAPSHOTS, help="сколько снимков хранить")
+    parser.add_argument('--every', type=float, metavar='MINUTES', help="делать снимки по расписанию")
+    parser.add_argument('--force', action='store_true', help="снимок даже без изменений в БД")
+    args = parser.parse_args()
+
+    database.DB_PATH = args.db
+    if args.to:
+        backup_database(args.to)
+        return
+
+    while True:
+        try:
+            take_snapshot(args.dir, args.keep, force=args.force)
+        except (sqlite3.Error, OSError) as e:
+            print(f"❌ Ошибка резервного копирования: {e}")
+        if not args.every:
+            break
+        time.sleep(args.every * 60)
+
+
+if __name__ == '__main__':
+    main()
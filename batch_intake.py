@@ -0,0 +1,101 @@
+import argparse
+import csv
+import sys
+import time
+from datetime import datetime
+
+import database
+from backend import LocalBackend
+from client_search import CLIENT_TYPE_ID
+
+# Обязательные столбцы файла (формат requests.csv); остальные столбцы необязательны.
+# IDrequest, статус, дата завершения, запчасти и мастер из файла не берутся:
+# заявки создаются как новые
+REQUIRED_COLUMNS = ('orgTechTypeID', 'orgTechModel', 'problemDescryption', 'clientID')
+DATE_FORMAT = "%d.%m.%Y"
+
+
+def parse_intake_file(csv_file, tech_types, client_ids) -> tuple:
+    """
+    Читает заявки из CSV в формате requests.csv (разделитель ';', первая строка - заголовок)
+    и проверяет их по справочникам: tech_types - ID типов техники, client_ids - ID заказчиков.
+    Возвращает (строки для DatabaseManager.create_requests, ошибки [(номер строки, текст)]).
+    Ошибочные строки пропускаются, остальные загружаются.
+    """
+    reader = csv.reader(csv_file, delimiter=';')
+    header = [name.strip() for name in next(reader, [])]
+    missing = [name for name in REQUIRED_COLUMNS if name not in header]
+    if missing:
+        return [], [(1, f"нет столбцов: {', '.join(missing)}")]
+    column = {name: index for index, name in enumerate(header)}
+    today = datetime.now().strftime(DATE_FORMAT)
+
+    rows, errors = [], []
+    for line_number, values in enumerate(reader, 2):
+        if not any(value.strip() for value in values):
+            continue
+        values += [''] * (len(header) - len(values))
+        get = lambda name: values[column[name]].strip() if name in column else ''
+
+        problems = []
+        tech_type = get('orgTechTypeID')
+        if not tech_type.isdigit() or int(tech_type) not in tech_types:
+            problems.append(f"неизвестный тип техники '{tech_type}'")
+        client = get('clientID')
+        if not client.isdigit() or int(client) not in client_ids:
+            problems.append(f"неизвестный заказчик '{client}'")
+        if not get('orgTechModel'):
+            problems.append("не указана модель")
+        if not get('problemDescryption'):
+            problems.append("не указано описание проблемы")
+        start_date = get('startDate') or today
+        try:
+            # В БД дата хранится строго как дд.мм.гггг (по ней построены выражения и индексы
+            # дат), поэтому '1.2.2024' записывается как '01.02.2024'
+            start_date = datetime.strptime(start_date, DATE_FORMAT).strftime(DATE_FORMAT)
+        except ValueError:
+            problems.append(f"дата приема '{start_date}' не в формате дд.мм.гггг")
+
+        if problems:
+            errors.append((line_number, "; ".join(problems)))
+            continue
+        rows.append([start_date, int(tech_type), get('orgTechModel'), get('problemDescryption'), int(client)])
+    return rows, errors
+
+
+def load_reference(backend) -> tuple:
+    """ID типов техники и заказчиков из справочников бэкенда"""
+    reference = backend.get_reference_data()
+    tech_types = {type_id for type_id, name in reference['tech_types']}
+    client_ids = {user[0] for user in reference['users'] if user[3] == CLIENT_TYPE_ID}
+    return tech_types, client_ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пакетный прием заявок из CSV в формате requests.csv")
+    parser.add_argument('file', help="файл CSV (разделитель ';', первая строка - заголовок)")
+    parser.add_argument('--db', default=database.DB_PATH, help="путь к файлу БД")
+    parser.add_argument('--check', action='store_true', help="только проверить файл, не загружая заявки")
+    args = parser.parse_args()
+
+    database.DB_PATH = args.db
+    backend = LocalBackend()
+    tech_types, client_ids = load_reference(backend)
+    with open(args.file, encoding='utf-8-sig', newline='') as csv_file:
+        rows, errors = parse_intake_file(csv_file, tech_types, client_ids)
+    for line_number, message in errors:
+        print(f"⚠️ Строка {line_number}: {message}", file=sys.stderr)
+    if args.check:
+        print(f"✅ К загрузке: {len(rows)} заявок, ошибок: {len(errors)}")
+        return
+
+    started = time.perf_counter()
+    request_ids = backend.create_requests(rows=rows)
+    print(f"✅ Принято заявок: {len(request_ids)} за {time.perf_counter() - started:.2f} с, "
+          f"пропущено строк с ошибками: {len(errors)}")
+    if request_ids:
+        print(f"   Номера заявок: {request_ids[0]}-{request_ids[-1]}")
+
+
+if __name__ == '__main__':
+    main()
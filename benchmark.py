@@ -0,0 +1,129 @@
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import time
+
+import database
+from database import DatabaseManager, PERFORMANCE_PROFILES
+from query_cache import role_query_cache
+from sample_data import generate_database
+
+# Объем тестовой БД и число операций каждого вида на профиль
+DEFAULT_REQUESTS = 100000
+DEFAULT_CLIENTS = 20000
+DEFAULT_READS = 300
+DEFAULT_WRITES = 200
+
+
+def sample_ids(db_path: str) -> dict:
+    conn = database.connect(db_path)
+    try:
+        column = lambda query: [row[0] for row in conn.execute(query)]
+        return {
+            'masters': column("SELECT IDuser FROM users WHERE typeID = 2"),
+            'clients': column("SELECT DISTINCT clientID FROM requests LIMIT 1000"),
+            'requests': column("SELECT IDrequest FROM requests ORDER BY random() LIMIT 1000"),
+        }
+    finally:
+        conn.close()
+
+
+def read_mix(rng: random.Random, ids: dict):
+    """Типовой просмотр: таблицы мастера и заказчика, общий список, история заявки, комментарии"""
+    role_query_cache.clear()
+    choice = rng.random()
+    if choice < 0.3:
+        DatabaseManager.get_role_requests(2, rng.choice(ids['masters']))
+    elif choice < 0.6:
+        DatabaseManager.get_role_requests(4, rng.choice(ids['clients']))
+    elif choice < 0.8:
+        DatabaseManager.get_role_requests(None, 0)
+    elif choice < 0.9:
+        DatabaseManager.get_request_timeline(rng.choice(ids['requests']))
+    else:
+        DatabaseManager.get_request_comments(rng.choice(ids['requests']))
+
+
+def write_mix(rng: random.Random, ids: dict):
+    """Приемка заявок: новая заявка или смена статуса, каждая - отдельная транзакция"""
+    if rng.random() < 0.5:
+        DatabaseManager.create_request(1, "Тест", "Проверка", rng.choice(ids['clients']))
+    else:
+        DatabaseManager.apply_writes([('change_status', (rng.randint(1, 3), rng.choice(ids['requests'])))])
+
+
+def measure(operation, count: int, rng: random.Random, ids: dict) -> dict:
+    timings = []
+    for _ in range(count):
+        started = time.perf_counter()
+        operation(rng, ids)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        'median': statistics.median(timings),
+        'p95': timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+        'per_second': len(timings) / (sum(timings) / 1000),
+    }
+
+
+def run_benchmark(profiles, requests: int = DEFAULT_REQUESTS, clients: int = DEFAULT_CLIENTS,
+                  reads: int = DEFAULT_READS, writes: int = DEFAULT_WRITES, db_path: str = None) -> dict:
+    """
+    Сравнивает профили на одинаковых копиях БД: чтения (просмотр таблиц)
+    и записи (приемка заявок). Возвращает {профиль: {'read': ..., 'write': ...}}.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        source = os.path.join(temp_dir, "source.db")
+        if db_path:
+            shutil.copy(db_path, source)
+        else:
+            generate_database(source, requests=requests, clients=clients)
+        database.set_profile('safe')
+        database.connect(source).close()
+        # Переводим исходную копию в обычный журнал, чтобы копии были одним файлом
+        # (профили сами из WAL не переключают)
+        conn = sqlite3.connect(source)
+        conn.execute("PRAGMA journal_mode = DELETE")
+        conn.close()
+
+        for name in profiles:
+            copy = os.path.join(temp_dir, f"{name}.db")
+            shutil.copy(source, copy)
+            database.set_profile(name)
+            database.DB_PATH = copy
+            ids = sample_ids(copy)
+            rng = random.Random(1)
+            results[name] = {
+                'read': measure(read_mix, reads, rng, ids),
+                'write': measure(write_mix, writes, rng, ids),
+            }
+    database.set_profile('safe')
+
+    print(f"{'Профиль':10} {'чтение, мс (медиана/p95)':>26} {'чтений/с':>10} "
+          f"{'запись, мс (медиана/p95)':>26} {'записей/с':>10}")
+    for name, result in results.items():
+        read, write = result['read'], result['write']
+        print(f"{name:10} {read['median']:>15.2f} / {read['p95']:<8.2f} {read['per_second']:>10.0f} "
+              f"{write['median']:>15.2f} / {write['p95']:<8.2f} {write['per_second']:>10.0f}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение профилей производительности SQLite на типовых запросах")
+    parser.add_argument('--profiles', nargs='+', default=list(PERFORMANCE_PROFILES), choices=list(PERFORMANCE_PROFILES))
+    parser.add_argument('--db', help="использовать копию существующей БД вместо сгенерированной")
+    parser.add_argument('--requests', type=int, default=DEFAULT_REQUESTS, help="заявок в сгенерированной БД")
+    parser.add_argument('--clients', type=int, default=DEFAULT_CLIENTS, help="заказчиков в сгенерированной БД")
+    parser.add_argument('--reads', type=int, default=DEFAULT_READS, help="операций чтения на профиль")
+    parser.add_argument('--writes', type=int, default=DEFAULT_WRITES, help="операций записи на профиль")
+    args = parser.parse_args()
+    run_benchmark(args.profiles, args.requests, args.clients, args.reads, args.writes, args.db)
+
+
+if __name__ == '__main__':
+    main()
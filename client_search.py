@@ -0,0 +1,124 @@
+import threading
+from bisect import bisect_left, insort
+
+# Тип пользователя "Заказчик" (таблица types)
+CLIENT_TYPE_ID = 4
+# Сколько вариантов показывать в подсказке
+DEFAULT_LIMIT = 10
+
+
+def normalize_phone(value) -> str:
+    """Только цифры телефона (в БД телефон хранится числом)"""
+    return "".join(ch for ch in str(value or "") if ch.isdigit())
+
+
+def name_keys(fio) -> list:
+    """
+    Ключи поиска по ФИО: ФИО целиком и все его "хвосты" по словам
+    ("петров иван", "иван"), чтобы находить клиента по началу любого слова.
+    """
+    words = str(fio or "").lower().replace("ё", "е").split()
+    return [" ".join(words[i:]) for i in range(len(words))]
+
+
+class ClientIndex:
+    """
+    Отсортированный индекс клиентов в памяти для поиска по началу телефона или ФИО.
+    Поиск - двоичный (bisect) по спискам пар (ключ, ID), поэтому время ответа
+    почти не зависит от числа клиентов. Клиенты добавляются и обновляются по одному
+    без перестройки всего индекса.
+    """
+
+    def __init__(self, users=()):
+        self.lock = threading.Lock()
+        self.users = {}            # ID -> [IDuser, fio, phone, typeID]
+        self.phone_keys = []       # [(цифры телефона, ID)]
+        self.name_keys = []        # [(ключ ФИО, ID)]
+        self.max_id = 0
+        # Установлен после первого построения индекса
+        self.ready = threading.Event()
+        if users:
+            self.build(users)
+
+    def build(self, users):
+        """
+        Строит индекс целиком (одна сортировка вместо вставок по одному).
+        Сортировка идет без блокировки, поэтому поиск по старому индексу
+        во время перестройки не ждет.
+        """
+        clients = {user[0]: user for user in users if user[3] == CLIENT_TYPE_ID}
+        phones = [(normalize_phone(user[2]), user_id) for user_id, user in clients.items()]
+        phone_keys = sorted(key for key in phones if key[0])
+        name_index = sorted((key, user_id) for user_id, user in clients.items() for key in name_keys(user[1]))
+        with self.lock:
+            self.users, self.phone_keys, self.name_keys = clients, phone_keys, name_index
+            self.max_id = max([self.max_id] + [user[0] for user in users])
+        self.ready.set()
+
+    def remove(self, user_id: int):
+        """Удаляет клиента из индекса"""
+        with self.lock:
+            self._remove(user_id)
+
+    def update(self, user):
+        """Добавляет или обновляет одного пользователя [IDuser, fio, phone, typeID]"""
+        with self.lock:
+            self._remove(user[0])
+            self.max_id = max(self.max_id, user[0])
+            if user[3] != CLIENT_TYPE_ID:
+                return
+            self.users[user[0]] = user
+            if normalize_phone(user[2]):
+                insort(self.phone_keys, (normalize_phone(user[2]), user[0]))
+            for key in name_keys(user[1]):
+                insort(self.name_keys, (key, user[0]))
+
+    def _remove(self, user_id: int):
+        user = self.users.pop(user_id, None)
+        if user is None:
+            return
+        keys = [(self.phone_keys, normalize_phone(user[2]))] if normalize_phone(user[2]) else []
+        keys += [(self.name_keys, key) for key in name_keys(user[1])]
+        for index, key in keys:
+            position = bisect_left(index, (key, user_id))
+            if position < len(index) and index[position] == (key, user_id):
+                del index[position]
+
+    def search(self, text: str, limit: int = DEFAULT_LIMIT) -> list:
+        """
+        Возвращает до limit клиентов [IDuser, fio, phone, typeID], у которых телефон
+        (если введены цифры) или одно из слов ФИО начинается с введенного текста.
+        """
+        text = text.strip()
+        digits = normalize_phone(text)
+        if digits and len(digits) >= len(text.replace("+", "").replace(" ", "").replace("-", "")):
+            index_name, prefix = 'phone_keys', digits
+        else:
+            index_name, prefix = 'name_keys', " ".join(text.lower().replace("ё", "е").split())
+        if not prefix:
+            return []
+
+        results = []
+        seen = set()
+        with self.lock:
+            # Список берется под блокировкой: build() может подменить его целиком
+            index = getattr(self, index_name)
+            position = bisect_left(index, (prefix,))
+            while position < len(index) and len(results) < limit:
+                key, user_id = index[position]
+                if not key.startswith(prefix):
+                    break
+                if user_id not in seen:
+                    seen.add(user_id)
+                    results.append(self.users[user_id])
+                position += 1
+        return results
+
+    def refresh(self, backend) -> int:
+        """Добавляет пользователей, появившихся в БД после построения индекса; возвращает их число"""
+        if not self.ready.is_set():
+            return 0
+        new_users = backend.get_users_since(last_id=self.max_id)
+        for user in new_users:
+            self.update(user)
+        return len(new_users)
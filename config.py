@@ -0,0 +1,51 @@
+import configparser
+import os
+
+# Файл настроек рабочего места (лежит рядом с программой)
+CONFIG_PATH = "settings.ini"
+
+# Значения по умолчанию: прямое подключение к локальному файлу БД
+DEFAULTS = {
+    'backend': {
+        'mode': 'local',                    # local - файл БД, http - сервер server.py, offline - реплика мастера
+        'url': 'http://127.0.0.1:8765',
+        'timeout': '10',
+        'replica': 'master_replica.db',     # файл реплики для offline (см. replica.py)
+    },
+    'server': {
+        'host': '127.0.0.1',
+        'port': '8765',
+    },
+    'database': {
+        'path': 'uchet.db',                 # файл БД или :memory: - БД в памяти из CSV
+        'csv_dir': '.',                     # каталог CSV для :memory:
+        'shared_cache': 'yes',              # :memory: с общим кэшем SQLite (иначе VFS memdb)
+        'profile': 'safe',                  # safe / balanced / fast (см. PERFORMANCE_PROFILES)
+    },
+    'sla': {
+        'default_days': '14',               # срок ремонта для типов техники без своего срока
+        'refresh_seconds': '60',            # период обновления панели просрочек
+        'histogram_days': '30',             # дней в графике приема и выдачи
+    },
+    'profiling': {
+        'enabled': 'no',                    # профилирование с запуска (также UCHET_PROFILE=1 или Ctrl+Shift+F12)
+        'dir': 'profiles',                  # каталог сжатых файлов профиля
+        'min_ms': '100',                    # сохранять профиль вызовов не короче
+        'stall_ms': '200',                  # записывать задержки цикла событий не короче
+    },
+    'maintenance': {
+        'enabled': 'yes',                   # фоновое обслуживание БД в простое
+        'interval_hours': '24',
+        'idle_minutes': '5',
+        'convert_vacuum': 'yes',            # однократно включить auto_vacuum=INCREMENTAL (полный VACUUM)
+    },
+}
+
+
+def load_config(path: str = CONFIG_PATH) -> configparser.ConfigParser:
+    """Читает настройки из файла, недостающие значения берутся из DEFAULTS"""
+    config = configparser.ConfigParser()
+    config.read_dict(DEFAULTS)
+    if os.path.exists(path):
+        config.read(path, encoding='utf-8')
+    return config
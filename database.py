@@ -1,12 +1,791 @@
+import csv
+import json
+import os
+import re
 import sqlite3
-from typing import Optional, Dict, Any
+import random
+import threading
+import time
+from datetime import datetime
+from typing import Optional, Dict, Any, Callable
 from contextlib import contextmanager
+from urllib.request import pathname2url
+
+from config import load_config
+from records import RequestRecord
+
+DB_PATH = 'uchet.db'
+
+# CSV-файлы для заполнения БД в памяти: (таблица, файл) в порядке загрузки
+CSV_TABLES = [
+    ('types', 'types.csv'),
+    ('orgTechTypes', 'orgTechTypes.csv'),
+    ('requestStatuses', 'requestStatuses.csv'),
+    ('users', 'users.csv'),
+    ('requests', 'requests.csv'),
+    ('comments', 'comments.csv'),
+]
+MEMORY_DB_NAME = 'uchet'
+# БД в памяти существует, пока открыто хотя бы одно соединение: URI -> такое соединение
+_memory_databases = {}
+
+# Параметры ожидания блокировок: сначала SQLite сам ждет busy_timeout,
+# затем мы повторяем операцию с экспоненциальной задержкой и джиттером
+BUSY_TIMEOUT_MS = 5000
+RETRY_ATTEMPTS = 5
+RETRY_BASE_DELAY = 0.1
+RETRY_MAX_DELAY = 2.0
+
+# Метрики конкуренции за блокировку БД
+lock_stats = {
+    'operations': 0,     # всего операций через run_with_retry
+    'contended': 0,      # операций, которым понадобился хотя бы один повтор
+    'retries': 0,        # всего повторов
+    'failures': 0,       # операций, так и не получивших блокировку
+    'wait_time': 0.0,    # суммарное время ожидания между повторами, сек
+    'lock_wait': 0.0,    # суммарное время получения блокировки записи (BEGIN IMMEDIATE с busy_timeout), сек
+}
+# Метрики обновляются из главного потока, очереди записи, обслуживания и потоков сервера
+_lock_stats_lock = threading.Lock()
+
+
+def count_lock_stats(**increments):
+    """Увеличивает метрики lock_stats (потокобезопасно)"""
+    with _lock_stats_lock:
+        for key, value in increments.items():
+            lock_stats[key] += value
+
+
+def get_lock_stats() -> dict:
+    """Согласованный снимок метрик lock_stats"""
+    with _lock_stats_lock:
+        return dict(lock_stats)
+
+# Профили производительности соединений (settings.ini, [database] profile).
+# Режим журнала хранится в файле БД и общий для всех рабочих мест: профиль без journal_mode
+# его не меняет, а из WAL программа не переключает (см. apply_profile)
+PERFORMANCE_PROFILES = {
+    # Настройки SQLite по умолчанию: режим журнала файла БД, синхронизация с диском при каждой записи
+    'safe': {'journal_mode': None, 'synchronous': 'FULL', 'cache_size': '-2000',
+             'mmap_size': '0', 'temp_store': 'DEFAULT'},
+    # WAL: чтение не ждет записи; synchronous=NORMAL в режиме WAL сохраняет целостность БД,
+    # при отключении питания может потеряться только последняя транзакция
+    'balanced': {'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'cache_size': '-16000',
+                 'mmap_size': str(64 * 1024 * 1024), 'temp_store': 'MEMORY'},
+    # Для рабочих мест, которые в основном читают, и для тестов: без ожидания записи на диск
+    'fast': {'journal_mode': 'WAL', 'synchronous': 'OFF', 'cache_size': '-64000',
+             'mmap_size': str(256 * 1024 * 1024), 'temp_store': 'MEMORY'},
+}
+PROFILE_PRAGMAS = ('journal_mode', 'synchronous', 'cache_size', 'mmap_size', 'temp_store')
+# Допустимые значения PRAGMA из файла настроек (слово или число)
+PRAGMA_VALUE = re.compile(r"^-?\w+$")
+
+# Текущий профиль (читается из settings.ini при первом подключении)
+_profile = None
+# Режим журнала, уже установленный для файла БД в этом процессе
+_journal_modes = {}
+
+
+# Исходные таблицы uchet.db (миграция 1: в новом файле, например тестовой БД, создают структуру)
+BASE_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS "orgTechTypes" (
+        "IDorgTechType" INTEGER, "orgTechType" TEXT,
+        PRIMARY KEY("IDorgTechType" AUTOINCREMENT)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS "requestStatuses" (
+        "IDrequestStatus" INTEGER, "requestStatus" TEXT,
+        PRIMARY KEY("IDrequestStatus")
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS "types" (
+        "IDtype" INTEGER, "type" TEXT,
+        PRIMARY KEY("IDtype" AUTOINCREMENT)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS "users" (
+        "IDuser" INTEGER, "fio" TEXT, "phone" INTEGER, "login" TEXT, "password" TEXT, "typeID" INTEGER,
+        PRIMARY KEY("IDuser" AUTOINCREMENT),
+        FOREIGN KEY("typeID") REFERENCES "types"("IDtype")
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS "requests" (
+        "IDrequest" INTEGER NOT NULL, "startDate" TEXT NOT NULL, "orgTechTypeID" INTEGER NOT NULL,
+        "orgTechModel" TEXT NOT NULL, "problemDescryption" TEXT NOT NULL, "requestStatusID" TEXT,
+        "completionDate" TEXT, "repairParts" TEXT, "masterID" INTEGER, "clientID" INTEGER NOT NULL,
+        FOREIGN KEY("clientID") REFERENCES "users"("IDuser"),
+        FOREIGN KEY("masterID") REFERENCES "users"("IDuser"),
+        FOREIGN KEY("orgTechTypeID") REFERENCES "orgTechTypes"("IDorgTechType"),
+        FOREIGN KEY("requestStatusID") REFERENCES "requestStatuses"("IDrequestStatus")
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS "comments" (
+        "IDcomments" INTEGER, "message" TEXT, "masterID" INTEGER, "requestID" INTEGER,
+        FOREIGN KEY("IDcomments") REFERENCES "requests"("IDrequest"),
+        FOREIGN KEY("masterID") REFERENCES "users"("IDuser")
+    )
+    """,
+]
+
+# Даты 'дд.мм.гггг' в виде 'гггг-мм-дд' для сравнения. По этим же выражениям
+# построены индексы, поэтому в запросах выражение должно совпадать дословно
+def iso_date(column: str) -> str:
+    """Выражение SQL: дата 'дд.мм.гггг' из столбца column в виде 'гггг-мм-дд'"""
+    return f"(substr({column}, 7, 4) || '-' || substr({column}, 4, 2) || '-' || substr({column}, 1, 2))"
+
+
+START_DATE_ISO = iso_date('startDate')
+COMPLETION_DATE_ISO = iso_date('completionDate')
+
+# Таблица заявок с первичным ключом: ID выдает SQLite (AUTOINCREMENT), поиск по ID
+# идет по самой таблице, статус хранится числом
+REQUESTS_TABLE = """
+    CREATE TABLE requests_new (
+        "IDrequest" INTEGER PRIMARY KEY AUTOINCREMENT, "startDate" TEXT NOT NULL,
+        "orgTechTypeID" INTEGER NOT NULL, "orgTechModel" TEXT NOT NULL, "problemDescryption" TEXT NOT NULL,
+        "requestStatusID" INTEGER, "completionDate" TEXT, "repairParts" TEXT, "masterID" INTEGER,
+        "clientID" INTEGER NOT NULL,
+        FOREIGN KEY("clientID") REFERENCES "users"("IDuser"),
+        FOREIGN KEY("masterID") REFERENCES "users"("IDuser"),
+        FOREIGN KEY("orgTechTypeID") REFERENCES "orgTechTypes"("IDorgTechType"),
+        FOREIGN KEY("requestStatusID") REFERENCES "requestStatuses"("IDrequestStatus")
+    )
+"""
+
+
+def rebuild_requests_table(conn: sqlite3.Connection):
+    """Пересоздает requests по REQUESTS_TABLE с сохранением всех строк (внутри транзакции миграции)"""
+    conn.execute(REQUESTS_TABLE)
+    # Статусы '1'/'2'/'3' приводятся к числам по типу столбца INTEGER
+    conn.execute("INSERT INTO requests_new SELECT * FROM requests")
+    conn.execute("DROP TABLE requests")
+    conn.execute("ALTER TABLE requests_new RENAME TO requests")
+
+
+INDEXES_AND_SERVICE_TABLES = [
+    # Поиск по ID теперь идет по первичному ключу
+    "DROP INDEX IF EXISTS idx_requests_id",
+    # Таблицы заявок мастера и заказчика и общий список по дате приема без сортировки
+    # во временном B-дереве; вход по логину и список мастеров; комментарии заявки
+    # (проверяется python query_plans.py)
+    "CREATE INDEX IF NOT EXISTS idx_requests_master ON requests(masterID, startDate)",
+    "CREATE INDEX IF NOT EXISTS idx_requests_client ON requests(clientID, startDate)",
+    "CREATE INDEX IF NOT EXISTS idx_requests_start ON requests(startDate)",
+    "CREATE INDEX IF NOT EXISTS idx_users_login ON users(login)",
+    "CREATE INDEX IF NOT EXISTS idx_users_type ON users(typeID)",
+    "CREATE INDEX IF NOT EXISTS idx_comments_request ON comments(requestID)",
+    # Отчеты по периодам (см. reports.py и archive.py)
+    f"CREATE INDEX IF NOT EXISTS idx_requests_start_iso ON requests({START_DATE_ISO})",
+    f"CREATE INDEX IF NOT EXISTS idx_requests_completion_iso ON requests({COMPLETION_DATE_ISO})",
+    # Журнал изменений заявок: только добавление, все значения - целые числа
+    """
+    CREATE TABLE IF NOT EXISTS request_events (
+        eventID INTEGER PRIMARY KEY,
+        requestID INTEGER NOT NULL,
+        eventTime INTEGER NOT NULL,     -- время Unix, секунды
+        eventType INTEGER NOT NULL,     -- EVENT_CREATED / EVENT_STATUS / EVENT_MASTER
+        oldValue INTEGER,               -- прежний статус или мастер
+        newValue INTEGER                -- новый статус или мастер
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_request_events_request ON request_events(requestID, eventTime)",
+    "CREATE INDEX IF NOT EXISTS idx_request_events_time ON request_events(eventTime)",
+    # Архив выполненных заявок (см. archive.py): те же столбцы, что в requests и comments
+    "CREATE TABLE IF NOT EXISTS requests_archive AS SELECT * FROM requests WHERE 0",
+    "CREATE INDEX IF NOT EXISTS idx_requests_archive_id ON requests_archive(IDrequest)",
+    "CREATE INDEX IF NOT EXISTS idx_requests_archive_master ON requests_archive(masterID)",
+    "CREATE INDEX IF NOT EXISTS idx_requests_archive_client ON requests_archive(clientID)",
+    "CREATE TABLE IF NOT EXISTS comments_archive AS SELECT * FROM comments WHERE 0",
+    "CREATE INDEX IF NOT EXISTS idx_comments_archive_request ON comments_archive(requestID)",
+    f"CREATE INDEX IF NOT EXISTS idx_requests_archive_start_iso ON requests_archive({START_DATE_ISO})",
+    f"CREATE INDEX IF NOT EXISTS idx_requests_archive_completion_iso ON requests_archive({COMPLETION_DATE_ISO})",
+    # Справочник запчастей и их расход по заявкам (см. parts.py)
+    """
+    CREATE TABLE IF NOT EXISTS parts (
+        IDpart INTEGER PRIMARY KEY,
+        partName TEXT NOT NULL UNIQUE COLLATE NOCASE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS request_parts (
+        requestID INTEGER NOT NULL,
+        partID INTEGER NOT NULL,
+        quantity INTEGER NOT NULL DEFAULT 1,
+        usedDate TEXT NOT NULL,         -- 'гггг-мм-дд': дата завершения или приема заявки
+        PRIMARY KEY (requestID, partID)
+    ) WITHOUT ROWID
+    """,
+    # Отчет по расходу за период читается только из этого индекса
+    "CREATE INDEX IF NOT EXISTS idx_request_parts_usage ON request_parts(usedDate, partID, quantity)",
+    "CREATE INDEX IF NOT EXISTS idx_request_parts_part ON request_parts(partID, usedDate)",
+    # Журнал обслуживания БД (см. maintenance.py)
+    "CREATE TABLE IF NOT EXISTS maintenance_log (runTime INTEGER NOT NULL, report TEXT)",
+]
+
+# Сроки ремонта и дневная статистика приема/выдачи (панель просрочек менеджера).
+# Счетчики daily_stats ведут триггеры, поэтому статистика не требует просмотра заявок;
+# при переносе в архив (DELETE из requests) счетчики сохраняются
+SLA_AND_DAILY_STATS = [
+    """
+    CREATE TABLE IF NOT EXISTS sla_deadlines (
+        orgTechTypeID INTEGER PRIMARY KEY,
+        maxDays INTEGER NOT NULL            -- допустимый срок ремонта, дней
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS daily_stats (
+        day TEXT PRIMARY KEY,               -- 'гггг-мм-дд'
+        intake INTEGER NOT NULL DEFAULT 0,  -- принято заявок
+        completed INTEGER NOT NULL DEFAULT 0 -- выдано заявок
+    ) WITHOUT ROWID
+    """,
+    # Незавершенные заявки по статусу и дате приема
+    f"CREATE INDEX IF NOT EXISTS idx_requests_open ON requests(requestStatusID, {START_DATE_ISO})",
+    f"""
+    INSERT INTO daily_stats (day, intake)
+    SELECT {START_DATE_ISO}, COUNT(*)
+    FROM (SELECT startDate FROM requests UNION ALL SELECT startDate FROM requests_archive)
+    WHERE startDate IS NOT NULL
+    GROUP BY 1
+    """,
+    f"""
+    INSERT INTO daily_stats (day, completed)
+    SELECT {COMPLETION_DATE_ISO}, COUNT(*)
+    FROM (SELECT completionDate FROM requests UNION ALL SELECT completionDate FROM requests_archive)
+    WHERE completionDate IS NOT NULL AND completionDate != ''
+    GROUP BY 1
+    ON CONFLICT(day) DO UPDATE SET completed = excluded.completed
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_daily_stats_insert AFTER INSERT ON requests
+    BEGIN
+        INSERT INTO daily_stats (day, intake) VALUES ({iso_date('NEW.startDate')}, 1)
+        ON CONFLICT(day) DO UPDATE SET intake = intake + 1;
+        INSERT INTO daily_stats (day, completed)
+        SELECT {iso_date('NEW.completionDate')}, 1 WHERE COALESCE(NEW.completionDate, '') != ''
+        ON CONFLICT(day) DO UPDATE SET completed = completed + 1;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_daily_stats_completed AFTER UPDATE OF completionDate ON requests
+    WHEN COALESCE(NEW.completionDate, '') != COALESCE(OLD.completionDate, '')
+    BEGIN
+        UPDATE daily_stats SET completed = completed - 1
+        WHERE COALESCE(OLD.completionDate, '') != '' AND day = {iso_date('OLD.completionDate')};
+        INSERT INTO daily_stats (day, completed)
+        SELECT {iso_date('NEW.completionDate')}, 1 WHERE COALESCE(NEW.completionDate, '') != ''
+        ON CONFLICT(day) DO UPDATE SET completed = completed + 1;
+    END
+    """,
+]
+
+# Номер изменения строки заявки для синхронизации реплик мастеров (replica.py):
+# общий счетчик sync_sequence увеличивается при каждом добавлении или изменении заявки,
+# и новое значение записывается в changeSeq этой строки. Реплика запрашивает только
+# строки с changeSeq больше последнего полученного
+SYNC_COLUMNS = ("startDate", "orgTechTypeID", "orgTechModel", "problemDescryption", "requestStatusID",
+                "completionDate", "repairParts", "masterID", "clientID")
+# Столбцы заявок и комментариев, переносимые в архив (archive.py) и читаемые вместе с ним.
+# Перечислены явно: порядок столбцов в requests и requests_archive может различаться
+ARCHIVE_REQUEST_COLUMNS = ("IDrequest",) + SYNC_COLUMNS + ("changeSeq",)
+ARCHIVE_COMMENT_COLUMNS = ("IDcomments", "message", "masterID", "requestID")
+CHANGE_SEQUENCE = [
+    "ALTER TABLE requests ADD COLUMN changeSeq INTEGER NOT NULL DEFAULT 0",
+    # Архив переносит строки по списку ARCHIVE_REQUEST_COLUMNS: новый столбец requests
+    # нужно добавить и в requests_archive, и в этот список, иначе он не попадет в архив
+    "ALTER TABLE requests_archive ADD COLUMN changeSeq INTEGER NOT NULL DEFAULT 0",
+    """
+    CREATE TABLE IF NOT EXISTS sync_sequence (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        lastSeq INTEGER NOT NULL
+    )
+    """,
+    "INSERT OR IGNORE INTO sync_sequence (id, lastSeq) VALUES (1, 0)",
+    "CREATE INDEX IF NOT EXISTS idx_requests_master_seq ON requests(masterID, changeSeq)",
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_requests_seq_insert AFTER INSERT ON requests
+    BEGIN
+        UPDATE sync_sequence SET lastSeq = lastSeq + 1 WHERE id = 1;
+        UPDATE requests SET changeSeq = (SELECT lastSeq FROM sync_sequence WHERE id = 1)
+        WHERE IDrequest = NEW.IDrequest;
+    END
+    """,
+    # UPDATE OF без changeSeq: обновление номера внутри триггера его не вызывает
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_requests_seq_update AFTER UPDATE OF {', '.join(SYNC_COLUMNS)} ON requests
+    BEGIN
+        UPDATE sync_sequence SET lastSeq = lastSeq + 1 WHERE id = 1;
+        UPDATE requests SET changeSeq = (SELECT lastSeq FROM sync_sequence WHERE id = 1)
+        WHERE IDrequest = NEW.IDrequest;
+    END
+    """,
+]
+
+# Частота моделей техники по типам для подсказок при приеме заявки (model_index.py).
+# Счетчики ведут триггеры; перенос заявок в архив их не уменьшает
+MODEL_COUNTS = [
+    """
+    CREATE TABLE IF NOT EXISTS model_counts (
+        orgTechTypeID INTEGER NOT NULL,
+        orgTechModel TEXT NOT NULL,
+        uses INTEGER NOT NULL,
+        PRIMARY KEY (orgTechTypeID, orgTechModel)
+    ) WITHOUT ROWID
+    """,
+    """
+    INSERT INTO model_counts (orgTechTypeID, orgTechModel, uses)
+    SELECT orgTechTypeID, TRIM(orgTechModel), COUNT(*)
+    FROM (SELECT orgTechTypeID, orgTechModel FROM requests
+          UNION ALL SELECT orgTechTypeID, orgTechModel FROM requests_archive)
+    WHERE orgTechTypeID IS NOT NULL AND TRIM(COALESCE(orgTechModel, '')) != ''
+    GROUP BY 1, 2
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_model_counts_insert AFTER INSERT ON requests
+    BEGIN
+        INSERT INTO model_counts (orgTechTypeID, orgTechModel, uses)
+        SELECT NEW.orgTechTypeID, TRIM(NEW.orgTechModel), 1
+        WHERE NEW.orgTechTypeID IS NOT NULL AND TRIM(COALESCE(NEW.orgTechModel, '')) != ''
+        ON CONFLICT(orgTechTypeID, orgTechModel) DO UPDATE SET uses = uses + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_model_counts_update AFTER UPDATE OF orgTechTypeID, orgTechModel ON requests
+    WHEN NEW.orgTechTypeID IS NOT OLD.orgTechTypeID OR NEW.orgTechModel IS NOT OLD.orgTechModel
+    BEGIN
+        UPDATE model_counts SET uses = uses - 1
+        WHERE orgTechTypeID = OLD.orgTechTypeID AND orgTechModel = TRIM(OLD.orgTechModel);
+        DELETE FROM model_counts
+        WHERE orgTechTypeID = OLD.orgTechTypeID AND orgTechModel = TRIM(OLD.orgTechModel) AND uses <= 0;
+        INSERT INTO model_counts (orgTechTypeID, orgTechModel, uses)
+        SELECT NEW.orgTechTypeID, TRIM(NEW.orgTechModel), 1
+        WHERE NEW.orgTechTypeID IS NOT NULL AND TRIM(COALESCE(NEW.orgTechModel, '')) != ''
+        ON CONFLICT(orgTechTypeID, orgTechModel) DO UPDATE SET uses = uses + 1;
+    END
+    """,
+]
+
+# Ключи отложенных записей, уже примененных к БД (write_queue.py): повтор записи
+# из журнала очереди после сбоя пропускается, и в request_events не появляется дубликатов
+APPLIED_WRITES = [
+    """
+    CREATE TABLE IF NOT EXISTS applied_writes (
+        writeKey TEXT PRIMARY KEY,
+        appliedAt INTEGER NOT NULL
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_applied_writes_time ON applied_writes(appliedAt)",
+]
+# Дата расхода запчастей (request_parts.usedDate, см. parts.py) - дата завершения заявки,
+# а до завершения - дата приема: триггер переносит ее при изменении completionDate
+PARTS_USED_DATE = iso_date("COALESCE(NULLIF({0}completionDate, ''), {0}startDate)")
+REQUEST_PARTS_USED_DATE = [
+    f"""
+    UPDATE request_parts SET usedDate = (
+        SELECT {PARTS_USED_DATE.format('r.')}
+        FROM (SELECT IDrequest, startDate, completionDate FROM requests
+              UNION ALL SELECT IDrequest, startDate, completionDate FROM requests_archive) r
+        WHERE r.IDrequest = request_parts.requestID)
+    WHERE EXISTS (SELECT 1 FROM requests WHERE IDrequest = request_parts.requestID)
+       OR EXISTS (SELECT 1 FROM requests_archive WHERE IDrequest = request_parts.requestID)
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_request_parts_used_date AFTER UPDATE OF completionDate ON requests
+    WHEN NEW.completionDate IS NOT OLD.completionDate
+    BEGIN
+        UPDATE request_parts SET usedDate = {PARTS_USED_DATE.format('NEW.')}
+        WHERE requestID = NEW.IDrequest;
+    END
+    """,
+]
+
+# Счетчик изменений данных для резервных снимков (backup.py): увеличивается триггерами
+# при любом изменении таблиц с данными, хранится в самой БД и поэтому, в отличие от
+# счетчика в заголовке файла, надежен и в режиме WAL. Служебные и производные таблицы
+# (журнал событий, статистика, ключи записей, журнал обслуживания) меняются только
+# вместе с этими таблицами или не влияют на данные
+CHANGE_COUNTED_TABLES = ("users", "requests", "comments", "orgTechTypes", "requestStatuses", "types",
+                         "requests_archive", "comments_archive", "parts", "request_parts", "sla_deadlines")
+DATA_CHANGES = [
+    """
+    CREATE TABLE IF NOT EXISTS data_changes (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        counter INTEGER NOT NULL
+    )
+    """,
+    "INSERT OR IGNORE INTO data_changes (id, counter) VALUES (1, 0)",
+] + [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_{table}_changes_{operation.lower()} AFTER {operation} ON {table}
+    BEGIN
+        UPDATE data_changes SET counter = counter + 1 WHERE id = 1;
+    END
+    """
+    for table in CHANGE_COUNTED_TABLES for operation in ("INSERT", "UPDATE", "DELETE")
+]
+
+# Сколько дней хранить ключи примененных записей (очищаются обслуживанием БД)
+APPLIED_WRITES_RETENTION_DAYS = 30
+
+# Миграции схемы по порядку: (версия, описание, шаги). Шаг - SQL-запрос или функция(conn).
+# Номер последней примененной миграции хранится в PRAGMA user_version; каждая миграция
+# выполняется в своей транзакции. Новые изменения схемы - только новой миграцией в конце списка
+MIGRATIONS = [
+    (1, "исходные таблицы", BASE_TABLES),
+    (2, "первичный ключ IDrequest и числовой requestStatusID", [rebuild_requests_table]),
+    (3, "индексы, журнал событий, архив, запчасти, журнал обслуживания", INDEXES_AND_SERVICE_TABLES),
+    (4, "сроки ремонта и дневная статистика приема и выдачи", SLA_AND_DAILY_STATS),
+    (5, "номера изменений заявок для синхронизации реплик", CHANGE_SEQUENCE),
+    (6, "частота моделей техники для подсказок", MODEL_COUNTS),
+    (7, "ключи примененных отложенных записей", APPLIED_WRITES),
+    (8, "дата расхода запчастей по дате завершения заявки", REQUEST_PARTS_USED_DATE),
+    (9, "счетчик изменений данных для резервных снимков", DATA_CHANGES),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+# Типы событий журнала request_events
+EVENT_CREATED = 1
+EVENT_STATUS = 2
+EVENT_MASTER = 3
+
+# Файлы БД, для которых миграции уже проверены в этом процессе
+_migrated = set()
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """Версия схемы БД (номер последней примененной миграции)"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection, db_path: str, target_version: int = SCHEMA_VERSION):
+    """
+    Применяет недостающие миграции до target_version. Для актуальной БД это одно
+    чтение PRAGMA user_version на файл за процесс. Соединение должно быть
+    с isolation_level=None (транзакциями управляем сами).
+    Пока БД занята, миграция повторяется с паузами; если схему так и не удалось
+    обновить, исключение передается вызывающему (работать со старой схемой нельзя),
+    и при следующем подключении миграция будет выполнена заново.
+    """
+    if db_path in _migrated:
+        return
+    current_version = get_schema_version(conn)
+
+    for version, description, steps in MIGRATIONS:
+        if version <= current_version:
+            continue
+        if version > target_version:
+            break
+        for attempt in range(RETRY_ATTEMPTS):
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                # Другое рабочее место могло выполнить миграцию, пока мы ждали блокировку
+                if get_schema_version(conn) >= version:
+                    conn.execute("COMMIT")
+                    break
+                for step in steps:
+                    if callable(step):
+                        step(conn)
+                    else:
+                        conn.execute(step)
+                conn.execute(f"PRAGMA user_version = {version}")
+                conn.execute("COMMIT")
+                print(f"🛠️ Схема БД обновлена до версии {version}: {description}")
+                break
+            except sqlite3.Error as e:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                if is_locked_error(e) and attempt < RETRY_ATTEMPTS - 1:
+                    time.sleep(min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt)))
+                    continue
+                print(f"❌ Не удалось применить миграцию {version} ({description}): {e}")
+                raise
+
+    if target_version == SCHEMA_VERSION:
+        _migrated.add(db_path)
+
+
+def get_profile() -> dict:
+    """Настройки соединений: профиль из settings.ini и отдельные переопределения PRAGMA"""
+    global _profile
+    if _profile is None:
+        config = load_config()
+        name = config.get('database', 'profile')
+        if name not in PERFORMANCE_PROFILES:
+            print(f"⚠️ Неизвестный профиль производительности '{name}', используется safe")
+            name = 'safe'
+        profile = dict(PERFORMANCE_PROFILES[name])
+        for pragma in PROFILE_PRAGMAS:
+            value = config.get('database', pragma, fallback='').strip()
+            if value and PRAGMA_VALUE.match(value):
+                profile[pragma] = value
+        _profile = profile
+    return _profile
+
+
+def set_profile(name: str):
+    """Выбирает профиль программно (для benchmark.py и тестовых запусков)"""
+    global _profile
+    _profile = dict(PERFORMANCE_PROFILES[name])
+    _journal_modes.clear()
+
+
+def apply_profile(conn: sqlite3.Connection, db_path: str, read_only: bool = False):
+    """Применяет профиль производительности к новому соединению"""
+    profile = get_profile()
+    for pragma in ('synchronous', 'cache_size', 'mmap_size', 'temp_store'):
+        conn.execute(f"PRAGMA {pragma} = {profile[pragma]}")
+    # Режим журнала хранится в самом файле БД: переключаем один раз на файл за процесс
+    journal_mode = (profile['journal_mode'] or '').lower()
+    if not journal_mode or read_only or is_memory_db(db_path) or _journal_modes.get(db_path) == journal_mode:
+        return
+    try:
+        actual = conn.execute("PRAGMA journal_mode").fetchone()[0]
+        if actual == 'wal' and journal_mode != 'wal':
+            # Другие рабочие места могут работать с профилем WAL: выход из WAL блокировал бы их
+            # (переключение обратно - вручную, когда программа закрыта на всех рабочих местах)
+            print(f"⚠️ БД в режиме WAL, режим журнала {journal_mode} не устанавливается")
+        elif actual != journal_mode:
+            actual = conn.execute(f"PRAGMA journal_mode = {journal_mode}").fetchone()[0]
+            if actual != journal_mode:
+                print(f"⚠️ Режим журнала {journal_mode} не установлен, текущий режим: {actual}")
+    except sqlite3.OperationalError as e:
+        if not is_locked_error(e):
+            raise
+        # БД занята другим рабочим местом: попробуем при следующем подключении
+        print(f"⚠️ Режим журнала {journal_mode} не установлен, БД занята: {e}")
+        return
+    _journal_modes[db_path] = journal_mode
+
+
+# Функция, получающая текст каждого выполняемого SQL-запроса (для query_plans.py)
+sql_trace = None
+
+
+# Время последнего обращения программы к БД (для определения простоя)
+_last_activity = time.monotonic()
+
+
+def idle_seconds() -> float:
+    """Сколько секунд программа не обращалась к БД"""
+    return time.monotonic() - _last_activity
+
+
+def is_memory_db(db_path: str) -> bool:
+    """Проверяет, что DB_PATH указывает на БД в памяти (см. create_memory_database)"""
+    return db_path.startswith('file:') and ('mode=memory' in db_path or 'vfs=memdb' in db_path)
+
+
+def load_csv_tables(conn: sqlite3.Connection, csv_dir: str) -> dict:
+    """
+    Загружает справочники, пользователей, заявки и комментарии из CSV (разделитель ';',
+    первая строка - заголовок) одной транзакцией. Возвращает {таблица: строк}.
+    """
+    counts = {}
+    conn.execute("BEGIN")
+    try:
+        for table, file_name in CSV_TABLES:
+            path = os.path.join(csv_dir, file_name)
+            if not os.path.exists(path):
+                print(f"⚠️ Нет файла {path}, таблица {table} останется пустой")
+                continue
+            with open(path, encoding='utf-8-sig', newline='') as csv_file:
+                reader = csv.reader(csv_file, delimiter=';')
+                header = next(reader)
+                # Пустые ячейки (дата завершения, мастер) - NULL, как в uchet.db
+                rows = [[value if value != '' else None for value in row] for row in reader if row]
+            placeholders = ", ".join("?" * len(header))
+            conn.executemany(f'INSERT INTO "{table}" VALUES ({placeholders})', rows)
+            counts[table] = len(rows)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return counts
+
+
+def create_memory_database(csv_dir: Optional[str] = None, shared_cache: bool = True,
+                           name: str = MEMORY_DB_NAME) -> str:
+    """
+    Создает БД в памяти процесса, общую для всех его соединений, и возвращает ее URI
+    для DB_PATH. shared_cache=True - общий кэш SQLite (cache=shared), иначе VFS memdb
+    (у каждого соединения свой кэш, блокировки как у файла). Если указан csv_dir,
+    таблицы заполняются из CSV: сначала таблицы, затем загрузка, затем индексы.
+    Без csv_dir БД остается с таблицами без индексов (версия 2) для загрузки данных
+    вызывающим кодом (sample_data.py); остальные миграции выполнит connect().
+    """
+    uri = f"file:{name}?mode=memory&cache=shared" if shared_cache else f"file:/{name}?vfs=memdb"
+    if uri in _memory_databases:
+        return uri
+    keeper = sqlite3.connect(uri, uri=True, isolation_level=None, check_same_thread=False)
+    _memory_databases[uri] = keeper
+    migrate(keeper, uri, target_version=2)
+    if csv_dir is not None:
+        counts = load_csv_tables(keeper, csv_dir)
+        print(f"🧠 БД в памяти заполнена из CSV: {counts}")
+        connect(uri).close()
+    return uri
+
+
+def configure_database(config=None) -> str:
+    """
+    Выбирает БД по settings.ini ([database] path): путь к файлу или ':memory:' -
+    БД в памяти, заполненная из CSV каталога csv_dir. Возвращает новый DB_PATH.
+    """
+    global DB_PATH
+    config = config or load_config()
+    path = config.get('database', 'path')
+    if path == ':memory:':
+        DB_PATH = create_memory_database(config.get('database', 'csv_dir'),
+                                         config.getboolean('database', 'shared_cache'))
+    else:
+        DB_PATH = path
+    return DB_PATH
+
+
+def is_locked_error(error: Exception) -> bool:
+    """Проверяет, что ошибка вызвана блокировкой БД другим процессом"""
+    if not isinstance(error, sqlite3.OperationalError):
+        return False
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+
+def connect(db_path: Optional[str] = None) -> sqlite3.Connection:
+    """
+    Открывает соединение с БД с настроенным busy_timeout и профилем производительности.
+    Транзакциями управляем сами (isolation_level=None), чтобы запись
+    начиналась с BEGIN IMMEDIATE.
+    """
+    db_path = db_path or DB_PATH
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_MS / 1000,
+                           isolation_level=None, uri=db_path.startswith('file:'))
+    try:
+        conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+        apply_profile(conn, db_path)
+        migrate(conn, db_path)
+    except sqlite3.Error:
+        conn.close()
+        raise
+    if sql_trace is not None:
+        conn.set_trace_callback(sql_trace)
+    return conn
+
+
+def connect_readonly(db_path: Optional[str] = None) -> sqlite3.Connection:
+    """Открывает соединение только для чтения (для отчетов в отдельных процессах)"""
+    db_path = db_path or DB_PATH
+    if is_memory_db(db_path):
+        # БД в памяти доступна только этому процессу
+        conn = sqlite3.connect(db_path, uri=True, timeout=BUSY_TIMEOUT_MS / 1000)
+        conn.execute("PRAGMA query_only = 1")
+    else:
+        conn = sqlite3.connect(f"file:{pathname2url(os.path.abspath(db_path))}?mode=ro", uri=True,
+                               timeout=BUSY_TIMEOUT_MS / 1000)
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    apply_profile(conn, db_path, read_only=True)
+    if sql_trace is not None:
+        conn.set_trace_callback(sql_trace)
+    return conn
+
+
+def record_event(conn: sqlite3.Connection, request_id: int, event_type: int, new_value):
+    """
+    Добавляет событие в журнал request_events.
+    Вызывается в той же транзакции, что и изменение заявки, до UPDATE:
+    прежнее значение берется из текущей строки заявки.
+    """
+    column = {EVENT_STATUS: 'requestStatusID', EVENT_MASTER: 'masterID'}.get(event_type)
+    old_value = f"CAST({column} AS INTEGER)" if column else "NULL"
+    conn.execute(f"""
+        INSERT INTO request_events (requestID, eventTime, eventType, oldValue, newValue)
+        SELECT IDrequest, ?, ?, {old_value}, ? FROM requests WHERE IDrequest = ?
+    """, (int(time.time()), event_type, new_value, request_id))
+
+
+def claim_write_key(conn: sqlite3.Connection, key: Optional[str]) -> bool:
+    """
+    Отмечает запись с ключом key примененной (внутри ее транзакции).
+    Возвращает False, если запись с этим ключом уже применялась. Запись без ключа применяется всегда.
+    """
+    if key is None:
+        return True
+    return conn.execute("INSERT OR IGNORE INTO applied_writes (writeKey, appliedAt) VALUES (?, ?)",
+                        (key, int(time.time()))).rowcount == 1
+
+
+def apply_write(conn: sqlite3.Connection, operation: str, params) -> None:
+    """Выполняет одну операцию из WRITE_OPERATIONS вместе с записью событий (внутри транзакции)"""
+    query, events = WRITE_OPERATIONS[operation]
+    # События пишутся в той же транзакции, что и изменение
+    for request_id, event_type, new_value in events(*params):
+        record_event(conn, request_id, event_type, new_value)
+    conn.execute(query, tuple(params))
+
+
+def run_with_retry(operation: Callable[[sqlite3.Connection], Any], write: bool = False,
+                   db_path: Optional[str] = None, row_factory=None) -> Any:
+    """
+    Выполняет operation(conn) с повторами при блокировке БД.
+
+    Для записи транзакция открывается через BEGIN IMMEDIATE: блокировка на запись
+    берется сразу, и две транзакции не могут взаимно ждать повышения блокировки.
+    При ошибке "database is locked" транзакция откатывается и операция
+    повторяется с экспоненциальной задержкой и джиттером.
+    """
+    global _last_activity
+    _last_activity = time.monotonic()
+    count_lock_stats(operations=1)
+    for attempt in range(RETRY_ATTEMPTS):
+        conn = None
+        try:
+            # Подключение тоже может встретить блокировку (режим журнала, миграции схемы)
+            conn = connect(db_path)
+            if row_factory is not None:
+                conn.row_factory = row_factory
+            if write:
+                lock_started = time.perf_counter()
+                try:
+                    conn.execute("BEGIN IMMEDIATE")
+                finally:
+                    count_lock_stats(lock_wait=time.perf_counter() - lock_started)
+            result = operation(conn)
+            if write:
+                conn.execute("COMMIT")
+            return result
+        except sqlite3.OperationalError as e:
+            if conn is not None and conn.in_transaction:
+                conn.execute("ROLLBACK")
+            if not is_locked_error(e):
+                raise
+            if attempt == RETRY_ATTEMPTS - 1:
+                count_lock_stats(failures=1)
+                raise
+            if attempt == 0:
+                count_lock_stats(contended=1)
+            delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt))
+            delay = random.uniform(delay / 2, delay)
+            count_lock_stats(retries=1, wait_time=delay)
+            print(f"⚠️ БД заблокирована, повтор {attempt + 1}/{RETRY_ATTEMPTS - 1} через {delay:.2f} с")
+            time.sleep(delay)
+        except Exception:
+            if conn is not None and conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            if conn is not None:
+                conn.close()
 
 
 @contextmanager
 def get_db_connection():
     """Контекстный менеджер для подключения к БД"""
-    conn = sqlite3.connect('uchet.db')
+    conn = connect()
     conn.row_factory = sqlite3.Row
     try:
         yield conn
@@ -26,31 +805,32 @@ class DatabaseManager:
         login = login.strip()
         password = password.strip()
         
-        try:
-            with get_db_connection() as conn:
-                cursor = conn.cursor()
-                # Ищем точное совпадение логина и пароля
+        def find_user(conn):
+            cursor = conn.cursor()
+            # Ищем точное совпадение логина и пароля
+            cursor.execute(
+                "SELECT * FROM users WHERE login = ? AND password = ?",
+                (login, password)
+            )
+            user = cursor.fetchone()
+            
+            if user:
+                return dict(user)
+            else:
+                # Пробуем найти без учета пробелов
                 cursor.execute(
-                    "SELECT * FROM users WHERE login = ? AND password = ?",
+                    "SELECT * FROM users WHERE TRIM(login) = ? AND TRIM(password) = ?",
                     (login, password)
                 )
                 user = cursor.fetchone()
                 
                 if user:
                     return dict(user)
-                else:
-                    # Пробуем найти без учета пробелов
-                    cursor.execute(
-                        "SELECT * FROM users WHERE TRIM(login) = ? AND TRIM(password) = ?",
-                        (login, password)
-                    )
-                    user = cursor.fetchone()
-                    
-                    if user:
-                        return dict(user)
-                    
-                return None
                 
+            return None
+        
+        try:
+            return run_with_retry(find_user, row_factory=sqlite3.Row)
         except sqlite3.Error as e:
             print(f"❌ Ошибка БД: {e}")
             return None
@@ -59,10 +839,10 @@ class DatabaseManager:
     def get_all_users() -> list:
         """Получает всех пользователей"""
         try:
-            with get_db_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT * FROM users ORDER BY IDuser")
-                return [dict(row) for row in cursor.fetchall()]
+            return run_with_retry(
+                lambda conn: [dict(row) for row in conn.execute("SELECT * FROM users ORDER BY IDuser")],
+                row_factory=sqlite3.Row
+            )
         except sqlite3.Error as e:
             print(f"❌ Ошибка БД: {e}")
             return []
@@ -76,4 +856,368 @@ class DatabaseManager:
             3: "Оператор",
             4: "Заказчик"
         }
-        return type_mapping.get(type_id, f"Тип {type_id}")
\ No newline at end of file
+        return type_mapping.get(type_id, f"Тип {type_id}")
+    
+    # === Заявки ===
+    
+    @staticmethod
+    def authenticate(login: str, password: str) -> Optional[Dict[str, Any]]:
+        """
+        Проверяет логин и пароль. Возвращает данные пользователя без пароля или None.
+        Ошибки БД не перехватываются, чтобы окно входа могло их показать.
+        """
+        row = run_with_retry(lambda conn: conn.execute("""
+            SELECT IDuser, fio, login, phone, typeID
+            FROM users
+            WHERE login = ? AND password = ?
+        """, (login.strip(), password.strip())).fetchone(), row_factory=sqlite3.Row)
+        return dict(row) if row else None
+    
+    @staticmethod
+    def get_role_requests(role_id: int, user_id: int, include_archive: bool = False) -> list:
+        """
+        Получает заявки для таблицы роли в виде списка RequestRecord.
+        С include_archive=True в выборку попадают и архивные заявки.
+        Повторный запрос без изменений в БД обслуживается из role_query_cache.
+        """
+        from query_cache import role_query_cache
+        
+        if role_id not in ROLE_QUERIES:
+            role_id = None
+        query, by_user = ROLE_QUERIES[role_id]
+        params = (user_id,) if by_user else ()
+        if include_archive:
+            # Архивные заявки отмечаются (RequestRecord.archived) и показываются только для чтения
+            query = query.replace("FROM requests r", f", r.archived {ARCHIVE_SOURCE}")
+        return role_query_cache.get_or_load(
+            DB_PATH, (role_id, params, include_archive),
+            lambda: run_with_retry(lambda conn: [RequestRecord.from_row(row) for row in conn.execute(query, params)]))
+    
+    @staticmethod
+    def get_reference_data() -> Dict[str, list]:
+        """Получает справочники: типы техники и пользователей (без паролей)"""
+        def load(conn):
+            return {
+                'tech_types': [list(row) for row in conn.execute(
+                    "SELECT IDorgTechType, orgTechType FROM orgTechTypes ORDER BY orgTechType")],
+                'users': [list(row) for row in conn.execute(
+                    "SELECT IDuser, fio, phone, typeID FROM users")],
+            }
+        return run_with_retry(load)
+    
+    @staticmethod
+    def get_model_counts() -> list:
+        """Модели техники с числом заявок: [orgTechTypeID, модель, заявок], частые первыми"""
+        return run_with_retry(lambda conn: [list(row) for row in conn.execute(
+            "SELECT orgTechTypeID, orgTechModel, uses FROM model_counts ORDER BY uses DESC")])
+    
+    @staticmethod
+    def get_user(user_id: int) -> Optional[list]:
+        """Получает пользователя [IDuser, fio, phone, typeID] по ID"""
+        row = run_with_retry(lambda conn: conn.execute(
+            "SELECT IDuser, fio, phone, typeID FROM users WHERE IDuser = ?", (user_id,)).fetchone())
+        return list(row) if row else None
+    
+    @staticmethod
+    def get_users_since(last_id: int) -> list:
+        """Пользователи [IDuser, fio, phone, typeID], добавленные после last_id (для поиска клиентов)"""
+        return run_with_retry(lambda conn: [list(row) for row in conn.execute(
+            "SELECT IDuser, fio, phone, typeID FROM users WHERE IDuser > ? ORDER BY IDuser", (last_id,))])
+    
+    @staticmethod
+    def get_masters() -> list:
+        """Получает список мастеров [IDuser, fio]"""
+        return run_with_retry(lambda conn: [list(row) for row in conn.execute(
+            "SELECT IDuser, fio FROM users WHERE typeID = 2")])
+    
+    @staticmethod
+    def get_request_comments(request_id: int) -> list:
+        """Получает тексты комментариев к заявке"""
+        return run_with_retry(lambda conn: [row[0] for row in conn.execute("""
+            SELECT message FROM comments WHERE requestID = ?
+            UNION ALL
+            SELECT message FROM comments_archive WHERE requestID = ?
+        """, (request_id, request_id))])
+    
+    @staticmethod
+    def create_request(tech_type_id: int, model: str, problem: str, client_id: Optional[int]) -> int:
+        """Создает новую заявку со статусом "Новая заявка" и возвращает ее ID"""
+        def insert_request(conn):
+            # ID выдает SQLite: IDrequest - первичный ключ с AUTOINCREMENT (миграция 2)
+            cursor = conn.execute("""
+                INSERT INTO requests (startDate, orgTechTypeID, orgTechModel, problemDescryption,
+                                      requestStatusID, clientID)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (datetime.now().strftime("%d.%m.%Y"), tech_type_id, model, problem, 3, client_id))
+            record_event(conn, cursor.lastrowid, EVENT_CREATED, 3)
+            return cursor.lastrowid
+        
+        return run_with_retry(insert_request, write=True)
+    
+    @staticmethod
+    def create_requests(rows: list) -> list:
+        """
+        Создает пакет заявок со статусом "Новая заявка" в одной транзакции.
+        rows - [[дата приема 'дд.мм.гггг', orgTechTypeID, модель, описание, clientID], ...]
+        (проверены заранее, см. batch_intake.py). Возвращает ID новых заявок по порядку rows.
+        """
+        def insert_requests(conn):
+            # Блокировка записи уже взята (BEGIN IMMEDIATE): AUTOINCREMENT выдаст ID подряд
+            # после текущего значения sqlite_sequence
+            last_id = conn.execute("SELECT COALESCE(MAX(IDrequest), 0) FROM requests").fetchone()[0]
+            last_id = max(last_id, conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) FROM sqlite_sequence WHERE name = 'requests'").fetchone()[0])
+            conn.executemany("""
+                INSERT INTO requests (startDate, orgTechTypeID, orgTechModel, problemDescryption,
+                                      requestStatusID, clientID)
+                VALUES (?, ?, ?, ?, 3, ?)
+            """, rows)
+            conn.execute("""
+                INSERT INTO request_events (requestID, eventTime, eventType, oldValue, newValue)
+                SELECT IDrequest, ?, ?, NULL, 3 FROM requests WHERE IDrequest > ?
+            """, (int(time.time()), EVENT_CREATED, last_id))
+            return list(range(last_id + 1, last_id + 1 + len(rows)))
+        
+        return run_with_retry(insert_requests, write=True) if rows else []
+    
+    @staticmethod
+    def apply_writes(writes: list) -> None:
+        """
+        Применяет список изменений [(операция, параметры[, ключ]), ...] в одной транзакции.
+        Допускаются только операции из WRITE_OPERATIONS. Изменение с ключом, который
+        уже применялся (повтор из журнала очереди), пропускается (см. claim_write_key).
+        """
+        for operation, params, *key in writes:
+            if operation not in WRITE_OPERATIONS:
+                raise ValueError(f"Неизвестная операция записи: {operation}")
+        
+        def apply(conn):
+            for operation, params, *key in writes:
+                if claim_write_key(conn, key[0] if key else None):
+                    apply_write(conn, operation, params)
+        
+        run_with_retry(apply, write=True)
+    
+    @staticmethod
+    def get_master_changes(master_id: int, since_seq: int, known_ids: list) -> dict:
+        """
+        Изменения для реплики мастера после номера since_seq (см. replica.py):
+        'seq' - номер для следующего запроса; 'requests' - заявки мастера, измененные
+        после since_seq (столбцы REQUEST_COLUMNS и changeSeq); 'removed' - заявки из
+        known_ids, переданные другому мастеру или перенесенные в архив; 'users' и
+        'comments' - заказчики и комментарии измененных заявок; 'tech_types' и
+        'statuses' - справочники (несколько строк, передаются целиком).
+        """
+        def load(conn):
+            # Номер и строки читаются в одной транзакции, чтобы не пропустить изменения между ними
+            conn.execute("BEGIN")
+            seq = conn.execute("SELECT lastSeq FROM sync_sequence WHERE id = 1").fetchone()[0]
+            rows = [list(row) for row in conn.execute(f"""
+                SELECT {REQUEST_COLUMNS}, r.changeSeq FROM requests r
+                WHERE r.masterID = ? AND r.changeSeq > ?
+                ORDER BY r.changeSeq
+            """, (master_id, since_seq))]
+            still_assigned = {row[0] for row in conn.execute("""
+                SELECT IDrequest FROM requests
+                WHERE IDrequest IN (SELECT value FROM json_each(?)) AND masterID = ?
+            """, (json.dumps(known_ids), master_id))}
+            changed_ids = json.dumps([row[0] for row in rows])
+            user_ids = json.dumps(sorted({row[9] for row in rows if row[9] is not None} | {master_id}))
+            changes = {
+                'seq': seq,
+                'requests': rows,
+                'removed': [request_id for request_id in known_ids if request_id not in still_assigned],
+                'users': [list(row) for row in conn.execute(
+                    "SELECT IDuser, fio, phone, typeID FROM users WHERE IDuser IN (SELECT value FROM json_each(?))",
+                    (user_ids,))],
+                'comments': [list(row) for row in conn.execute(
+                    "SELECT * FROM comments WHERE requestID IN (SELECT value FROM json_each(?))", (changed_ids,))],
+                'tech_types': [list(row) for row in conn.execute("SELECT * FROM orgTechTypes")],
+                'statuses': [list(row) for row in conn.execute("SELECT * FROM requestStatuses")],
+            }
+            conn.execute("COMMIT")
+            return changes
+        return run_with_retry(load)
+    
+    @staticmethod
+    def apply_master_changes(master_id: int, changes: list) -> dict:
+        """
+        Применяет изменения, сделанные мастером без связи: [[номер, IDrequest, операция,
+        параметры, статус при последней синхронизации[, ключ]], ...] в одной транзакции.
+        Изменение не применяется (конфликт), если заявка передана другому мастеру или
+        перенесена в архив или если ее статус в центральной БД с тех пор изменил
+        кто-то другой. Изменение с ключом, который уже применялся (повторная отправка
+        после потерянного ответа), считается примененным и не выполняется снова.
+        Возвращает {'applied': [номера], 'conflicts': [[номер, IDrequest, причина,
+        текущий статус], ...]}.
+        """
+        for change_id, request_id, operation, params, base_status, *key in changes:
+            if operation not in OFFLINE_OPERATIONS:
+                raise ValueError(f"Операция недоступна без связи: {operation}")
+            if params[-1] != request_id:
+                raise ValueError(f"Изменение {change_id} относится к другой заявке")
+        
+        def apply(conn):
+            result = {'applied': [], 'conflicts': []}
+            for change_id, request_id, operation, params, base_status, *key in changes:
+                key = key[0] if key else None
+                if key is not None and conn.execute("SELECT 1 FROM applied_writes WHERE writeKey = ?",
+                                                    (key,)).fetchone():
+                    result['applied'].append(change_id)
+                    continue
+                row = conn.execute("SELECT requestStatusID, masterID FROM requests WHERE IDrequest = ?",
+                                   (request_id,)).fetchone()
+                if row is None:
+                    reason, status = 'removed', None
+                elif row[1] != master_id:
+                    reason, status = 'reassigned', row[0]
+                elif row[0] != base_status and row[0] != params[0]:
+                    reason, status = 'status', row[0]
+                else:
+                    # Ключ отмечается только вместе с применением: отклоненное изменение при повторе снова проверяется
+                    claim_write_key(conn, key)
+                    apply_write(conn, operation, params)
+                    result['applied'].append(change_id)
+                    continue
+                result['conflicts'].append([change_id, request_id, reason, status])
+            return result
+        
+        return run_with_retry(apply, write=True)
+    
+    @staticmethod
+    def get_parts_usage(start_date: str, end_date: str, part_id: Optional[int] = None) -> list:
+        """
+        Расход запчастей за период [start_date, end_date] (даты 'гггг-мм-дд'):
+        [IDpart, partName, количество, заявок], по убыванию количества.
+        """
+        query = """
+            SELECT p.IDpart, p.partName, SUM(rp.quantity), COUNT(*)
+            FROM request_parts rp
+            JOIN parts p ON p.IDpart = rp.partID
+            WHERE rp.usedDate BETWEEN ? AND ?
+        """
+        params = [start_date, end_date]
+        if part_id is not None:
+            query += " AND rp.partID = ?"
+            params.append(part_id)
+        query += " GROUP BY rp.partID ORDER BY SUM(rp.quantity) DESC"
+        return run_with_retry(lambda conn: [list(row) for row in conn.execute(query, params)])
+    
+    @staticmethod
+    def get_overdue_requests(default_days: int) -> list:
+        """
+        Незавершенные заявки, которые в работе дольше срока своего типа техники
+        (sla_deadlines, иначе default_days): [IDrequest, startDate, orgTechTypeID,
+        requestStatusID, masterID, clientID, дней в работе, срок], самые старые первыми.
+        """
+        def load(conn):
+            shortest = conn.execute("SELECT MIN(maxDays) FROM sla_deadlines").fetchone()[0]
+            shortest = default_days if shortest is None else min(shortest, default_days)
+            # Первое условие по дате - по индексу idx_requests_open (самый короткий срок),
+            # второе - точный срок типа техники
+            return [list(row) for row in conn.execute(f"""
+                SELECT r.IDrequest, r.startDate, r.orgTechTypeID, r.requestStatusID, r.masterID, r.clientID,
+                       CAST(julianday('now', 'localtime', 'start of day') - julianday({START_DATE_ISO}) AS INTEGER),
+                       COALESCE(d.maxDays, :default_days)
+                FROM requests r
+                LEFT JOIN sla_deadlines d ON d.orgTechTypeID = r.orgTechTypeID
+                WHERE r.requestStatusID IN (1, 3)
+                  AND {START_DATE_ISO} < date('now', 'localtime', :shortest)
+                  AND {START_DATE_ISO} < date('now', 'localtime', '-' || COALESCE(d.maxDays, :default_days) || ' days')
+                ORDER BY {START_DATE_ISO}
+            """, {'default_days': default_days, 'shortest': f"-{shortest} days"})]
+        return run_with_retry(load)
+    
+    @staticmethod
+    def get_daily_stats(start_date: str, end_date: str) -> list:
+        """Принято и выдано заявок по дням за период (даты 'гггг-мм-дд'): [день, принято, выдано]"""
+        return run_with_retry(lambda conn: [list(row) for row in conn.execute("""
+            SELECT day, intake, completed FROM daily_stats
+            WHERE day BETWEEN ? AND ?
+            ORDER BY day
+        """, (start_date, end_date))])
+    
+    @staticmethod
+    def get_sla_deadlines() -> list:
+        """Сроки ремонта по типам техники: [orgTechTypeID, maxDays]"""
+        return run_with_retry(lambda conn: [list(row) for row in conn.execute(
+            "SELECT orgTechTypeID, maxDays FROM sla_deadlines ORDER BY orgTechTypeID")])
+    
+    @staticmethod
+    def set_sla_deadline(tech_type_id: int, max_days: Optional[int]) -> None:
+        """Задает срок ремонта для типа техники (None - использовать срок по умолчанию)"""
+        def save(conn):
+            if max_days is None:
+                conn.execute("DELETE FROM sla_deadlines WHERE orgTechTypeID = ?", (tech_type_id,))
+            else:
+                conn.execute("INSERT OR REPLACE INTO sla_deadlines (orgTechTypeID, maxDays) VALUES (?, ?)",
+                             (tech_type_id, max_days))
+        run_with_retry(save, write=True)
+    
+    @staticmethod
+    def get_request_timeline(request_id: int) -> list:
+        """История заявки: [eventTime, eventType, oldValue, newValue] по времени"""
+        return run_with_retry(lambda conn: [list(row) for row in conn.execute("""
+            SELECT eventTime, eventType, oldValue, newValue
+            FROM request_events
+            WHERE requestID = ?
+            ORDER BY eventTime, eventID
+        """, (request_id,))])
+    
+    @staticmethod
+    def get_transitions(start_time: int, end_time: int, event_type: Optional[int] = None) -> list:
+        """
+        Все события за период [start_time, end_time) (время Unix):
+        [requestID, eventTime, eventType, oldValue, newValue]
+        """
+        query = """
+            SELECT requestID, eventTime, eventType, oldValue, newValue
+            FROM request_events
+            WHERE eventTime >= ? AND eventTime < ?
+        """
+        params = [start_time, end_time]
+        if event_type is not None:
+            query += " AND eventType = ?"
+            params.append(event_type)
+        query += " ORDER BY eventTime, eventID"
+        return run_with_retry(lambda conn: [list(row) for row in conn.execute(query, params)])
+
+
+# Столбцы заявки в порядке полей RequestRecord
+REQUEST_COLUMNS = """
+    r.IDrequest, r.startDate, r.orgTechTypeID, r.orgTechModel,
+    r.problemDescryption, r.requestStatusID, r.completionDate,
+    r.repairParts, r.masterID, r.clientID
+"""
+
+# Источник строк для режима "включая архив"; archived - признак архивной заявки
+ARCHIVE_SOURCE = (f"FROM (SELECT {', '.join(ARCHIVE_REQUEST_COLUMNS)}, 0 AS archived FROM requests "
+                  f"UNION ALL SELECT {', '.join(ARCHIVE_REQUEST_COLUMNS)}, 1 AS archived FROM requests_archive) r")
+
+# Запросы таблицы заявок по ролям: роль -> (SQL, фильтр по ID пользователя)
+ROLE_QUERIES = {
+    # Менеджер и оператор видят все заявки
+    1: (f"SELECT {REQUEST_COLUMNS} FROM requests r ORDER BY r.startDate DESC", False),
+    2: (f"SELECT {REQUEST_COLUMNS} FROM requests r WHERE r.masterID = ? ORDER BY r.startDate DESC", True),
+    3: (f"SELECT {REQUEST_COLUMNS} FROM requests r ORDER BY r.startDate DESC", False),
+    4: (f"SELECT {REQUEST_COLUMNS} FROM requests r WHERE r.clientID = ? ORDER BY r.startDate DESC", True),
+    None: (f"SELECT {REQUEST_COLUMNS} FROM requests r ORDER BY r.startDate DESC LIMIT 50", False),
+}
+
+# Разрешенные операции записи (через очередь записи и сервер принимаются только они):
+# операция -> (SQL, функция параметров -> события [(заявка, тип, новое значение)])
+# Операции, которые мастер может выполнить в реплике без связи (первый параметр - новый статус)
+OFFLINE_OPERATIONS = ('change_status', 'complete_request')
+
+WRITE_OPERATIONS = {
+    'change_status': (
+        "UPDATE requests SET requestStatusID = ? WHERE IDrequest = ?",
+        lambda status_id, request_id: [(request_id, EVENT_STATUS, status_id)]),
+    'complete_request': (
+        "UPDATE requests SET requestStatusID = ?, completionDate = ? WHERE IDrequest = ?",
+        lambda status_id, completion_date, request_id: [(request_id, EVENT_STATUS, status_id)]),
+    'assign_master': (
+        "UPDATE requests SET masterID = ?, requestStatusID = 1 WHERE IDrequest = ?",
+        lambda master_id, request_id: [(request_id, EVENT_MASTER, master_id),
+                                       (request_id, EVENT_STATUS, 1)]),
+}
@@ -0,0 +1,280 @@
+import argparse
+import contextlib
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+import database
+from backend import LocalBackend, HttpBackend
+from database import is_locked_error, PERFORMANCE_PROFILES
+from sample_data import generate_database
+
+# Длительность одного шага нагрузки по умолчанию, с
+DEFAULT_DURATION = 30
+# Пауза перед общим стартом, чтобы все процессы успели подключиться, с
+START_DELAY = 2.0
+# Отставание от расписания, при котором шаг считается упершимся в пропускную способность
+SATURATION_THRESHOLD = 0.9
+
+# Роли: ID типа пользователя, число процессов и операций в секунду на процесс по умолчанию,
+# действия с весами. Действия повторяют то, что делает интерфейс роли в user_window.py
+ROLES = {
+    'operator': (3, 4, 1.0, {'list': 5, 'create_request': 3, 'assign_master': 2, 'reference_data': 1}),
+    'master': (2, 8, 0.5, {'list': 5, 'change_status': 2, 'complete_request': 2, 'comments': 2}),
+    'manager': (1, 1, 0.2, {'list': 3, 'assign_master': 3, 'overdue': 2, 'daily_stats': 2}),
+    'client': (4, 10, 0.2, {'list': 8, 'create_request': 2}),
+}
+
+
+def percentile(values: list, p: float) -> float:
+    """Перцентиль p (0..1) отсортированного списка"""
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+
+def pick_ids(db_path: str) -> dict:
+    """Пользователи каждой роли и случайные заявки для параметров операций"""
+    conn = sqlite3.connect(db_path)
+    try:
+        column = lambda query, *params: [row[0] for row in conn.execute(query, params)]
+        ids = {role: column("SELECT IDuser FROM users WHERE typeID = ? LIMIT 1000", type_id)
+               for role, (type_id, *_rest) in ROLES.items()}
+        ids['requests'] = column("SELECT IDrequest FROM requests ORDER BY random() LIMIT 5000")
+        return ids
+    finally:
+        conn.close()
+
+
+def run_action(backend, action: str, role: str, user_id: int, ids: dict, rng: random.Random):
+    """Одна операция пользователя роли через бэкенд (тот же код, что у рабочего места)"""
+    type_id = ROLES[role][0]
+    if action == 'list':
+        backend.get_role_requests(role_id=type_id, user_id=user_id)
+    elif action == 'create_request':
+        client_id = user_id if role == 'client' else rng.choice(ids['client'])
+        ids['requests'].append(backend.create_request(
+            tech_type_id=rng.randint(1, 8), model="Нагрузочный тест", problem="Проверка", client_id=client_id))
+    elif action == 'assign_master':
+        backend.apply_writes(writes=[('assign_master', (rng.choice(ids['master']), rng.choice(ids['requests'])))])
+    elif action == 'change_status':
+        backend.apply_writes(writes=[('change_status', (rng.choice((1, 3)), rng.choice(ids['requests'])))])
+    elif action == 'complete_request':
+        backend.apply_writes(writes=[('complete_request', (2, date.today().strftime("%d.%m.%Y"),
+                                                           rng.choice(ids['requests'])))])
+    elif action == 'comments':
+        backend.get_request_comments(request_id=rng.choice(ids['requests']))
+    elif action == 'reference_data':
+        backend.get_reference_data()
+    elif action == 'overdue':
+        backend.get_overdue_requests(default_days=14)
+    elif action == 'daily_stats':
+        backend.get_daily_stats(start_date=(date.today() - timedelta(days=30)).isoformat(),
+                                end_date=date.today().isoformat())
+    else:
+        raise ValueError(f"Неизвестное действие: {action}")
+
+
+def simulate_user(role: str, user_id: int, db_path: str, profile: str, url: str, rate: float,
+                  duration: float, start_at: float, ids: dict, seed: int, results):
+    """
+    Процесс одного рабочего места: операции роли с заданной частотой до конца шага.
+    Расписание фиксированное: если операция затянулась, следующая начинается сразу,
+    а с окончанием шага процесс останавливается, поэтому при насыщении БД
+    выполняется меньше операций, чем запланировано.
+    В results кладется (роль, {действие: [задержки, с]}, {ошибка: число}, lock_stats, запланировано).
+    """
+    rng = random.Random(seed)
+    actions, weights = zip(*ROLES[role][3].items())
+    latencies = {action: [] for action in actions}
+    errors = {}
+
+    # Сообщения о повторах при блокировке (run_with_retry) в тесте только мешают
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        if url:
+            backend = HttpBackend(url)
+        else:
+            database.DB_PATH = db_path
+            if profile:
+                database.set_profile(profile)
+            backend = LocalBackend()
+
+        interval = 1.0 / rate
+        # Случайный сдвиг, чтобы процессы не обращались к БД строго одновременно
+        next_run = start_at + rng.uniform(0, interval)
+        end_at = start_at + duration
+        planned = int((end_at - next_run) / interval) + 1
+        while next_run < end_at and time.time() < end_at:
+            time.sleep(max(0.0, next_run - time.time()))
+            action = rng.choices(actions, weights)[0]
+            started = time.perf_counter()
+            try:
+                run_action(backend, action, role, user_id, ids, rng)
+                latencies[action].append(time.perf_counter() - started)
+            except Exception as e:
+                kind = "database is locked" if isinstance(e, sqlite3.Error) and is_locked_error(e) \
+                    else f"{type(e).__name__}: {e}"
+                errors[kind] = errors.get(kind, 0) + 1
+            next_run += interval
+
+    results.put((role, latencies, errors, database.get_lock_stats(), planned))
+
+
+def run_step(db_path: str, counts: dict, rates: dict, duration: float, profile: str, url: str = None) -> dict:
+    """Один шаг нагрузки: запускает процессы всех ролей одновременно и собирает их результаты"""
+    ids = pick_ids(db_path)
+    results = multiprocessing.Queue()
+    start_at = time.time() + START_DELAY
+    processes = []
+    for role, count in counts.items():
+        for index in range(count):
+            user_id = ids[role][index % len(ids[role])] if ids[role] else 0
+            process = multiprocessing.Process(
+                target=simulate_user,
+                args=(role, user_id, db_path, profile, url, rates[role], duration, start_at, ids,
+                      len(processes) + 1, results))
+            process.start()
+            processes.append(process)
+
+    collected = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    step = {'processes': len(processes), 'duration': duration, 'planned': 0, 'actions': {}, 'errors': {},
+            'locks': {key: 0 for key in database.lock_stats}}
+    for role, latencies, errors, locks, planned in collected:
+        step['planned'] += planned
+        for action, values in latencies.items():
+            step['actions'].setdefault(f"{role}.{action}", []).extend(values)
+        for kind, number in errors.items():
+            step['errors'][kind] = step['errors'].get(kind, 0) + number
+        for key, value in locks.items():
+            step['locks'][key] += value
+    return step
+
+
+def print_step(step: dict) -> dict:
+    """Печатает задержки по действиям и сводку шага; возвращает сводку"""
+    print(f"{'Действие':28} {'вызовов':>8} {'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9}")
+    all_latencies = []
+    for name in sorted(step['actions']):
+        values = sorted(step['actions'][name])
+        all_latencies.extend(values)
+        if values:
+            print(f"{name:28} {len(values):8} {percentile(values, 0.5) * 1000:9.1f} "
+                  f"{percentile(values, 0.95) * 1000:9.1f} {percentile(values, 0.99) * 1000:9.1f}")
+    all_latencies.sort()
+
+    failed = sum(step['errors'].values())
+    done = len(all_latencies) + failed
+    locks = step['locks']
+    summary = {
+        'processes': step['processes'],
+        'throughput': done / step['duration'],
+        'planned': step['planned'] / step['duration'],
+        'p95': percentile(all_latencies, 0.95) * 1000,
+        'p99': percentile(all_latencies, 0.99) * 1000,
+        'error_rate': failed / done if done else 0.0,
+    }
+    print(f"   Выполнено {done} из {step['planned']} запланированных операций "
+          f"({summary['throughput']:.1f} в секунду), ошибок: {failed} ({summary['error_rate']:.1%})")
+    for kind, number in sorted(step['errors'].items(), key=lambda item: -item[1]):
+        print(f"      {number:6} x {kind}")
+    print(f"   Блокировки: ожидание записи {locks['lock_wait']:.2f} с, паузы повторов {locks['wait_time']:.2f} с, "
+          f"операций с повторами {locks['contended']} из {locks['operations']}, отказов {locks['failures']}")
+    return summary
+
+
+def run_load(db_path: str, counts: dict, rates: dict, scales: list, duration: float,
+             profile: str, use_server: bool = False) -> list:
+    """
+    Нагрузка по шагам: на каждом шаге число процессов каждой роли умножается на scale.
+    Печатает итоговую таблицу и первый шаг, на котором БД перестала успевать.
+    """
+    server = None
+    url = None
+    if use_server:
+        # Сервер в этом процессе: все рабочие места обращаются к БД через него
+        from server import create_server
+        database.DB_PATH = db_path
+        if profile:
+            database.set_profile(profile)
+        server = create_server('127.0.0.1', 0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    summaries = []
+    try:
+        for scale in scales:
+            scaled = {role: count * scale for role, count in counts.items() if count}
+            print(f"\n🧪 Шаг x{scale}: " + ", ".join(f"{role} {count}" for role, count in scaled.items())
+                  + (f", через сервер {url}" if url else f", профиль {profile or 'из settings.ini'}"))
+            locks_before = database.get_lock_stats()
+            step = run_step(db_path, scaled, rates, duration, profile, url)
+            if server:
+                # Блокировки БД при работе через сервер происходят в этом процессе
+                locks_after = database.get_lock_stats()
+                step['locks'] = {key: locks_after[key] - locks_before[key] for key in locks_after}
+            summaries.append((scale, print_step(step)))
+    finally:
+        if server:
+            server.shutdown()
+
+    print(f"\n{'Шаг':>5} {'процессов':>10} {'план, оп/с':>11} {'факт, оп/с':>11} {'p95, мс':>9} {'p99, мс':>9} {'ошибок':>8}")
+    saturated = None
+    for scale, summary in summaries:
+        print(f"{'x' + str(scale):>5} {summary['processes']:>10} {summary['planned']:>11.1f} "
+              f"{summary['throughput']:>11.1f} {summary['p95']:>9.1f} {summary['p99']:>9.1f} "
+              f"{summary['error_rate']:>8.1%}")
+        if saturated is None and (summary['throughput'] < summary['planned'] * SATURATION_THRESHOLD
+                                  or summary['error_rate'] > 0):
+            saturated = scale
+    if saturated is None:
+        print("✅ Насыщение не достигнуто: БД успевает за нагрузкой на всех шагах")
+    else:
+        print(f"⚠️ Насыщение на шаге x{saturated}: операции не успевают по расписанию или завершаются ошибками")
+    return summaries
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Нагрузочный тест: рабочие места разных ролей в отдельных процессах над одной БД")
+    parser.add_argument('--db', help="использовать копию существующей БД вместо сгенерированной")
+    parser.add_argument('--sample-requests', type=int, default=100000, help="заявок в сгенерированной БД")
+    parser.add_argument('--sample-clients', type=int, default=20000, help="заказчиков в сгенерированной БД")
+    for role, (_, count, rate, _) in ROLES.items():
+        parser.add_argument(f'--{role}s', type=int, default=count, help=f"процессов роли {role} (по умолчанию {count})")
+        parser.add_argument(f'--{role}-rate', type=float, default=rate,
+                            help=f"операций в секунду на процесс роли {role} (по умолчанию {rate})")
+    parser.add_argument('--scale', type=int, nargs='+', default=[1],
+                        help="множители числа процессов по шагам, например: --scale 1 2 4 8")
+    parser.add_argument('--duration', type=float, default=DEFAULT_DURATION, help="длительность шага, с")
+    parser.add_argument('--profile', choices=list(PERFORMANCE_PROFILES),
+                        help="профиль производительности (по умолчанию из settings.ini)")
+    parser.add_argument('--server', action='store_true', help="рабочие места обращаются к БД через server.py")
+    args = parser.parse_args()
+
+    counts = {role: getattr(args, f'{role}s') for role in ROLES}
+    rates = {role: getattr(args, f'{role}_rate') for role in ROLES}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_path = os.path.join(temp_dir, "load.db")
+        if args.db:
+            # Тест изменяет данные, поэтому работаем с копией
+            source, target = sqlite3.connect(args.db), sqlite3.connect(db_path)
+            source.backup(target)
+            source.close()
+            target.close()
+        else:
+            generate_database(db_path, requests=args.sample_requests, clients=args.sample_clients)
+        # Миграции и режим журнала профиля - до запуска процессов
+        if args.profile:
+            database.set_profile(args.profile)
+        database.connect(db_path).close()
+        run_load(db_path, counts, rates, args.scale, args.duration, args.profile, args.server)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,20 @@
 import sys
 import os
 import sqlite3
-from PyQt5.QtWidgets import QApplication, QWidget, QMessageBox, QLineEdit, QPushButton, QLabel
+from PyQt5.QtWidgets import QApplication, QWidget, QMessageBox, QLineEdit, QPushButton, QLabel, QShortcut
 from PyQt5.uic import loadUi
 from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QKeySequence
 
 # Импортируем UserWindow из user_window.py
 from user_window import UserWindow
+from backend import get_backend, prefetch_role_data
+from database import configure_database
+from profiling import profiler, profiled
+from write_queue import JournalLocked
 
 # Путь к UI файлу приветственного экрана
 WELCOME_UI = "QtCreator/welcomescreen.ui"
-DB_PATH = "uchet.db"
 
 class AuthWindow(QWidget):
     def __init__(self):
@@ -30,6 +34,9 @@ class AuthWindow(QWidget):
         self.setWindowTitle("Авторизация - Учет заявок на ремонт")
         self.setFixedSize(800, 600)
         
+        # Скрытое действие: включение/выключение профилирования
+        QShortcut(QKeySequence("Ctrl+Shift+F12"), self, activated=profiler.toggle)
+        
         print("✅ AuthWindow создан")
     
     def init_ui(self):
@@ -73,6 +80,7 @@ class AuthWindow(QWidget):
         
         print("✅ Интерфейс настроен")
     
+    @profiled
     def authenticate(self):
         """Аутентификация пользователя"""
         print("=" * 50)
@@ -98,42 +106,24 @@ class AuthWindow(QWidget):
         
         try:
             print("🔍 Проверка подключения к базе данных...")
-            conn = sqlite3.connect(DB_PATH)
-            cursor = conn.cursor()
-            
-            # Проверяем существует ли таблица users
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='users'")
-            if not cursor.fetchone():
-                print("❌ Таблица 'users' не найдена в базе данных")
-                self.show_error('❌ Таблица пользователей не найдена')
-                conn.close()
-                return
-            
-            # ДОПОЛНИТЕЛЬНО: Проверяем структуру таблицы users
-            cursor.execute("PRAGMA table_info(users)")
-            columns = cursor.fetchall()
-            for col in columns:
-                print(f"  - {col[1]} ({col[2]})")
-            
-            cursor.execute("""
-                SELECT IDuser, fio, login, phone, typeID
-                FROM users
-                WHERE login = ? AND password = ?
-            """, (login, password))
             
-            user = cursor.fetchone()
-            conn.close()
+            # Проверка выполняется через бэкенд: файл БД или сервер (см. settings.ini).
+            # Блокировки БД обрабатываются повторами внутри run_with_retry
+            user = get_backend().authenticate(login=login, password=password)
             
             if user:
+                # Пока строится главное окно, данные роли уже грузятся в фоне
+                prefetch = prefetch_role_data(user['typeID'], user['IDuser'])
+                
                 # Преобразуем результат в словарь
                 user_data = {
-                    'id': user[0],           # IDuser
-                    'fio': user[1],          # fio
-                    'login': user[2],        # login
-                    'phone': user[3],        # phone
-                    'type_id': user[4],      # typeID
+                    'id': user['IDuser'],
+                    'fio': user['fio'],
+                    'login': user['login'],
+                    'phone': user['phone'],
+                    'type_id': user['typeID'],
                     # Добавляем название типа на основе номера
-                    'type_name': self.get_type_name(user[4])
+                    'type_name': self.get_type_name(user['typeID'])
                 }
                 
                 print(f"✅ Успешный вход:")
@@ -150,7 +140,7 @@ class AuthWindow(QWidget):
                 self.close()
                 
                 # Открываем главное окно пользователя
-                self.open_user_window(user_data)
+                self.open_user_window(user_data, prefetch)
                 
             else:
                 print("❌ Неверный логин или пароль")
@@ -187,12 +177,21 @@ class AuthWindow(QWidget):
             if message:
                 QMessageBox.warning(self, "Ошибка", message)
     
-    def open_user_window(self, user_data):
+    def open_user_window(self, user_data, prefetch=None):
         """Открывает главное окно пользователя"""
         print(f"🚀 Открываю главное окно для пользователя {user_data['fio']}")
         
         # Создаем и показываем окно пользователя
-        self.user_window = UserWindow(user_data)
+        try:
+            self.user_window = UserWindow(user_data, prefetch)
+        except JournalLocked as e:
+            # Программа уже открыта этим пользователем с этой БД: у двух окон был бы общий журнал записи
+            print(f"⚠️ {e}")
+            QMessageBox.warning(self, "Вход невозможен",
+                                "Программа уже открыта этим пользователем на этом компьютере.\n"
+                                "Закройте ее и повторите вход.")
+            self.show()
+            return
         self.user_window.show()
 
 def main():
@@ -202,6 +201,10 @@ def main():
     app.setStyle('Fusion')
     
     print("🚀 Запуск приложения...")
+    # Файл БД или БД в памяти (см. [database] в settings.ini)
+    configure_database()
+    # Профилирование на рабочем месте (UCHET_PROFILE=1 или [profiling] в settings.ini)
+    profiler.configure()
     
     # Создаем и показываем окно авторизации
     auth_window = AuthWindow()
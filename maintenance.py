@@ -0,0 +1,201 @@
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import database
+from config import load_config
+
+# Порог "простоя": сколько секунд программа не обращалась к БД
+IDLE_SECONDS = 300
+# Как часто выполнять обслуживание и как часто проверять, пора ли
+MAINTENANCE_INTERVAL_HOURS = 24
+CHECK_INTERVAL_SECONDS = 60
+
+# Пороги для внеочередных действий
+FREELIST_RATIO_THRESHOLD = 0.10          # доля свободных страниц для incremental_vacuum
+WAL_SIZE_THRESHOLD = 64 * 1024 * 1024    # размер WAL-файла для контрольной точки
+VACUUM_PAGES_PER_RUN = 2000              # страниц за один incremental_vacuum
+
+# Запросы, время которых записываем в журнал обслуживания
+TIMED_QUERIES = {
+    'manager_view': database.ROLE_QUERIES[1][0],
+    'events_by_request': "SELECT * FROM request_events WHERE requestID = 1",
+}
+
+
+def collect_metrics(conn: sqlite3.Connection, db_path: str) -> dict:
+    """Размер файла, свободные страницы и время типовых запросов"""
+    metrics = {
+        'file_size': os.path.getsize(db_path),
+        'wal_size': os.path.getsize(db_path + "-wal") if os.path.exists(db_path + "-wal") else 0,
+        'page_size': conn.execute("PRAGMA page_size").fetchone()[0],
+        'page_count': conn.execute("PRAGMA page_count").fetchone()[0],
+        'freelist_count': conn.execute("PRAGMA freelist_count").fetchone()[0],
+        'query_ms': {},
+    }
+    for name, query in TIMED_QUERIES.items():
+        started = time.perf_counter()
+        conn.execute(query).fetchall()
+        metrics['query_ms'][name] = round((time.perf_counter() - started) * 1000, 2)
+    return metrics
+
+
+def get_last_run(db_path: str) -> int:
+    """Время последнего обслуживания (время Unix) по журналу в БД"""
+    conn = database.connect(db_path)
+    try:
+        row = conn.execute("SELECT MAX(runTime) FROM maintenance_log").fetchone()
+        return row[0] or 0
+    finally:
+        conn.close()
+
+
+def run_maintenance(db_path: str = None, force_vacuum: bool = False,
+                    convert_vacuum: bool = False) -> dict:
+    """
+    Обслуживание БД: PRAGMA optimize (ANALYZE по необходимости), incremental_vacuum
+    при большом числе свободных страниц и контрольная точка WAL.
+    БД с auto_vacuum=NONE при convert_vacuum=True и большом числе свободных страниц
+    однократно переводится в INCREMENTAL (полный VACUUM освобождает место сразу).
+    Каждый шаг выполняется через run_with_retry: пока БД занята, шаг повторяется с паузами.
+    Метрики до и после записываются в таблицу maintenance_log.
+    """
+    db_path = db_path or database.DB_PATH
+    run = lambda operation, write=False: database.run_with_retry(operation, write=write, db_path=db_path)
+
+    before = run(lambda conn: collect_metrics(conn, db_path))
+    actions = []
+
+    def optimize(conn):
+        # Обновляет статистику планировщика только для таблиц, где она устарела
+        conn.execute("PRAGMA analysis_limit = 1000")
+        conn.execute("PRAGMA optimize")
+        return conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+    auto_vacuum = run(optimize)
+    actions.append('optimize')
+
+    freelist_ratio = before['freelist_count'] / max(before['page_count'], 1)
+    if freelist_ratio >= FREELIST_RATIO_THRESHOLD or force_vacuum:
+        if auto_vacuum == 2:  # INCREMENTAL
+            # execute() выполняет один шаг прагмы и освобождает одну страницу, executescript - все
+            run(lambda conn: conn.executescript(f"PRAGMA incremental_vacuum({VACUUM_PAGES_PER_RUN})"))
+            actions.append('incremental_vacuum')
+        elif convert_vacuum and freelist_ratio >= FREELIST_RATIO_THRESHOLD:
+            run(enable_incremental_vacuum_step)
+            actions.append('enable_incremental_vacuum')
+        elif freelist_ratio >= FREELIST_RATIO_THRESHOLD:
+            print("⚠️ Много свободных страниц, но auto_vacuum не INCREMENTAL: "
+                  "выполните python maintenance.py --enable-incremental-vacuum "
+                  "или включите convert_vacuum в [maintenance] settings.ini")
+
+    def checkpoint(conn):
+        journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+        if journal_mode != 'wal':
+            return None
+        if before['wal_size'] >= WAL_SIZE_THRESHOLD or force_vacuum:
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+            return 'wal_checkpoint'
+        conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchall()
+        return 'wal_checkpoint_passive'
+    checkpoint_action = run(checkpoint)
+    if checkpoint_action:
+        actions.append(checkpoint_action)
+
+    # Ключи примененных отложенных записей нужны только для повтора журнала очереди после сбоя
+    cutoff = int(time.time()) - database.APPLIED_WRITES_RETENTION_DAYS * 86400
+    if run(lambda conn: conn.execute("DELETE FROM applied_writes WHERE appliedAt < ?", (cutoff,)).rowcount,
+           write=True):
+        actions.append('prune_applied_writes')
+
+    after = run(lambda conn: collect_metrics(conn, db_path))
+    report = {'actions': actions, 'before': before, 'after': after}
+    run(lambda conn: conn.execute("INSERT INTO maintenance_log (runTime, report) VALUES (?, ?)",
+                                  (int(time.time()), json.dumps(report))), write=True)
+
+    print(f"🧹 Обслуживание БД: {', '.join(actions)}; размер {before['file_size']} -> {after['file_size']} байт, "
+          f"свободных страниц {before['freelist_count']} -> {after['freelist_count']}, "
+          f"запросы до {before['query_ms']} после {after['query_ms']} мс")
+    return report
+
+
+def enable_incremental_vacuum_step(conn: sqlite3.Connection):
+    """Переводит БД в auto_vacuum=INCREMENTAL; VACUUM выполняется вне транзакции и освобождает место"""
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+    print(f"✅ auto_vacuum = {conn.execute('PRAGMA auto_vacuum').fetchone()[0]}")
+
+
+def enable_incremental_vacuum(db_path: str = None):
+    """Однократно переводит БД в режим auto_vacuum=INCREMENTAL (требует полного VACUUM)"""
+    database.run_with_retry(enable_incremental_vacuum_step, db_path=db_path or database.DB_PATH)
+
+
+class MaintenanceScheduler:
+    """
+    Фоновый запуск обслуживания: раз в interval_hours, но только когда программа
+    простаивает (нет обращений к БД дольше idle_seconds). Время последнего запуска
+    хранится в БД, поэтому несколько рабочих мест не повторяют работу друг за другом.
+    """
+
+    def __init__(self, interval_hours: float = MAINTENANCE_INTERVAL_HOURS, idle_seconds: float = IDLE_SECONDS,
+                 convert_vacuum: bool = False):
+        self.interval = interval_hours * 3600
+        self.idle_seconds = idle_seconds
+        self.convert_vacuum = convert_vacuum
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name="maintenance", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def is_due(self) -> bool:
+        if database.idle_seconds() < self.idle_seconds:
+            return False
+        return time.time() - get_last_run(database.DB_PATH) >= self.interval
+
+    def run(self):
+        while not self.stop_event.wait(CHECK_INTERVAL_SECONDS):
+            try:
+                if self.is_due():
+                    run_maintenance(convert_vacuum=self.convert_vacuum)
+            except sqlite3.Error as e:
+                # Обычно это занятая БД: попробуем при следующей проверке
+                print(f"⚠️ Обслуживание БД отложено: {e}")
+
+
+def start_scheduler_from_config():
+    """Запускает планировщик, если обслуживание включено в settings.ini"""
+    config = load_config()
+    if not config.getboolean('maintenance', 'enabled') or database.is_memory_db(database.DB_PATH):
+        return None
+    scheduler = MaintenanceScheduler(config.getfloat('maintenance', 'interval_hours'),
+                                     config.getfloat('maintenance', 'idle_minutes') * 60,
+                                     config.getboolean('maintenance', 'convert_vacuum'))
+    scheduler.start()
+    return scheduler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Обслуживание БД: ANALYZE, incremental VACUUM, контрольные точки WAL")
+    parser.add_argument('--db', default=database.DB_PATH, help="путь к файлу БД")
+    parser.add_argument('--force', action='store_true', help="выполнить vacuum и контрольную точку без порогов")
+    parser.add_argument('--enable-incremental-vacuum', action='store_true',
+                        help="однократно включить auto_vacuum=INCREMENTAL")
+    args = parser.parse_args()
+
+    database.DB_PATH = args.db
+    if args.enable_incremental_vacuum:
+        enable_incremental_vacuum()
+    run_maintenance(force_vacuum=args.force)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+import threading
+
+# Сколько вариантов показывать в подсказке
+DEFAULT_LIMIT = 10
+
+
+def normalize_model(model) -> str:
+    """Ключ модели для сравнения: без лишних пробелов и регистра"""
+    return " ".join(str(model or "").split()).lower()
+
+
+class ModelIndex:
+    """
+    Модели техники по типам с частотой использования, общий для всех окон заявки
+    за сеанс. Загружается один раз (DatabaseManager.get_model_counts, таблицу ведут
+    триггеры БД), а модели новых заявок этого рабочего места добавляются через note()
+    без повторного запроса. Подсказка - модели выбранного типа, у которых начало
+    названия или одного из слов совпадает с введенным текстом, частые первыми.
+    """
+
+    def __init__(self, counts=()):
+        self.lock = threading.Lock()
+        self.models = {}            # тип -> {ключ модели: [название, заявок]}
+        self.ranked = {}            # тип -> [название, ...] по убыванию частоты (строится по запросу)
+        # Установлен после первой загрузки
+        self.ready = threading.Event()
+        if counts:
+            self.build(counts)
+
+    def build(self, counts):
+        """Строит индекс из [[orgTechTypeID, модель, заявок], ...]"""
+        models = {}
+        for type_id, model, uses in counts:
+            entry = models.setdefault(type_id, {}).setdefault(normalize_model(model), [model, 0])
+            entry[1] += uses
+        with self.lock:
+            self.models, self.ranked = models, {}
+        self.ready.set()
+
+    def note(self, type_id, model):
+        """Учитывает модель только что созданной заявки"""
+        key = normalize_model(model)
+        if not key or type_id is None:
+            return
+        with self.lock:
+            entry = self.models.setdefault(type_id, {}).setdefault(key, [" ".join(model.split()), 0])
+            entry[1] += 1
+            self.ranked.pop(type_id, None)
+
+    def suggest(self, type_id, text: str, limit: int = DEFAULT_LIMIT) -> list:
+        """До limit названий моделей типа type_id, подходящих к введенному тексту"""
+        prefix = normalize_model(text)
+        with self.lock:
+            ranked = self.ranked.get(type_id)
+            if ranked is None:
+                entries = sorted(self.models.get(type_id, {}).values(), key=lambda entry: (-entry[1], entry[0]))
+                ranked = self.ranked[type_id] = [entry[0] for entry in entries]
+        if not prefix:
+            return ranked[:limit]
+
+        results = []
+        for model in ranked:
+            key = normalize_model(model)
+            if key.startswith(prefix) or f" {prefix}" in key:
+                results.append(model)
+                if len(results) == limit:
+                    break
+        return results
+
+    def load(self, backend):
+        """Загружает частоты моделей из бэкенда (вызывается в фоновом потоке)"""
+        self.build(backend.get_model_counts())
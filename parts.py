@@ -0,0 +1,108 @@
+import argparse
+import re
+from typing import List, Tuple
+
+import database
+from database import run_with_retry, PARTS_USED_DATE
+
+# Разделители позиций в тексте repairParts
+PART_SEPARATORS = re.compile(r"[;,\n]+")
+# Количество в конце ("Кулер x2", "Кулер - 2 шт", "Кулер 2шт.") или в начале ("2x Кулер", "2 шт Кулер").
+# Число без "x"/"шт" считается частью названия ("Аккумулятор HP 1234")
+QUANTITY_SUFFIX = re.compile(r"^(?P<name>.*?)[\s\-–:]*(?:[xх×*]\s*(?P<qty1>\d+)|(?P<qty2>\d+)\s*(?:шт\.?|pcs))\s*$", re.I)
+QUANTITY_PREFIX = re.compile(r"^(?P<qty>\d+)\s*(?:[xх×*]|шт\.?)\s*(?P<name>.+)$", re.I)
+
+# Заявок за одну транзакцию при переносе
+MIGRATION_BATCH_SIZE = 500
+# Раз в сколько пачек печатать прогресс
+MIGRATION_PROGRESS_BATCHES = 20
+
+def parse_repair_parts(text) -> List[Tuple[str, int]]:
+    """Разбирает свободный текст repairParts в список (название, количество)"""
+    parts = {}
+    for chunk in PART_SEPARATORS.split(text or ""):
+        chunk = chunk.strip().rstrip(".")
+        if not chunk:
+            continue
+        name, quantity = chunk, 1
+        match = QUANTITY_PREFIX.match(chunk)
+        if match:
+            name, quantity = match.group('name'), int(match.group('qty'))
+        else:
+            match = QUANTITY_SUFFIX.match(chunk)
+            if match and match.group('name').strip() and (match.group('qty1') or match.group('qty2')):
+                name, quantity = match.group('name'), int(match.group('qty1') or match.group('qty2'))
+        name = " ".join(name.split())
+        if name:
+            # Одинаковые позиции в одной заявке складываем (без учета регистра)
+            key = name.lower()
+            previous_name, previous_quantity = parts.get(key, (name, 0))
+            parts[key] = (previous_name, previous_quantity + max(quantity, 1))
+    return list(parts.values())
+
+
+def link_request_parts(conn, request_id: int, parts: List[Tuple[str, int]], used_date: str):
+    """Записывает запчасти заявки в request_parts (внутри транзакции вызывающего)"""
+    conn.execute("DELETE FROM request_parts WHERE requestID = ?", (request_id,))
+    for name, quantity in parts:
+        conn.execute("INSERT OR IGNORE INTO parts (partName) VALUES (?)", (name,))
+        part_id = conn.execute("SELECT IDpart FROM parts WHERE partName = ?", (name,)).fetchone()[0]
+        conn.execute("INSERT INTO request_parts (requestID, partID, quantity, usedDate) VALUES (?, ?, ?, ?)",
+                     (request_id, part_id, quantity, used_date))
+
+
+def migrate_repair_parts(batch_size: int = MIGRATION_BATCH_SIZE) -> int:
+    """
+    Переносит текст repairParts всех заявок, в том числе архивных, в parts/request_parts.
+    Обрабатываются только заявки без строк в request_parts, поэтому перенос
+    можно прерывать и запускать повторно. Возвращает число обработанных заявок.
+    Дальше usedDate при завершении заявки обновляет триггер trg_request_parts_used_date.
+    """
+    last_id = -1
+    total = 0
+    while True:
+        def migrate_batch(conn):
+            rows = conn.execute(f"""
+                SELECT r.IDrequest, r.repairParts, {PARTS_USED_DATE.format('r.')}
+                FROM (SELECT IDrequest, repairParts, startDate, completionDate FROM requests
+                      UNION ALL
+                      SELECT IDrequest, repairParts, startDate, completionDate FROM requests_archive) r
+                WHERE r.IDrequest > ? AND r.repairParts IS NOT NULL AND TRIM(r.repairParts) != ''
+                  AND NOT EXISTS (SELECT 1 FROM request_parts rp WHERE rp.requestID = r.IDrequest)
+                ORDER BY r.IDrequest
+                LIMIT ?
+            """, (last_id, batch_size)).fetchall()
+            for request_id, text, used_date in rows:
+                link_request_parts(conn, request_id, parse_repair_parts(text), used_date)
+            return rows
+
+        rows = run_with_retry(migrate_batch, write=True)
+        total += len(rows)
+        if len(rows) < batch_size:
+            break
+        last_id = rows[-1][0]
+        if total % (batch_size * MIGRATION_PROGRESS_BATCHES) == 0:
+            print(f"  обработано заявок: {total}...")
+
+    print(f"✅ Запчасти перенесены из repairParts: {total} заявок")
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Справочник запчастей и отчет по расходу")
+    parser.add_argument('--db', default=database.DB_PATH, help="путь к файлу БД")
+    parser.add_argument('--migrate', action='store_true', help="перенести текст repairParts в справочник")
+    parser.add_argument('--report', nargs=2, metavar=('С', 'ПО'), help="отчет за период, даты гггг-мм-дд")
+    args = parser.parse_args()
+
+    database.DB_PATH = args.db
+    if args.migrate:
+        migrate_repair_parts()
+    if args.report:
+        print(f"{'Запчасть':40} {'Кол-во':>8} {'Заявок':>8}")
+        for part_id, name, quantity, requests in database.DatabaseManager.get_parts_usage(*args.report):
+            print(f"{name[:40]:40} {quantity:>8} {requests:>8}")
+
+
+if __name__ == '__main__':
+    main()
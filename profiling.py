@@ -0,0 +1,334 @@
+import argparse
+import cProfile
+import functools
+import gzip
+import inspect
+import json
+import marshal
+import os
+import platform
+import pstats
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from datetime import datetime
+
+import database
+from config import load_config
+
+# Переменная окружения, включающая профилирование при запуске (1 - включить,
+# другое непустое значение - каталог для файлов профиля)
+PROFILE_ENV = "UCHET_PROFILE"
+# Период «сердцебиения» цикла событий Qt и опроса сторожевого потока, мс
+HEARTBEAT_MS = 50
+SAMPLE_MS = 10
+# Сколько кадров стека и самых частых стеков сохранять на одну задержку
+STACK_DEPTH = 15
+TOP_STACKS = 5
+# Пока окно не отвечает дольше этого, снимок задержки переписывается на диск с этим периодом:
+# если зависшую программу закроют принудительно, данные о зависании останутся
+HANG_SNAPSHOT_MS = 5000
+
+
+class Profiler:
+    """
+    Профилирование в работе у пользователя, без установки инструментов разработчика.
+
+    Функции, отмеченные декоратором profiled, при включенном профилировании
+    выполняются под cProfile, и если вызов занял не меньше min_ms, результат
+    пишется в сжатый файл вместе с ролью пользователя, числом строк таблицы и
+    размером БД. Вложенные отмеченные вызовы попадают в профиль внешнего вызова
+    и в его описание (nested). Задержки цикла событий Qt (окно не отвечает дольше
+    stall_ms) отслеживает StallMonitor. Выключенное профилирование стоит одной проверки флага.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.directory = "profiles"
+        self.min_ms = 100
+        self.context = {}           # сведения о сеансе: роль, режим бэкенда (дополняются окнами)
+        self.local = threading.local()
+        self.operation = None       # внешняя отмеченная функция, выполняемая сейчас (для StallMonitor)
+        self.stall_monitor = None
+
+    def configure(self, config=None):
+        """Читает [profiling] из settings.ini; переменная UCHET_PROFILE включает профилирование"""
+        config = config or load_config()
+        self.directory = config.get('profiling', 'dir')
+        self.min_ms = config.getfloat('profiling', 'min_ms')
+        self.context['backend'] = config.get('backend', 'mode')
+        self.stall_monitor = StallMonitor(self, config.getfloat('profiling', 'stall_ms'))
+
+        value = os.environ.get(PROFILE_ENV, "").strip()
+        if value and value not in ("1", "yes", "on"):
+            self.directory = value
+        if value or config.getboolean('profiling', 'enabled'):
+            self.start()
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.enabled = True
+        if self.stall_monitor:
+            self.stall_monitor.start()
+        print(f"🩺 Профилирование включено, файлы: {os.path.abspath(self.directory)}")
+
+    def stop(self):
+        if not self.enabled:
+            return
+        self.enabled = False
+        if self.stall_monitor:
+            self.stall_monitor.stop()
+        print("🩺 Профилирование выключено")
+
+    def toggle(self):
+        """Скрытое действие окон (Ctrl+Shift+F12)"""
+        self.stop() if self.enabled else self.start()
+
+    def run(self, name, function, obj, args, kwargs):
+        """Выполняет function под cProfile и сохраняет профиль, если вызов был долгим"""
+        if getattr(self.local, 'name', None) is not None:
+            # Вложенный вызов: cProfile уже собирает данные внешнего вызова
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.local.nested.append([name, round((time.perf_counter() - started) * 1000, 1)])
+
+        self.local.name, self.local.nested = name, []
+        self.operation = name
+        profile = cProfile.Profile()
+        started = time.perf_counter()
+        try:
+            return profile.runcall(function, *args, **kwargs)
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            nested, self.local.name, self.operation = self.local.nested, None, None
+            if elapsed_ms >= self.min_ms:
+                meta = dict(self.context, **describe(obj), name=name, nested=nested,
+                            elapsed_ms=round(elapsed_ms, 1))
+                profile.create_stats()
+                try:
+                    self.save(name, meta, profile.stats)
+                except OSError as e:
+                    print(f"⚠️ Не удалось записать профиль {name}: {e}")
+
+    def save(self, kind, meta, stats=None, path=None) -> str:
+        """
+        Пишет {'meta': ..., 'stats': ...} в gzip (marshal, stats - в формате pstats).
+        Файл пишется под временным именем и переименовывается, поэтому
+        переписываемый снимок (path) не остается недописанным.
+        """
+        meta = dict(meta, recorded=datetime.now().isoformat(timespec='seconds'),
+                    python=platform.python_version(), system=platform.platform())
+        role = f"-role{meta['role']}" if meta.get('role') else ""
+        path = path or os.path.join(self.directory,
+                                    f"{datetime.now():%Y%m%d-%H%M%S-%f}-{kind}{role}.prof.gz")
+        with gzip.open(path + ".tmp", 'wb') as profile_file:
+            profile_file.write(marshal.dumps({'meta': meta, 'stats': stats or {}}))
+        os.replace(path + ".tmp", path)
+        print(f"🩺 {kind}: {meta.get('elapsed_ms', '')} мс, профиль {path}")
+        return path
+
+
+def describe(obj) -> dict:
+    """Роль пользователя и объем данных окна (user_data, table_widget), размер файла БД"""
+    meta = {}
+    user_data = getattr(obj, 'user_data', None)
+    if user_data:
+        meta['role'] = user_data.get('type_id', user_data.get('typeID'))
+    table = getattr(obj, 'table_widget', None)
+    if table is not None:
+        meta['rows'] = table.rowCount()
+    if database.DB_PATH and os.path.exists(database.DB_PATH):
+        meta['db_bytes'] = os.path.getsize(database.DB_PATH)
+    return meta
+
+
+class StallMonitor:
+    """
+    Задержки цикла событий Qt. Таймер в главном потоке отмечает время каждые HEARTBEAT_MS,
+    сторожевой поток, пока отметки нет дольше stall_ms, снимает стек главного потока
+    каждые SAMPLE_MS. Когда таймер снова срабатывает, задержка (длительность,
+    выполнявшаяся отмеченная функция и самые частые стеки) сразу пишется в свой файл
+    сторожевым потоком. Затянувшаяся задержка записывается снимком еще до ее окончания.
+    """
+
+    def __init__(self, profiler, stall_ms):
+        self.profiler = profiler
+        self.stall_ms = stall_ms
+        self.lock = threading.Lock()
+        self.samples = Counter()
+        self.stalls = []
+        self.operation = None       # отмеченная функция, замеченная во время задержки
+        self.snapshot_path = None   # снимок текущей затянувшейся задержки
+        self.snapshot_at = 0.0
+        self.timer = None
+        self.thread = None
+        self.running = threading.Event()
+        self.beat = time.perf_counter()
+
+    def start(self):
+        from PyQt5.QtCore import QTimer, QCoreApplication
+
+        if QCoreApplication.instance() is None or self.running.is_set():
+            return
+        self.main_ident = threading.get_ident()
+        self.beat = time.perf_counter()
+        if self.timer is None:
+            self.timer = QTimer()
+            self.timer.timeout.connect(self.on_heartbeat)
+            QCoreApplication.instance().aboutToQuit.connect(self.stop)
+        self.timer.start(HEARTBEAT_MS)
+        self.running.set()
+        # После быстрого выключения и включения прежний сторожевой поток продолжает работу
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self.watch, name="stall-monitor", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        """Останавливает наблюдение и сохраняет еще не записанные задержки"""
+        if not self.running.is_set():
+            return
+        self.running.clear()
+        self.timer.stop()
+        self.write_stalls()
+
+    def save_stalls(self, stalls, path=None):
+        try:
+            return self.profiler.save('stalls', dict(self.profiler.context, stalls=stalls,
+                                                     elapsed_ms=round(sum(s['ms'] for s in stalls), 1)), path=path)
+        except OSError as e:
+            print(f"⚠️ Не удалось записать задержки: {e}")
+
+    def write_stalls(self):
+        """Записывает завершившиеся задержки; их итог заменяет снимок затянувшейся задержки"""
+        with self.lock:
+            stalls, self.stalls = self.stalls, []
+            snapshot_path = self.snapshot_path if stalls else None
+            if stalls:
+                self.snapshot_path = None
+        if stalls:
+            self.save_stalls(stalls)
+            if snapshot_path and os.path.exists(snapshot_path):
+                os.remove(snapshot_path)
+
+    def write_snapshot(self, stalled_ms):
+        """Записывает (переписывает) снимок задержки, которая еще продолжается"""
+        with self.lock:
+            stall = {'at': datetime.now().isoformat(timespec='seconds'), 'ms': round(stalled_ms, 1),
+                     'operation': self.operation, 'ongoing': True,
+                     'stacks': [[list(stack), count] for stack, count in self.samples.most_common(TOP_STACKS)]}
+            path = self.snapshot_path
+        path = self.save_stalls([stall], path)
+        with self.lock:
+            self.snapshot_path = path
+
+    def on_heartbeat(self):
+        now = time.perf_counter()
+        stall_ms = (now - self.beat) * 1000 - HEARTBEAT_MS
+        self.beat = now
+        with self.lock:
+            samples, self.samples = self.samples, Counter()
+            operation, self.operation = self.operation, None
+            if stall_ms >= self.stall_ms:
+                self.stalls.append({
+                    'at': datetime.now().isoformat(timespec='seconds'),
+                    'ms': round(stall_ms, 1),
+                    'operation': operation,
+                    'stacks': [[list(stack), count] for stack, count in samples.most_common(TOP_STACKS)],
+                })
+                print(f"🩺 Окно не отвечало {stall_ms:.0f} мс")
+
+    def watch(self):
+        """Сторожевой поток: снимает стек главного потока, пока цикл событий стоит, и пишет задержки"""
+        while self.running.is_set():
+            time.sleep(SAMPLE_MS / 1000)
+            self.write_stalls()
+            now = time.perf_counter()
+            stalled_ms = (now - self.beat) * 1000
+            if stalled_ms < self.stall_ms:
+                continue
+            if stalled_ms >= HANG_SNAPSHOT_MS and (now - self.snapshot_at) * 1000 >= HANG_SNAPSHOT_MS:
+                self.snapshot_at = now
+                self.write_snapshot(stalled_ms)
+            frame = sys._current_frames().get(self.main_ident)
+            if frame is None:
+                continue
+            stack = tuple(f"{os.path.basename(entry.filename)}:{entry.lineno} {entry.name}"
+                          for entry in traceback.extract_stack(frame, limit=STACK_DEPTH))
+            with self.lock:
+                self.samples[stack] += 1
+                self.operation = self.profiler.operation or self.operation
+
+
+# Один профилировщик на процесс: его включают переменная окружения, настройки или скрытое действие
+profiler = Profiler()
+
+
+def profiled(function):
+    """
+    Декоратор горячих путей интерфейса. Лишние аргументы сигналов Qt (checked у clicked)
+    отбрасываются, как при подключении самой функции.
+    """
+    parameters = inspect.signature(function).parameters.values()
+    if any(p.kind == p.VAR_POSITIONAL for p in parameters):
+        positional = None
+    else:
+        positional = sum(p.kind in (p.POSITIONAL_ONLY, p.POSITIONAL_OR_KEYWORD) for p in parameters)
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        args = args[:positional]
+        if not profiler.enabled:
+            return function(*args, **kwargs)
+        return profiler.run(function.__qualname__, function, args[0] if args else None, args, kwargs)
+    return wrapper
+
+
+class SavedStats:
+    """Данные профиля из файла в виде, который принимает pstats.Stats"""
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+def load_profile(path: str) -> dict:
+    with gzip.open(path, 'rb') as profile_file:
+        return marshal.loads(profile_file.read())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Просмотр профилей, собранных на рабочих местах")
+    parser.add_argument('files', nargs='+', help="файлы *.prof.gz")
+    parser.add_argument('--sort', default='cumulative', help="порядок pstats (cumulative, tottime, calls)")
+    parser.add_argument('--limit', type=int, default=25, help="сколько функций показывать")
+    parser.add_argument('--dump', help="сохранить профиль первого файла в формате pstats (для snakeviz и т.п.)")
+    args = parser.parse_args()
+
+    for path in args.files:
+        data = load_profile(path)
+        meta = dict(data['meta'])
+        stalls = meta.pop('stalls', [])
+        print(f"📄 {path}")
+        print(json.dumps(meta, ensure_ascii=False, indent=2))
+        for stall in stalls:
+            print(f"⏳ {stall['at']}: {stall['ms']} мс{' (не завершилась)' if stall.get('ongoing') else ''}, "
+                  f"{stall['operation'] or 'вне отмеченных функций'}")
+            for stack, count in stall['stacks']:
+                print(f"   {count} x " + " <- ".join(reversed(stack[-4:])))
+        if data['stats']:
+            pstats.Stats(SavedStats(data['stats'])).sort_stats(args.sort).print_stats(args.limit)
+
+    if args.dump:
+        with open(args.dump, 'wb') as dump_file:
+            marshal.dump(load_profile(args.files[0])['stats'], dump_file)
+        print(f"✅ Профиль сохранен: {args.dump}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+import sqlite3
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+from database import is_locked_error
+
+# Ограничения кэша результатов: число записей и примерный объем памяти
+MAX_ENTRIES = 32
+MAX_BYTES = 64 * 1024 * 1024
+# Сколько ждать блокировку при проверке версии: дольше не ждем, считаем промахом кэша
+VERSION_BUSY_TIMEOUT_MS = 100
+
+
+def estimate_size(rows) -> int:
+    """Примерный объем памяти, занимаемый строками результата"""
+    size = sys.getsizeof(rows)
+    for row in rows:
+        size += sys.getsizeof(row)
+        if isinstance(row, (list, tuple)):
+            size += sum(sys.getsizeof(value) for value in row)
+        elif hasattr(row, '__slots__'):
+            # Интернированные строки общие для многих записей, считаем их с запасом
+            size += sum(sys.getsizeof(getattr(row, field)) for field in row.__slots__)
+    return size
+
+
+class QueryResultCache:
+    """
+    Кэш результатов запросов с версией БД.
+
+    Версия берется из PRAGMA data_version отдельного постоянного соединения:
+    значение меняется, когда любое другое соединение (в том числе из этой же
+    программы) фиксирует изменения. Запись кэша действительна, пока версия не
+    изменилась, поэтому повторные просмотры без записей в БД обслуживаются из памяти.
+    Вытеснение - по давности использования (LRU) с ограничением по объему.
+    Если версию узнать не удалось (БД заблокирована), запрос выполняется без кэша.
+    """
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, max_bytes: int = MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()     # ключ -> (версия, строки, размер)
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        self.version_connections = {}    # путь к БД -> соединение для data_version
+        self.connections_lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def get_version(self, db_path: str) -> Optional[int]:
+        """
+        Возвращает текущую версию данных файла БД или None, если БД заблокирована.
+        Вызывается без self.lock: ожидание блокировки не задерживает других пользователей кэша.
+        """
+        with self.connections_lock:
+            conn = self.version_connections.get(db_path)
+            if conn is None:
+                conn = sqlite3.connect(db_path, timeout=VERSION_BUSY_TIMEOUT_MS / 1000,
+                                       check_same_thread=False, uri=db_path.startswith('file:'))
+                conn.execute(f"PRAGMA busy_timeout = {VERSION_BUSY_TIMEOUT_MS}")
+                self.version_connections[db_path] = conn
+        try:
+            return conn.execute("PRAGMA data_version").fetchone()[0]
+        except sqlite3.OperationalError as e:
+            if is_locked_error(e):
+                return None
+            raise
+
+    def get_or_load(self, db_path: str, key, loader: Callable[[], Any]):
+        """Возвращает результат из кэша или выполняет loader() и запоминает результат"""
+        key = (db_path, key)
+        version = self.get_version(db_path)
+        with self.lock:
+            entry = self.entries.get(key)
+            if version is not None and entry is not None and entry[0] == version:
+                self.entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return entry[1]
+            self.stats['misses'] += 1
+
+        rows = loader()
+
+        # Пока выполнялся запрос, данные могли измениться: такой результат не кэшируем
+        if version is not None and self.get_version(db_path) == version:
+            with self.lock:
+                self.put(key, version, rows)
+        return rows
+
+    def put(self, key, version: int, rows):
+        """Добавляет результат в кэш (вызывается под self.lock)"""
+        size = estimate_size(rows)
+        if size > self.max_bytes:
+            return
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.total_bytes -= old[2]
+        self.entries[key] = (version, rows, size)
+        self.total_bytes += size
+
+        while len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes:
+            _, (_, _, evicted_size) = self.entries.popitem(last=False)
+            self.total_bytes -= evicted_size
+            self.stats['evictions'] += 1
+
+    def clear(self, db_path: Optional[str] = None):
+        """Очищает кэш (целиком или для одного файла БД)"""
+        with self.lock:
+            for key in list(self.entries):
+                if db_path is None or key[0] == db_path:
+                    self.total_bytes -= self.entries.pop(key)[2]
+
+
+# Общий кэш запросов таблиц заявок по ролям
+role_query_cache = QueryResultCache()
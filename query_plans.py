@@ -0,0 +1,200 @@
+import argparse
+import os
+import re
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import archive
+import database
+import parts
+import reports
+from database import DatabaseManager
+from query_cache import role_query_cache
+from sample_data import generate_database
+
+# Сколько раз выполнять сценарий для замера времени (берется медиана)
+TIMING_RUNS = 3
+
+# Строки плана, означающие полный просмотр таблицы или сортировку во временном B-дереве
+SCAN_PATTERN = re.compile(r"^SCAN (?!CONSTANT ROW|\()(\S+)")
+TEMP_BTREE_PREFIX = "USE TEMP B-TREE"
+
+# Строки плана, допустимые для сценариев, которым по смыслу нужна вся таблица
+FULL_LIST = ("SCAN r USING INDEX idx_requests_start",)
+GROUPED = ("USE TEMP B-TREE FOR GROUP BY", "USE TEMP B-TREE FOR ORDER BY")
+
+
+def get_scenarios(sample: dict) -> list:
+    """
+    Сценарии проверки: (название, вызов, бюджет времени в мс, допустимые строки плана).
+    Бюджеты рассчитаны на БД по умолчанию из sample_data.py на обычном рабочем месте.
+    Запросы не перечисляются вручную: проверяется SQL, который реально выполняют
+    вызовы DatabaseManager, отчеты и архивация.
+    """
+    month_end = date.today()
+    month_start = month_end.replace(day=1)
+    now = int(time.time())
+
+    def report_month(report):
+        def run():
+            reports.init_worker(database.DB_PATH)
+            return reports.build_month((report, reports.REQUESTS_SOURCE,
+                                        ("месяц", month_start.isoformat(), month_end.isoformat())))
+        return run
+
+    return [
+        ('authenticate', lambda: DatabaseManager.authenticate(sample['login'], sample['password']), 5, ()),
+        ('role_manager', lambda: DatabaseManager.get_role_requests(1, sample['manager_id']), 3000, FULL_LIST),
+        ('role_master', lambda: DatabaseManager.get_role_requests(2, sample['master_id']), 300, ()),
+        ('role_client', lambda: DatabaseManager.get_role_requests(4, sample['client_id']), 20, ()),
+        ('role_general', lambda: DatabaseManager.get_role_requests(None, 0), 20, FULL_LIST),
+        ('role_with_archive', lambda: DatabaseManager.get_role_requests(4, sample['client_id'], True), 50,
+         ("USE TEMP B-TREE FOR ORDER BY",)),
+        ('reference_data', DatabaseManager.get_reference_data, 1000,
+         ("SCAN orgTechTypes", "SCAN users", "USE TEMP B-TREE FOR ORDER BY")),
+        ('model_counts', DatabaseManager.get_model_counts, 200,
+         ("SCAN model_counts", "USE TEMP B-TREE FOR ORDER BY")),
+        ('user', lambda: DatabaseManager.get_user(sample['client_id']), 5, ()),
+        ('masters', DatabaseManager.get_masters, 10, ()),
+        ('users_since', lambda: DatabaseManager.get_users_since(sample['last_user_id'] - 10), 5, ()),
+        ('request_comments', lambda: DatabaseManager.get_request_comments(sample['request_id']), 5, ()),
+        ('request_timeline', lambda: DatabaseManager.get_request_timeline(sample['request_id']), 5, ()),
+        ('transitions_day', lambda: DatabaseManager.get_transitions(now - 86400, now), 20, ()),
+        ('parts_usage_month', lambda: DatabaseManager.get_parts_usage(month_start.isoformat(),
+                                                                      month_end.isoformat()), 50, GROUPED),
+        ('report_requests', report_month('requests'), 50, ()),
+        ('report_statuses', report_month('statuses'), 50, GROUPED),
+        ('report_masters', report_month('masters'), 50, GROUPED),
+        ('sla_overdue', lambda: DatabaseManager.get_overdue_requests(14), 100, ("USE TEMP B-TREE FOR ORDER BY",)),
+        ('daily_stats_month', lambda: DatabaseManager.get_daily_stats(month_start.isoformat(),
+                                                                      month_end.isoformat()), 5, ()),
+        ('master_changes', lambda: DatabaseManager.get_master_changes(
+            sample['master_id'], sample['last_seq'] - 100, sample['master_requests']), 30,
+         ("SCAN json_each", "SCAN orgTechTypes", "SCAN requestStatuses")),
+        ('create_request', lambda: DatabaseManager.create_request(1, "Тест", "Проверка", sample['client_id']), 50, ()),
+        ('change_status', lambda: DatabaseManager.apply_writes([('change_status', (1, sample['request_id']))]), 50, ()),
+        ('archive_batch', lambda: archive.archive_batch(
+            (date.today() - timedelta(days=archive.ARCHIVE_AFTER_DAYS)).isoformat(), 100), 200, ()),
+    ]
+
+
+def pick_sample(db_path: str) -> dict:
+    """Реальные ID и логин из БД для параметров сценариев"""
+    conn = sqlite3.connect(db_path, uri=db_path.startswith('file:'))
+    try:
+        one = lambda query: conn.execute(query).fetchone()
+        login, password = one("SELECT login, password FROM users ORDER BY IDuser DESC LIMIT 1")
+        sample = {
+            'login': login,
+            'password': password,
+            'manager_id': one("SELECT IDuser FROM users WHERE typeID = 1 LIMIT 1")[0],
+            'master_id': one("SELECT masterID FROM requests WHERE masterID IS NOT NULL LIMIT 1")[0],
+            'client_id': one("SELECT clientID FROM requests LIMIT 1")[0],
+            'request_id': one("SELECT MAX(IDrequest) FROM requests")[0],
+            'last_user_id': one("SELECT MAX(IDuser) FROM users")[0],
+            'last_seq': one("SELECT lastSeq FROM sync_sequence")[0],
+        }
+        sample['master_requests'] = [row[0] for row in conn.execute(
+            "SELECT IDrequest FROM requests WHERE masterID = ?", (sample['master_id'],))]
+        return sample
+    finally:
+        conn.close()
+
+
+def explain(conn: sqlite3.Connection, statement: str) -> list:
+    """Строки EXPLAIN QUERY PLAN для запроса (параметры уже подставлены трассировкой)"""
+    return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + statement)]
+
+
+def find_violations(plan: list, allowed: tuple) -> list:
+    """Полные просмотры таблиц и временные B-деревья, не разрешенные для сценария"""
+    return [line for line in plan
+            if (SCAN_PATTERN.match(line) or line.startswith(TEMP_BTREE_PREFIX))
+            and not line.startswith(allowed)]
+
+
+def check_query_plans(db_path: str, budget_scale: float = 1.0) -> bool:
+    """Выполняет все сценарии над db_path; печатает отчет и возвращает True, если все в норме"""
+    database.DB_PATH = db_path
+    # Для отчета по запчастям нужны данные в request_parts
+    parts.migrate_repair_parts()
+    sample = pick_sample(db_path)
+
+    statements = []
+    database.sql_trace = statements.append
+    plan_conn = sqlite3.connect(db_path, uri=db_path.startswith('file:'))
+    failed = []
+    try:
+        for name, run, budget_ms, allowed in get_scenarios(sample):
+            timings = []
+            for attempt in range(TIMING_RUNS):
+                role_query_cache.clear()
+                statements.clear()
+                started = time.perf_counter()
+                run()
+                timings.append((time.perf_counter() - started) * 1000)
+                if attempt == 0:
+                    queries = [s for s in statements if s.lstrip().split(None, 1)[0].upper()
+                               in ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH')]
+                # Изменяющие сценарии выполняем один раз
+                if name in ('create_request', 'change_status', 'archive_batch'):
+                    break
+
+            elapsed = statistics.median(timings)
+            problems = []
+            for query in queries:
+                for line in find_violations(explain(plan_conn, query), allowed):
+                    problems.append(f"{line}  <- {' '.join(query.split())[:120]}")
+            if elapsed > budget_ms * budget_scale:
+                problems.append(f"время {elapsed:.1f} мс превышает бюджет {budget_ms * budget_scale:.0f} мс")
+
+            mark = "❌" if problems else "✅"
+            print(f"{mark} {name:20} {elapsed:9.1f} мс (бюджет {budget_ms * budget_scale:.0f}), запросов: {len(queries)}")
+            for problem in problems:
+                print(f"      {problem}")
+            if problems:
+                failed.append(name)
+    finally:
+        database.sql_trace = None
+        plan_conn.close()
+
+    if failed:
+        print(f"❌ Регрессии планов или времени: {', '.join(failed)}")
+    else:
+        print("✅ Все запросы используют ожидаемые индексы и укладываются в бюджет")
+    return not failed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Проверка планов запросов (EXPLAIN QUERY PLAN) и времени выполнения на большой БД")
+    parser.add_argument('--db', help="проверить копию существующей БД вместо сгенерированной")
+    parser.add_argument('--requests', type=int, default=200000, help="заявок в сгенерированной БД")
+    parser.add_argument('--clients', type=int, default=50000, help="заказчиков в сгенерированной БД")
+    parser.add_argument('--memory', action='store_true', help="сгенерировать тестовую БД в памяти")
+    parser.add_argument('--budget-scale', type=float, default=1.0, help="множитель бюджетов времени")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_path = os.path.join(temp_dir, "plans.db")
+        if args.memory:
+            db_path = generate_database(database.create_memory_database(), requests=args.requests,
+                                        clients=args.clients)
+        elif args.db:
+            # Сценарии изменяют данные, поэтому работаем с копией
+            source, target = sqlite3.connect(args.db), sqlite3.connect(db_path)
+            source.backup(target)
+            source.close()
+            target.close()
+        else:
+            generate_database(db_path, requests=args.requests, clients=args.clients)
+        ok = check_query_plans(db_path, args.budget_scale)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+import sys
+
+# Столбцы заявки в порядке выборки из БД (см. REQUEST_COLUMNS в database.py);
+# archived выбирается только вместе с архивом (ARCHIVE_SOURCE)
+REQUEST_FIELDS = ('id', 'start_date', 'tech_type_id', 'model', 'problem', 'status_id',
+                  'completion_date', 'repair_parts', 'master_id', 'client_id', 'archived')
+
+
+def to_int(value):
+    """Приводит ID из БД к int (в архиве и до миграции 2 requestStatusID хранится как TEXT)"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def intern_text(value):
+    """
+    Интернирует строку: одинаковые даты, модели и описания проблем
+    хранятся в памяти в одном экземпляре.
+    """
+    if value is None:
+        return None
+    if not isinstance(value, str):
+        value = str(value)
+    return sys.intern(value)
+
+
+class RequestRecord:
+    """
+    Компактная запись заявки, общая для загрузчиков таблиц, кэша и сервера.
+    Хранит значения в слотах вместо словаря, ID приводятся к int,
+    повторяющиеся строки интернируются.
+    """
+    __slots__ = REQUEST_FIELDS
+
+    def __init__(self, id, start_date, tech_type_id, model, problem, status_id,
+                 completion_date, repair_parts, master_id, client_id, archived=False):
+        self.id = id
+        self.start_date = intern_text(start_date)
+        self.tech_type_id = to_int(tech_type_id)
+        self.model = intern_text(model)
+        self.problem = intern_text(problem)
+        self.status_id = to_int(status_id)
+        self.completion_date = intern_text(completion_date)
+        self.repair_parts = intern_text(repair_parts)
+        self.master_id = to_int(master_id)
+        self.client_id = to_int(client_id)
+        # Заявка из архива: изменения статуса и мастера к ней не применяются
+        self.archived = bool(archived)
+
+    @classmethod
+    def from_row(cls, row):
+        """Создает запись из строки БД или списка, полученного от сервера"""
+        return cls(*row)
+
+    def to_list(self):
+        """Список значений в порядке REQUEST_FIELDS (для передачи по сети)"""
+        return [getattr(self, field) for field in REQUEST_FIELDS]
+
+    @staticmethod
+    def text(value):
+        """Текст ячейки таблицы: строки возвращаются как есть, без копирования"""
+        if value is None:
+            return ""
+        return value if isinstance(value, str) else str(value)
+
+    def __repr__(self):
+        return f"RequestRecord(id={self.id}, status_id={self.status_id}, master_id={self.master_id})"
@@ -0,0 +1,295 @@
+import argparse
+import json
+import sqlite3
+import time
+import uuid
+
+import database
+from database import OFFLINE_OPERATIONS, apply_write, claim_write_key, run_with_retry
+
+# Служебные таблицы реплики (в центральной БД их нет)
+REPLICA_TABLES = [
+    # masterID, lastSeq - номер последнего полученного изменения, lastSync - время синхронизации,
+    # deviceID - идентификатор реплики в ключах отправляемых изменений
+    """
+    CREATE TABLE IF NOT EXISTS replica_state (
+        key TEXT PRIMARY KEY,
+        value
+    )
+    """,
+    # Изменения, сделанные без связи; baseStatus - статус заявки в реплике до изменения
+    """
+    CREATE TABLE IF NOT EXISTS pending_changes (
+        changeID INTEGER PRIMARY KEY AUTOINCREMENT,
+        requestID INTEGER NOT NULL,
+        operation TEXT NOT NULL,
+        params TEXT NOT NULL,
+        baseStatus INTEGER,
+        createdAt INTEGER NOT NULL
+    )
+    """,
+    # Изменения, отклоненные центральной БД, для просмотра мастером
+    """
+    CREATE TABLE IF NOT EXISTS sync_conflicts (
+        changeID INTEGER PRIMARY KEY,
+        requestID INTEGER NOT NULL,
+        operation TEXT NOT NULL,
+        params TEXT NOT NULL,
+        reason TEXT NOT NULL,
+        centralStatus INTEGER,
+        detectedAt INTEGER NOT NULL
+    )
+    """,
+]
+
+# Причины конфликтов (см. DatabaseManager.apply_master_changes)
+CONFLICT_REASONS = {
+    'status': "статус заявки изменен в центральной БД",
+    'reassigned': "заявка передана другому мастеру",
+    'removed': "заявка перенесена в архив",
+}
+
+
+class MasterReplica:
+    """
+    Локальная реплика мастера для работы без связи с центральной БД.
+
+    Файл реплики имеет ту же схему, что и uchet.db (миграции database.MIGRATIONS),
+    но содержит только заявки мастера, их заказчиков и комментарии и справочники,
+    поэтому окно мастера читает его через DatabaseManager без изменений.
+    Изменения статусов применяются к реплике сразу и копятся в pending_changes.
+    При синхронизации (sync) они отправляются в центральную БД, а обратно приходят
+    только заявки, измененные после последней синхронизации (по номерам changeSeq).
+    Все обращения к реплике идут по явному пути, а к центральной БД - через бэкенд,
+    поэтому обе БД могут быть файлами на одном компьютере.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.prepared = False
+
+    def run(self, operation, write: bool = False):
+        """Выполняет operation(conn) над репликой (служебные таблицы создаются при первом вызове)"""
+        if not self.prepared:
+            def prepare(conn):
+                for statement in REPLICA_TABLES:
+                    conn.execute(statement)
+            run_with_retry(prepare, write=True, db_path=self.path)
+            self.prepared = True
+        return run_with_retry(operation, write=write, db_path=self.path)
+
+    def get_state(self, key: str, default=None):
+        row = self.run(lambda conn: conn.execute("SELECT value FROM replica_state WHERE key = ?", (key,)).fetchone())
+        return row[0] if row else default
+
+    @property
+    def master_id(self):
+        return self.get_state('masterID')
+
+    def get_device_id(self) -> str:
+        """Идентификатор реплики для ключей изменений (создается при первом обращении)"""
+        def load(conn):
+            row = conn.execute("SELECT value FROM replica_state WHERE key = 'deviceID'").fetchone()
+            if row:
+                return row[0]
+            device_id = uuid.uuid4().hex
+            conn.execute("INSERT INTO replica_state (key, value) VALUES ('deviceID', ?)", (device_id,))
+            return device_id
+        return self.run(load, write=True)
+
+    def init(self, user: dict, password: str):
+        """
+        Подготавливает реплику для мастера user (результат authenticate в центральной БД).
+        Пароль сохраняется в реплике, чтобы мастер мог войти без связи.
+        """
+        if user.get('typeID') != 2:
+            raise ValueError("Реплика создается только для мастера")
+
+        def save(conn):
+            conn.execute("""
+                INSERT OR REPLACE INTO users (IDuser, fio, phone, login, password, typeID)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (user['IDuser'], user['fio'], user['phone'], user['login'], password, user['typeID']))
+            conn.executemany("INSERT OR REPLACE INTO replica_state (key, value) VALUES (?, ?)",
+                             [('masterID', user['IDuser']), ('lastSeq', -1)])
+        self.run(save, write=True)
+
+    def record_writes(self, writes: list) -> None:
+        """
+        Применяет изменения статусов [(операция, параметры[, ключ]), ...] к реплике и ставит их
+        в очередь на отправку (в одной транзакции). Вызывается вместо apply_writes.
+        """
+        for operation, params, *key in writes:
+            if operation not in OFFLINE_OPERATIONS:
+                raise ValueError(f"Операция недоступна без связи: {operation}")
+
+        def apply(conn):
+            now = int(time.time())
+            for operation, params, *key in writes:
+                if not claim_write_key(conn, key[0] if key else None):
+                    continue
+                request_id = params[-1]
+                row = conn.execute("SELECT requestStatusID FROM requests WHERE IDrequest = ?", (request_id,)).fetchone()
+                apply_write(conn, operation, params)
+                conn.execute("""
+                    INSERT INTO pending_changes (requestID, operation, params, baseStatus, createdAt)
+                    VALUES (?, ?, ?, ?, ?)
+                """, (request_id, operation, json.dumps(list(params), ensure_ascii=False),
+                      row[0] if row else None, now))
+        self.run(apply, write=True)
+
+    def pending_count(self) -> int:
+        return self.run(lambda conn: conn.execute("SELECT COUNT(*) FROM pending_changes").fetchone()[0])
+
+    def get_conflicts(self) -> list:
+        """Отклоненные изменения: [номер, IDrequest, операция, параметры, причина, статус в центральной БД]"""
+        return self.run(lambda conn: [
+            [change_id, request_id, operation, json.loads(params), reason, status]
+            for change_id, request_id, operation, params, reason, status in conn.execute("""
+                SELECT changeID, requestID, operation, params, reason, centralStatus
+                FROM sync_conflicts ORDER BY changeID
+            """)])
+
+    def clear_conflicts(self) -> None:
+        self.run(lambda conn: conn.execute("DELETE FROM sync_conflicts"), write=True)
+
+    def push(self, central) -> dict:
+        """Отправляет накопленные изменения в центральную БД; отклоненные сохраняет в sync_conflicts"""
+        pending = self.run(lambda conn: conn.execute("""
+            SELECT changeID, requestID, operation, params, baseStatus FROM pending_changes ORDER BY changeID
+        """).fetchall())
+        if not pending:
+            return {'applied': [], 'conflicts': []}
+
+        # Если ответ не дошел, изменения будут отправлены повторно. Центральная БД
+        # запоминает ключ каждого примененного изменения (applied_writes) и второй раз
+        # его не выполняет, поэтому события и дата завершения не дублируются
+        master_id, device_id = self.master_id, self.get_device_id()
+        result = central.apply_master_changes(master_id=master_id, changes=[
+            [change_id, request_id, operation, json.loads(params), base_status,
+             f"replica:{master_id}:{device_id}:{change_id}"]
+            for change_id, request_id, operation, params, base_status in pending])
+
+        def save(conn):
+            now = int(time.time())
+            for change_id, request_id, reason, status in result['conflicts']:
+                conn.execute("""
+                    INSERT OR REPLACE INTO sync_conflicts
+                        (changeID, requestID, operation, params, reason, centralStatus, detectedAt)
+                    SELECT changeID, requestID, operation, params, ?, ?, ? FROM pending_changes WHERE changeID = ?
+                """, (reason, status, now, change_id))
+            done = result['applied'] + [conflict[0] for conflict in result['conflicts']]
+            conn.execute("DELETE FROM pending_changes WHERE changeID IN (SELECT value FROM json_each(?))",
+                         (json.dumps(done),))
+        self.run(save, write=True)
+        return result
+
+    def pull(self, central) -> dict:
+        """Получает из центральной БД заявки мастера, измененные после прошлой синхронизации"""
+        known_ids = self.run(lambda conn: [row[0] for row in conn.execute("SELECT IDrequest FROM requests")])
+        changes = central.get_master_changes(master_id=self.master_id, since_seq=self.get_state('lastSeq', -1),
+                                             known_ids=known_ids)
+        columns = ("IDrequest",) + database.SYNC_COLUMNS
+
+        def save(conn):
+            # Строка из центральной БД заменяет локальную: ее статус уже учитывает отправленные изменения.
+            # Заявки с изменениями, сделанными после отправки, не трогаем, чтобы они не откатились;
+            # такие строки будут получены заново при следующей синхронизации
+            pending = {row[0] for row in conn.execute("SELECT DISTINCT requestID FROM pending_changes")}
+            rows = [row for row in changes['requests'] if row[0] not in pending]
+            skipped_seqs = [row[-1] for row in changes['requests'] if row[0] in pending]
+            last_seq = min(skipped_seqs) - 1 if skipped_seqs else changes['seq']
+            conn.executemany(f"""
+                INSERT INTO requests ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})
+                ON CONFLICT(IDrequest) DO UPDATE SET {', '.join(f'{c} = excluded.{c}' for c in columns[1:])}
+            """, [row[:len(columns)] for row in rows])
+            removed = json.dumps(changes['removed'])
+            conn.execute("DELETE FROM requests WHERE IDrequest IN (SELECT value FROM json_each(?))", (removed,))
+
+            changed = json.dumps(changes['removed'] + [row[0] for row in changes['requests']])
+            conn.execute("DELETE FROM comments WHERE requestID IN (SELECT value FROM json_each(?))", (changed,))
+            conn.executemany("INSERT OR REPLACE INTO comments VALUES (?, ?, ?, ?)", changes['comments'])
+            # Логин и пароль мастера в реплике не перезаписываются
+            conn.executemany("""
+                INSERT INTO users (IDuser, fio, phone, typeID) VALUES (?, ?, ?, ?)
+                ON CONFLICT(IDuser) DO UPDATE SET fio = excluded.fio, phone = excluded.phone, typeID = excluded.typeID
+            """, changes['users'])
+            conn.executemany("INSERT OR REPLACE INTO orgTechTypes VALUES (?, ?)", changes['tech_types'])
+            conn.executemany("INSERT OR REPLACE INTO requestStatuses VALUES (?, ?)", changes['statuses'])
+            conn.executemany("INSERT OR REPLACE INTO replica_state (key, value) VALUES (?, ?)",
+                             [('lastSeq', last_seq), ('lastSync', int(time.time()))])
+            return len(rows)
+        received = self.run(save, write=True)
+        return {'received': received, 'removed': len(changes['removed'])}
+
+    def sync(self, central) -> dict:
+        """
+        Синхронизация с центральной БД (central - бэкенд: LocalBackend или HttpBackend):
+        сначала отправка своих изменений, затем получение чужих. Ошибки связи
+        не перехватываются: несинхронизированные изменения остаются в очереди.
+        """
+        if self.master_id is None:
+            raise ValueError(f"Реплика {self.path} не подготовлена (python replica.py init)")
+        started = time.perf_counter()
+        pushed = self.push(central)
+        pulled = self.pull(central)
+        summary = {'applied': len(pushed['applied']), 'conflicts': pushed['conflicts'], **pulled}
+        print(f"🔄 Синхронизация за {time.perf_counter() - started:.2f} с: отправлено {summary['applied']}, "
+              f"конфликтов {len(summary['conflicts'])}, получено заявок {summary['received']}, "
+              f"удалено {summary['removed']}")
+        for change_id, request_id, reason, status in summary['conflicts']:
+            print(f"⚠️ Изменение заявки №{request_id} отклонено: {CONFLICT_REASONS.get(reason, reason)}")
+        return summary
+
+
+def get_central_backend(central_path: str = None):
+    """Бэкенд центральной БД: указанный файл или режим из settings.ini (файл БД или сервер)"""
+    from backend import LocalBackend, HttpBackend
+    from config import load_config
+
+    config = load_config()
+    if central_path:
+        database.DB_PATH = central_path
+        return LocalBackend()
+    if config.get('backend', 'mode') == 'http':
+        return HttpBackend(config.get('backend', 'url'), config.getfloat('backend', 'timeout'))
+    database.configure_database(config)
+    return LocalBackend()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Реплика мастера для работы без связи с центральной БД")
+    parser.add_argument('command', choices=['init', 'sync', 'status'])
+    parser.add_argument('--replica', required=True, help="файл реплики")
+    parser.add_argument('--central', help="файл центральной БД (по умолчанию из settings.ini: файл или сервер)")
+    parser.add_argument('--login', help="логин мастера (для init)")
+    parser.add_argument('--password', help="пароль мастера (для init)")
+    args = parser.parse_args()
+
+    replica = MasterReplica(args.replica)
+    if args.command == 'status':
+        print(f"👷 Мастер {replica.master_id}, последнее изменение {replica.get_state('lastSeq')}, "
+              f"неотправленных изменений {replica.pending_count()}")
+        for change_id, request_id, operation, params, reason, status in replica.get_conflicts():
+            print(f"⚠️ №{request_id}: {operation} {params} - {CONFLICT_REASONS.get(reason, reason)}")
+        return
+
+    central = get_central_backend(args.central)
+    if args.command == 'init':
+        if not args.login or not args.password:
+            parser.error("для init нужны --login и --password")
+        user = central.authenticate(login=args.login, password=args.password)
+        if user is None:
+            parser.error("неверный логин или пароль")
+        replica.init(user, args.password.strip())
+        print(f"✅ Реплика {args.replica} подготовлена для мастера {user['fio']}")
+    try:
+        replica.sync(central)
+    except (sqlite3.OperationalError, OSError) as e:
+        print(f"❌ Нет связи с центральной БД, изменения остаются в реплике: {e}")
+    except ValueError as e:
+        print(f"❌ Синхронизация отклонена, изменения остаются в реплике: {e}")
+
+
+if __name__ == '__main__':
+    main()
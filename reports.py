@@ -0,0 +1,148 @@
+import argparse
+import csv
+import os
+import sys
+import time
+from datetime import date
+from multiprocessing import Pool
+
+import database
+from database import START_DATE_ISO, COMPLETION_DATE_ISO, ARCHIVE_REQUEST_COLUMNS
+
+# Источник заявок: только рабочая таблица или вместе с архивом (см. archive.py)
+REQUESTS_SOURCE = "requests"
+ARCHIVE_SOURCE = (f"(SELECT {', '.join(ARCHIVE_REQUEST_COLUMNS)} FROM requests "
+                  f"UNION ALL SELECT {', '.join(ARCHIVE_REQUEST_COLUMNS)} FROM requests_archive)")
+
+# Отчеты: заголовок CSV и запросы за один период (параметры - начало и конец периода).
+# Каждый запрос фильтрует по выражению START_DATE_ISO / COMPLETION_DATE_ISO,
+# по которым построены индексы
+REPORTS = {
+    'requests': (
+        ['Месяц', 'Принято', 'Из них не выдано', 'Выдано за месяц'],
+        [f"""
+            SELECT COUNT(*), COALESCE(SUM(CAST(requestStatusID AS INTEGER) != 2), 0)
+            FROM {{source}} WHERE {START_DATE_ISO} BETWEEN ? AND ?
+        """, f"""
+            SELECT COUNT(*) FROM {{source}} WHERE {COMPLETION_DATE_ISO} BETWEEN ? AND ?
+        """],
+    ),
+    'statuses': (
+        ['Месяц', 'Статус', 'Заявок'],
+        [f"""
+            SELECT COALESCE(s.requestStatus, r.requestStatusID), COUNT(*)
+            FROM {{source}} r
+            LEFT JOIN requestStatuses s ON s.IDrequestStatus = CAST(r.requestStatusID AS INTEGER)
+            WHERE {START_DATE_ISO} BETWEEN ? AND ?
+            GROUP BY CAST(r.requestStatusID AS INTEGER)
+            ORDER BY CAST(r.requestStatusID AS INTEGER)
+        """],
+    ),
+    'masters': (
+        ['Месяц', 'Мастер', 'Выполнено заявок', 'Среднее время ремонта, дней'],
+        [f"""
+            SELECT COALESCE(u.fio, 'Не назначен'), COUNT(*),
+                   ROUND(AVG(julianday({COMPLETION_DATE_ISO}) - julianday({START_DATE_ISO})), 1)
+            FROM {{source}} r
+            LEFT JOIN users u ON u.IDuser = r.masterID
+            WHERE {COMPLETION_DATE_ISO} BETWEEN ? AND ?
+            GROUP BY r.masterID
+            ORDER BY COUNT(*) DESC
+        """],
+    ),
+}
+
+# Соединение только для чтения в каждом процессе пула (открывается один раз)
+_worker_connection = None
+
+
+def init_worker(db_path: str):
+    global _worker_connection
+    _worker_connection = database.connect_readonly(db_path)
+
+
+def split_months(start: date, end: date) -> list:
+    """Разбивает период на календарные месяцы: [(метка, начало, конец), ...] в формате 'гггг-мм-дд'"""
+    months = []
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        first = max(start, date(year, month, 1))
+        next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+        last = min(end, date.fromordinal(date(next_year, next_month, 1).toordinal() - 1))
+        months.append((f"{year}-{month:02d}", first.isoformat(), last.isoformat()))
+        year, month = next_year, next_month
+    return months
+
+
+def build_month(task) -> list:
+    """Строки отчета за один месяц (выполняется в процессе пула)"""
+    report, source, (label, first, last) = task
+    queries = REPORTS[report][1]
+    results = [_worker_connection.execute(query.format(source=source), (first, last)).fetchall()
+               for query in queries]
+    if report == 'requests':
+        # Однострочные запросы объединяются в одну строку отчета
+        return [[label] + [value for rows in results for value in rows[0]]]
+    return [[label] + list(row) for row in results[0]]
+
+
+def generate_report(report: str, start: date, end: date, output, workers: int = None,
+                    include_archive: bool = False, db_path: str = None) -> int:
+    """
+    Строит отчет за период и построчно пишет его в output (CSV).
+    Период делится на месяцы, месяцы обрабатываются параллельно в пуле процессов,
+    а результаты пишутся по порядку сразу по готовности. Возвращает число строк.
+    """
+    db_path = db_path or database.DB_PATH
+    # Создает недостающие индексы до запуска пула: соединения процессов только читают
+    database.connect(db_path).close()
+
+    source = ARCHIVE_SOURCE if include_archive else REQUESTS_SOURCE
+    tasks = [(report, source, month) for month in split_months(start, end)]
+    workers = workers or os.cpu_count() or 1
+
+    writer = csv.writer(output, delimiter=';')
+    writer.writerow(REPORTS[report][0])
+    rows_written = 0
+
+    if workers == 1:
+        init_worker(db_path)
+        chunks = map(build_month, tasks)
+    else:
+        pool = Pool(min(workers, len(tasks)) or 1, initializer=init_worker, initargs=(db_path,))
+        chunks = pool.imap(build_month, tasks)
+    try:
+        for rows in chunks:
+            writer.writerows(rows)
+            output.flush()
+            rows_written += len(rows)
+    finally:
+        if workers != 1:
+            pool.close()
+            pool.join()
+    return rows_written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Отчеты по заявкам без графического интерфейса (CSV)")
+    parser.add_argument('report', choices=sorted(REPORTS), help="вид отчета")
+    parser.add_argument('--from', dest='start', required=True, type=date.fromisoformat, help="начало периода, гггг-мм-дд")
+    parser.add_argument('--to', dest='end', default=date.today(), type=date.fromisoformat,
+                        help="конец периода, гггг-мм-дд (по умолчанию сегодня)")
+    parser.add_argument('--out', help="файл CSV (по умолчанию вывод в консоль)")
+    parser.add_argument('--workers', type=int, help="число процессов (по умолчанию по числу ядер)")
+    parser.add_argument('--archive', action='store_true', help="учитывать архивные заявки")
+    parser.add_argument('--db', default=database.DB_PATH, help="путь к файлу БД")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8-sig', newline='') as output:
+            rows = generate_report(args.report, args.start, args.end, output, args.workers, args.archive, args.db)
+    else:
+        rows = generate_report(args.report, args.start, args.end, sys.stdout, args.workers, args.archive, args.db)
+    print(f"✅ Отчет '{args.report}': {rows} строк за {time.perf_counter() - started:.2f} с", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+import argparse
+import os
+import random
+import sqlite3
+import time
+from datetime import date, timedelta
+
+import database
+
+# Объем тестовой БД по умолчанию: несколько лет работы крупного сервисного центра
+DEFAULT_REQUESTS = 200000
+DEFAULT_CLIENTS = 50000
+DEFAULT_MASTERS = 40
+DEFAULT_OPERATORS = 5
+# Период, за который распределяются даты приема заявок
+DEFAULT_YEARS = 5
+# Строк за один executemany
+INSERT_CHUNK = 10000
+
+TECH_TYPES = ["Компьютер", "Ноутбук", "Принтер", "Монитор", "Сканер", "Телефон", "Планшет", "Сервер"]
+STATUSES = [(1, "В процессе ремонта"), (2, "Готова к выдаче"), (3, "Новая заявка")]
+USER_TYPES = [(1, "Менеджер"), (2, "Мастер"), (3, "Оператор"), (4, "Заказчик")]
+MODELS = ["DEXP Aquilon O286", "DEXP Atlas H388", "HP LaserJet 1020", "Lenovo IdeaPad 3", "Samsung S24",
+          "Acer Aspire 5", "Canon LBP2900", "ASUS VivoBook 15", "Xiaomi Redmi 9", "Philips 243V"]
+PROBLEMS = ["Перестал работать", "Не включается", "Не печатает", "Перегревается", "Разбит экран",
+            "Не заряжается", "Шумит вентилятор", "Зависает при загрузке"]
+PARTS = ["Кулер", "Термопаста", "Блок питания", "Матрица", "Аккумулятор", "Разъем зарядки", "Картридж"]
+LAST_NAMES = ["Иванов", "Петров", "Сидоров", "Кузнецов", "Смирнов", "Попов", "Васильев", "Соколов",
+              "Михайлов", "Новиков", "Федоров", "Морозов", "Волков", "Алексеев", "Лебедев"]
+FIRST_NAMES = ["Иван", "Петр", "Сергей", "Андрей", "Олег", "Алексей", "Дмитрий", "Михаил"]
+
+
+def chunks(rows, size: int = INSERT_CHUNK):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def make_fio(rng: random.Random) -> str:
+    return f"{rng.choice(LAST_NAMES)} {rng.choice(FIRST_NAMES)} {rng.choice(FIRST_NAMES)}ович"
+
+
+def generate_database(path: str, requests: int = DEFAULT_REQUESTS, clients: int = DEFAULT_CLIENTS,
+                      masters: int = DEFAULT_MASTERS, operators: int = DEFAULT_OPERATORS,
+                      years: int = DEFAULT_YEARS, seed: int = 1) -> str:
+    """
+    Создает БД со структурой uchet.db и случайными данными заданного объема.
+    Схема создается теми же миграциями, что и рабочая БД (см. database.MIGRATIONS):
+    сначала только таблицы, индексы - после загрузки данных. Возвращает путь к файлу.
+    """
+    if os.path.exists(path):
+        os.remove(path)
+    rng = random.Random(seed)
+    started = time.perf_counter()
+
+    # path может быть URI БД в памяти (см. database.create_memory_database)
+    conn = sqlite3.connect(path, isolation_level=None, uri=path.startswith('file:'))
+    conn.execute("PRAGMA journal_mode = WAL")
+    # Миграции до таблицы заявок с первичным ключом включительно, без индексов
+    database.migrate(conn, path, target_version=2)
+    conn.execute("BEGIN")
+    conn.executemany("INSERT INTO orgTechTypes VALUES (?, ?)", list(enumerate(TECH_TYPES, 1)))
+    conn.executemany("INSERT INTO requestStatuses VALUES (?, ?)", STATUSES)
+    conn.executemany("INSERT INTO types VALUES (?, ?)", USER_TYPES)
+
+    # Пользователи: менеджер, операторы, мастера, затем заказчики
+    roles = [1] + [3] * operators + [2] * masters + [4] * clients
+    users = [(user_id, make_fio(rng), 89000000000 + rng.randrange(10 ** 9),
+              f"login{user_id}", f"pass{user_id}", type_id)
+             for user_id, type_id in enumerate(roles, 1)]
+    for chunk in chunks(users):
+        conn.executemany("INSERT INTO users VALUES (?, ?, ?, ?, ?, ?)", chunk)
+    master_ids = [user[0] for user in users if user[5] == 2]
+    client_ids = [user[0] for user in users if user[5] == 4]
+
+    first_day = date.today() - timedelta(days=365 * years)
+    period_days = 365 * years
+    request_rows = []
+    comment_rows = []
+    for request_id in range(1, requests + 1):
+        start = first_day + timedelta(days=rng.randrange(period_days))
+        # Старые заявки в основном выданы, свежие - в работе
+        age = (date.today() - start).days
+        status = 2 if age > 30 and rng.random() < 0.9 else rng.choice((1, 2, 3))
+        completion = ""
+        if status == 2:
+            completion = min(start + timedelta(days=rng.randint(1, 30)), date.today()).strftime("%d.%m.%Y")
+        master_id = rng.choice(master_ids) if status != 3 else None
+        parts = ", ".join(rng.sample(PARTS, rng.randint(1, 2))) if status == 2 and rng.random() < 0.5 else ""
+        request_rows.append((request_id, start.strftime("%d.%m.%Y"), rng.randint(1, len(TECH_TYPES)),
+                             rng.choice(MODELS), rng.choice(PROBLEMS), status, completion, parts,
+                             master_id, rng.choice(client_ids)))
+        if master_id and rng.random() < 0.3:
+            comment_rows.append((len(comment_rows) + 1, "Будем разбираться!", master_id, request_id))
+
+    for chunk in chunks(request_rows):
+        conn.executemany("INSERT INTO requests VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", chunk)
+    for chunk in chunks(comment_rows):
+        conn.executemany("INSERT INTO comments VALUES (?, ?, ?, ?)", chunk)
+    conn.execute("COMMIT")
+    conn.close()
+
+    # Остальные миграции: индексы и служебные таблицы (после загрузки данных - так быстрее)
+    conn = database.connect(path)
+    events = [(row[0], int(time.mktime(time.strptime(row[1], "%d.%m.%Y"))), database.EVENT_CREATED, None, 3)
+              for row in request_rows]
+    conn.execute("BEGIN")
+    for chunk in chunks(events):
+        conn.executemany("""
+            INSERT INTO request_events (requestID, eventTime, eventType, oldValue, newValue)
+            VALUES (?, ?, ?, ?, ?)
+        """, chunk)
+    conn.execute("COMMIT")
+    conn.execute("ANALYZE")
+    conn.close()
+
+    size = "в памяти" if database.is_memory_db(path) else f"{os.path.getsize(path) / 1024 / 1024:.1f} МБ"
+    print(f"✅ Тестовая БД {path}: {requests} заявок, {clients} заказчиков, {masters} мастеров "
+          f"за {time.perf_counter() - started:.1f} с ({size})")
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Генерация большой тестовой БД со структурой uchet.db")
+    parser.add_argument('path', help="файл создаваемой БД (существующий будет перезаписан)")
+    parser.add_argument('--requests', type=int, default=DEFAULT_REQUESTS)
+    parser.add_argument('--clients', type=int, default=DEFAULT_CLIENTS)
+    parser.add_argument('--masters', type=int, default=DEFAULT_MASTERS)
+    parser.add_argument('--years', type=int, default=DEFAULT_YEARS)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    generate_database(args.path, args.requests, args.clients, args.masters, years=args.years, seed=args.seed)
+
+
+if __name__ == '__main__':
+    main()
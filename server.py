@@ -0,0 +1,236 @@
+import argparse
+import json
+import random
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import database
+from backend import LocalBackend, HttpBackend, READ_METHODS, WRITE_METHODS
+from config import load_config
+from maintenance import start_scheduler_from_config
+from query_cache import role_query_cache
+from records import RequestRecord
+
+# Результаты этих методов держим в памяти до следующей записи
+CACHED_METHODS = ('get_role_requests', 'get_reference_data', 'get_user', 'get_masters',
+                  'get_request_comments', 'get_daily_stats', 'get_sla_deadlines', 'get_model_counts')
+
+
+class DatabaseService:
+    """
+    Общий доступ к БД для всех рабочих мест.
+    Записи выполняются строго по одной (блокировка write_lock), поэтому клиенты
+    не конкурируют за блокировку файла БД. Результаты чтения кэшируются
+    с версией: номером записи сервера (generation) и PRAGMA data_version файла БД.
+    Запись через сервер и изменение БД в обход него (archive.py, parts.py,
+    обслуживание) делают записи кэша недействительными.
+    """
+
+    def __init__(self):
+        self.backend = LocalBackend()
+        self.write_lock = threading.Lock()
+        self.cache_lock = threading.Lock()
+        self.cache = {}                  # ключ -> (версия, результат)
+        self.generation = 0              # растет с каждой записью через сервер
+        self.stats_lock = threading.Lock()
+        self.stats = {'reads': 0, 'cache_hits': 0, 'writes': 0, 'errors': 0}
+
+    def count(self, name: str):
+        with self.stats_lock:
+            self.stats[name] += 1
+
+    def get_stats(self) -> dict:
+        with self.stats_lock:
+            return dict(self.stats)
+
+    def get_version(self):
+        """Версия данных (номер записи, data_version) или None, если БД заблокирована"""
+        with self.cache_lock:
+            generation = self.generation
+        version = role_query_cache.get_version(database.DB_PATH)
+        return None if version is None else (generation, version)
+
+    def call(self, method: str, params: dict):
+        if method in WRITE_METHODS:
+            with self.write_lock:
+                try:
+                    return self.backend.call(method, **params)
+                finally:
+                    self.count('writes')
+                    with self.cache_lock:
+                        self.generation += 1
+                        self.cache.clear()
+
+        if method not in READ_METHODS:
+            raise ValueError(f"Неизвестный метод: {method}")
+
+        self.count('reads')
+        if method not in CACHED_METHODS:
+            return self.backend.call(method, **params)
+
+        key = (method, json.dumps(params, sort_keys=True))
+        version = self.get_version()
+        with self.cache_lock:
+            entry = self.cache.get(key)
+            if version is not None and entry is not None and entry[0] == version:
+                self.count('cache_hits')
+                return entry[1]
+        result = self.backend.call(method, **params)
+        # Пока выполнялось чтение, могла пройти запись: такой результат не кэшируем
+        if version is not None and self.get_version() == version:
+            with self.cache_lock:
+                self.cache[key] = (version, result)
+        return result
+
+    def answer(self, method: str, params: dict) -> dict:
+        """Выполняет вызов и упаковывает результат или ошибку для ответа клиенту"""
+        try:
+            return {'result': self.call(method, params)}
+        except (sqlite3.Error, ValueError, TypeError) as e:
+            self.count('errors')
+            return {'error': str(e), 'kind': type(e).__name__}
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """HTTP-обработчик: POST /api/<метод> и POST /api/batch с JSON в теле"""
+
+    service = None
+
+    def do_POST(self):
+        if not self.path.startswith('/api/'):
+            self.send_json(404, {'error': 'Not found'})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length).decode('utf-8') or '{}')
+        except ValueError:
+            self.send_json(400, {'error': 'Некорректный JSON'})
+            return
+
+        method = self.path[len('/api/'):]
+        if method == 'batch':
+            results = [self.service.answer(call.get('method', ''), call.get('params', {}))
+                       for call in payload.get('calls', [])]
+            self.send_json(200, {'results': results})
+        else:
+            self.send_json(200, self.service.answer(method, payload))
+
+    def do_GET(self):
+        if self.path == '/stats':
+            self.send_json(200, {'service': self.service.get_stats(), 'locks': database.get_lock_stats()})
+        else:
+            self.send_json(404, {'error': 'Not found'})
+
+    def send_json(self, status: int, payload):
+        body = json.dumps(payload, ensure_ascii=False, default=RequestRecord.to_list).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Не засоряем консоль строкой на каждый запрос
+        pass
+
+
+def create_server(host: str, port: int) -> ThreadingHTTPServer:
+    """Создает HTTP-сервер с общим DatabaseService (port=0 - любой свободный порт)"""
+    handler = type('Handler', (ServiceHandler,), {'service': DatabaseService()})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def run_load_test(clients: int, calls_per_client: int, write_ratio: float = 0.1):
+    """
+    Нагрузочный тест: поднимает сервер на localhost над копией БД
+    и запускает clients одновременных клиентов.
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # БД в памяти и так одноразовая, файл БД копируем
+        if not database.is_memory_db(database.DB_PATH):
+            db_copy = f"{temp_dir}/uchet.db"
+            shutil.copy(database.DB_PATH, db_copy)
+            database.DB_PATH = db_copy
+
+        server = create_server('127.0.0.1', 0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        print(f"🧪 Нагрузочный тест: {clients} клиентов x {calls_per_client} вызовов, сервер {url}")
+
+        setup = HttpBackend(url)
+        users = setup.get_reference_data()['users']
+        request_ids = [record.id for record in setup.get_role_requests(role_id=1, user_id=0)]
+
+        latencies = []
+        errors = []
+        lock = threading.Lock()
+
+        def simulate_client(seed):
+            rng = random.Random(seed)
+            client = HttpBackend(url)
+            user = rng.choice(users)
+            for _ in range(calls_per_client):
+                started = time.perf_counter()
+                try:
+                    if request_ids and rng.random() < write_ratio:
+                        client.apply_writes(writes=[('change_status', (rng.randint(1, 3), rng.choice(request_ids)))])
+                    else:
+                        client.get_role_requests(role_id=user[3], user_id=user[0])
+                except sqlite3.Error as e:
+                    with lock:
+                        errors.append(str(e))
+                with lock:
+                    latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=simulate_client, args=(seed,)) for seed in range(clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        server.shutdown()
+
+        latencies.sort()
+        percentile = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+        print(f"✅ Вызовов: {len(latencies)} за {elapsed:.2f} с ({len(latencies) / elapsed:.0f} в секунду)")
+        print(f"   Задержка, мс: средняя {statistics.mean(latencies) * 1000:.1f}, "
+              f"p50 {percentile(0.5):.1f}, p95 {percentile(0.95):.1f}, p99 {percentile(0.99):.1f}")
+        print(f"   Ошибок: {len(errors)}; сервер: {server.RequestHandlerClass.service.get_stats()}")
+        return {'calls': len(latencies), 'elapsed': elapsed, 'errors': errors}
+
+
+def main():
+    config = load_config()
+    parser = argparse.ArgumentParser(description="Сервер БД учета заявок для нескольких рабочих мест")
+    parser.add_argument('--host', default=config.get('server', 'host'))
+    parser.add_argument('--port', type=int, default=config.getint('server', 'port'))
+    parser.add_argument('--db', help="путь к файлу БД (по умолчанию [database] path в settings.ini)")
+    parser.add_argument('--load-test', type=int, metavar='N', help="нагрузочный тест с N клиентами")
+    parser.add_argument('--calls', type=int, default=100, help="вызовов на клиента в нагрузочном тесте")
+    args = parser.parse_args()
+
+    if args.db:
+        database.DB_PATH = args.db
+    else:
+        database.configure_database(config)
+    if args.load_test:
+        run_load_test(args.load_test, args.calls)
+        return
+
+    server = create_server(args.host, args.port)
+    start_scheduler_from_config()
+    print(f"🚀 Сервер запущен: http://{args.host}:{args.port} (БД: {database.DB_PATH})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("🛑 Сервер остановлен")
+
+
+if __name__ == '__main__':
+    main()
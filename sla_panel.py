@@ -0,0 +1,179 @@
+import sqlite3
+from datetime import date, timedelta
+
+from PyQt5.QtWidgets import (QWidget, QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPushButton,
+                             QTableWidget, QTableWidgetItem, QHeaderView, QComboBox, QSpinBox)
+from PyQt5.QtGui import QPainter, QColor
+from PyQt5.QtCore import Qt, QTimer
+
+from config import load_config
+
+# Цвета столбцов графика: принято / выдано
+INTAKE_COLOR = QColor("#3498db")
+COMPLETED_COLOR = QColor("#27ae60")
+
+
+class HistogramWidget(QWidget):
+    """График по дням: пара столбцов (принято, выдано) на каждый день периода"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.days = []      # [(день 'гггг-мм-дд', принято, выдано)]
+        self.setMinimumHeight(180)
+
+    def set_data(self, days):
+        self.days = days
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), Qt.white)
+        if not self.days:
+            painter.drawText(self.rect(), Qt.AlignCenter, "Нет данных за период")
+            return
+
+        top, bottom = 20, self.height() - 20
+        slot = (self.width() - 10) / len(self.days)
+        bar = max(1.0, slot / 2 - 1)
+        peak = max(max(intake, completed) for _, intake, completed in self.days) or 1
+
+        for index, (day, intake, completed) in enumerate(self.days):
+            left = 5 + index * slot
+            for offset, value, color in ((0, intake, INTAKE_COLOR), (bar, completed, COMPLETED_COLOR)):
+                height = (bottom - top) * value / peak
+                painter.fillRect(int(left + offset), int(bottom - height), int(bar), int(height), color)
+            # Подписи дат - только у каждого седьмого дня, чтобы не налезали
+            if index % 7 == 0:
+                painter.drawText(int(left), self.height() - 4, day[8:10] + "." + day[5:7])
+
+        painter.setPen(INTAKE_COLOR)
+        painter.drawText(5, 14, f"■ принято (макс. {peak})")
+        painter.setPen(COMPLETED_COLOR)
+        painter.drawText(180, 14, "■ выдано")
+
+
+class SlaDialog(QDialog):
+    """
+    Панель менеджера: заявки, вышедшие за срок ремонта своего типа техники,
+    и график приема/выдачи заявок по дням. Данные берутся из индексированного
+    выражения даты приема и таблицы daily_stats, которую ведут триггеры БД,
+    поэтому обновление по таймеру не просматривает таблицу заявок целиком.
+    """
+
+    def __init__(self, backend, tech_types, status_names, parent=None):
+        super().__init__(parent)
+        self.backend = backend
+        self.tech_types = tech_types or {}
+        self.status_names = status_names
+
+        config = load_config()
+        self.default_days = config.getint('sla', 'default_days')
+        self.histogram_days = config.getint('sla', 'histogram_days')
+
+        self.init_ui()
+
+        # Обновление только пока панель открыта
+        self.timer = QTimer(self)
+        self.timer.setInterval(config.getint('sla', 'refresh_seconds') * 1000)
+        self.timer.timeout.connect(self.refresh)
+
+    def init_ui(self):
+        self.setWindowTitle("Просрочки и статистика приема")
+        self.resize(900, 650)
+        layout = QVBoxLayout(self)
+
+        self.summary_label = QLabel()
+        self.summary_label.setStyleSheet("font-size: 14px; font-weight: bold;")
+        layout.addWidget(self.summary_label)
+
+        self.overdue_table = QTableWidget()
+        self.overdue_table.setColumnCount(6)
+        self.overdue_table.setHorizontalHeaderLabels(
+            ["ID", "Дата приема", "Тип техники", "Статус", "Дней в работе", "Срок, дней"])
+        self.overdue_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.overdue_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.overdue_table.verticalHeader().setVisible(False)
+        layout.addWidget(self.overdue_table)
+
+        # Сроки ремонта по типам техники
+        deadline_layout = QHBoxLayout()
+        deadline_layout.addWidget(QLabel("Срок ремонта для типа:"))
+        self.type_combo = QComboBox()
+        for type_id, type_name in sorted(self.tech_types.items(), key=lambda item: item[1]):
+            self.type_combo.addItem(type_name, type_id)
+        self.type_combo.currentIndexChanged.connect(self.show_deadline)
+        deadline_layout.addWidget(self.type_combo)
+        self.days_spin = QSpinBox()
+        self.days_spin.setRange(1, 365)
+        self.days_spin.setSuffix(" дн.")
+        deadline_layout.addWidget(self.days_spin)
+        save_btn = QPushButton("Сохранить срок")
+        save_btn.clicked.connect(self.save_deadline)
+        deadline_layout.addWidget(save_btn)
+        reset_btn = QPushButton("По умолчанию")
+        reset_btn.clicked.connect(lambda: self.save_deadline(reset=True))
+        deadline_layout.addWidget(reset_btn)
+        deadline_layout.addStretch()
+        layout.addLayout(deadline_layout)
+
+        layout.addWidget(QLabel(f"Прием и выдача заявок за {self.histogram_days} дней"))
+        self.histogram = HistogramWidget()
+        layout.addWidget(self.histogram)
+
+        self.deadlines = {}
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.refresh()
+        self.timer.start()
+
+    def hideEvent(self, event):
+        self.timer.stop()
+        super().hideEvent(event)
+
+    def refresh(self):
+        """Перечитывает просроченные заявки, сроки и статистику по дням"""
+        last_day = date.today()
+        first_day = last_day - timedelta(days=self.histogram_days - 1)
+        try:
+            self.deadlines = dict(self.backend.get_sla_deadlines())
+            overdue = self.backend.get_overdue_requests(default_days=self.default_days)
+            stats = self.backend.get_daily_stats(start_date=first_day.isoformat(), end_date=last_day.isoformat())
+        except sqlite3.Error as e:
+            print(f"⚠️ Не удалось обновить панель просрочек: {e}")
+            return
+
+        self.show_overdue(overdue)
+        self.show_deadline()
+        # Дни без заявок в daily_stats отсутствуют - дополняем нулями
+        counts = {day: (intake, completed) for day, intake, completed in stats}
+        days = [(first_day + timedelta(days=offset)).isoformat() for offset in range(self.histogram_days)]
+        self.histogram.set_data([(day,) + counts.get(day, (0, 0)) for day in days])
+
+    def show_overdue(self, overdue):
+        self.overdue_table.setRowCount(len(overdue))
+        for row, (request_id, start_date, type_id, status_id, master_id, client_id, days, max_days) in enumerate(overdue):
+            values = [request_id, start_date, self.tech_types.get(type_id, type_id),
+                      self.status_names.get(status_id, status_id), days, max_days]
+            for col, value in enumerate(values):
+                item = QTableWidgetItem(str(value))
+                if col == 4 and days >= 2 * max_days:
+                    item.setForeground(QColor("#c0392b"))
+                self.overdue_table.setItem(row, col, item)
+        self.summary_label.setText(f"Просрочено заявок: {len(overdue)}")
+
+    def show_deadline(self):
+        """Показывает срок выбранного типа техники"""
+        type_id = self.type_combo.currentData()
+        self.days_spin.setValue(self.deadlines.get(type_id, self.default_days))
+
+    def save_deadline(self, reset=False):
+        type_id = self.type_combo.currentData()
+        if type_id is None:
+            return
+        try:
+            self.backend.set_sla_deadline(tech_type_id=type_id, max_days=None if reset else self.days_spin.value())
+        except sqlite3.Error as e:
+            print(f"❌ Не удалось сохранить срок: {e}")
+            return
+        self.refresh()
@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+
+# Модули программы лежат в корне репозитория
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import database
+from query_cache import role_query_cache
+from sample_data import generate_database
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    """Небольшая сгенерированная БД (планы запросов на ней те же, что на большой); database.DB_PATH указывает на нее на время теста"""
+    path = generate_database(str(tmp_path / "uchet.db"), requests=3000, clients=300, masters=3, operators=1)
+    monkeypatch.setattr(database, 'DB_PATH', path)
+    yield path
+    role_query_cache.clear(path)
+
+
+@pytest.fixture(autouse=True)
+def run_in_tmp(tmp_path, monkeypatch):
+    """Тесты работают во временном каталоге: журналы и файлы программы не попадают в репозиторий"""
+    monkeypatch.chdir(tmp_path)
@@ -0,0 +1,45 @@
+import io
+from datetime import datetime
+
+from batch_intake import DATE_FORMAT, parse_intake_file
+
+HEADER = "startDate;orgTechTypeID;orgTechModel;problemDescryption;clientID\n"
+
+
+def parse(text):
+    return parse_intake_file(io.StringIO(text), tech_types={1, 2}, client_ids={7})
+
+
+def test_valid_rows_are_loaded():
+    rows, errors = parse(HEADER + "01.02.2024;1;HP 1020;Не печатает;7\n")
+    assert rows == [["01.02.2024", 1, "HP 1020", "Не печатает", 7]]
+    assert errors == []
+
+
+def test_start_date_is_zero_padded():
+    rows, errors = parse(HEADER + "1.2.2024;2;Lenovo;Не включается;7\n")
+    assert rows[0][0] == "01.02.2024"
+    assert errors == []
+
+
+def test_missing_start_date_is_today():
+    rows, _ = parse(HEADER + ";1;HP;Шумит;7\n")
+    assert rows[0][0] == datetime.now().strftime(DATE_FORMAT)
+
+
+def test_invalid_rows_are_reported_and_skipped():
+    rows, errors = parse(HEADER +
+                         "2024-02-01;1;HP;Не печатает;7\n"
+                         "01.02.2024;9;HP;Не печатает;8\n"
+                         "\n"
+                         "01.02.2024;1;Acer;Не включается;7\n")
+    assert rows == [["01.02.2024", 1, "Acer", "Не включается", 7]]
+    assert [line for line, message in errors] == [2, 3]
+    assert "дд.мм.гггг" in errors[0][1]
+    assert "неизвестный тип техники" in errors[1][1] and "неизвестный заказчик" in errors[1][1]
+
+
+def test_missing_columns():
+    rows, errors = parse("orgTechTypeID;orgTechModel\n1;HP\n")
+    assert rows == []
+    assert errors == [(1, "нет столбцов: problemDescryption, clientID")]
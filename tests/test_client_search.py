@@ -0,0 +1,45 @@
+from client_search import ClientIndex
+
+USERS = [
+    [1, "Петров Иван Сергеевич", 89001234567, 4],
+    [2, "Иванова Алёна Петровна", 89007654321, 4],
+    [3, "Петров Олег Иванович", 89001239999, 4],
+    [4, "Мастеров Петр", 89001230000, 2],
+]
+
+
+def ids(results):
+    return [user[0] for user in results]
+
+
+def test_search_by_phone_prefix():
+    index = ClientIndex(USERS)
+    assert ids(index.search("8900123")) == [1, 3]
+    assert ids(index.search("+7 900 765")) == []
+    assert ids(index.search("8-900-765")) == [2]
+
+
+def test_search_by_start_of_any_name_word():
+    index = ClientIndex(USERS)
+    # Отчество тоже слово ФИО: "Петровна" находится по "петров"
+    assert ids(index.search("петров")) == [1, 3, 2]
+    # Ключи упорядочены: "иван сергеевич" < "иванова алена петровна" < "иванович"
+    assert ids(index.search("Иван")) == [1, 2, 3]
+    assert ids(index.search("алена")) == [2]
+
+
+def test_only_clients_are_indexed_and_limit_applies():
+    index = ClientIndex(USERS)
+    assert ids(index.search("Мастеров")) == []
+    assert len(index.search("8900", limit=2)) == 2
+
+
+def test_update_and_remove():
+    index = ClientIndex(USERS)
+    index.update([5, "Сидоров Петр", 89005550000, 4])
+    index.update([1, "Кузнецов Иван", 89001234567, 4])
+    assert ids(index.search("петров")) == [3, 2]
+    assert ids(index.search("кузнецов")) == [1]
+    index.remove(3)
+    assert ids(index.search("петр")) == [5, 2]
+    assert index.search("   ") == []
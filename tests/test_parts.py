@@ -0,0 +1,24 @@
+from parts import parse_repair_parts
+
+
+def test_splits_positions_by_separators():
+    assert parse_repair_parts("Кулер, Термопаста; Блок питания\nМатрица") == [
+        ("Кулер", 1), ("Термопаста", 1), ("Блок питания", 1), ("Матрица", 1)]
+
+
+def test_reads_quantity_suffix_and_prefix():
+    assert parse_repair_parts("Кулер x2, Термопаста - 3 шт, 2x Аккумулятор, 4 шт Картридж") == [
+        ("Кулер", 2), ("Термопаста", 3), ("Аккумулятор", 2), ("Картридж", 4)]
+
+
+def test_number_without_unit_is_part_of_name():
+    assert parse_repair_parts("Аккумулятор HP 1234") == [("Аккумулятор HP 1234", 1)]
+
+
+def test_same_part_is_summed_case_insensitively():
+    assert parse_repair_parts("Кулер, кулер x2") == [("Кулер", 3)]
+
+
+def test_empty_text():
+    assert parse_repair_parts(None) == []
+    assert parse_repair_parts(" ;, ") == []
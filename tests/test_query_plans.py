@@ -0,0 +1,41 @@
+import sqlite3
+
+import query_plans
+from query_plans import FULL_LIST, GROUPED, SCAN_PATTERN, find_violations
+
+
+def test_scan_pattern_matches_full_table_scans_only():
+    assert SCAN_PATTERN.match("SCAN requests").group(1) == "requests"
+    assert SCAN_PATTERN.match("SCAN r USING INDEX idx_requests_start")
+    assert not SCAN_PATTERN.match("SCAN CONSTANT ROW")
+    assert not SCAN_PATTERN.match("SCAN (subquery-1)")
+    assert not SCAN_PATTERN.match("SEARCH r USING INDEX idx_requests_master (masterID=?)")
+
+
+def test_find_violations_reports_scans_and_temp_btrees():
+    plan = [
+        "SEARCH r USING INDEX idx_requests_client (clientID=?)",
+        "SCAN users",
+        "USE TEMP B-TREE FOR ORDER BY",
+        "SCAN CONSTANT ROW",
+    ]
+    assert find_violations(plan, ()) == ["SCAN users", "USE TEMP B-TREE FOR ORDER BY"]
+
+
+def test_find_violations_respects_allowed_lines():
+    plan = ["SCAN r USING INDEX idx_requests_start", "USE TEMP B-TREE FOR GROUP BY", "SCAN requests"]
+    assert find_violations(plan, FULL_LIST + GROUPED) == ["SCAN requests"]
+
+
+def test_unindexed_query_is_reported(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        plan = query_plans.explain(conn, "SELECT * FROM requests WHERE problemDescryption = 'Не включается'")
+    finally:
+        conn.close()
+    assert find_violations(plan, ()) == ["SCAN requests"]
+
+
+def test_all_scenarios_use_expected_plans(db_path):
+    # На маленькой БД время не показательно: проверяем планы, бюджеты с большим запасом
+    assert query_plans.check_query_plans(db_path, budget_scale=20)
@@ -0,0 +1,108 @@
+import sqlite3
+
+import pytest
+
+import database
+from backend import LocalBackend
+from replica import MasterReplica
+
+
+class LostResponse(LocalBackend):
+    """Центральная БД применяет изменения, но первый ответ до реплики не доходит"""
+
+    def __init__(self):
+        self.lost = False
+
+    def apply_master_changes(self, **params):
+        result = self.call('apply_master_changes', **params)
+        if not self.lost:
+            self.lost = True
+            raise sqlite3.OperationalError("Сервер недоступен: ответ потерян")
+        return result
+
+
+@pytest.fixture
+def replica(db_path, tmp_path):
+    """Реплика первого мастера в отдельном файле, синхронизированная с центральной БД db_path"""
+    conn = sqlite3.connect(db_path)
+    master_id = conn.execute("SELECT MIN(IDuser) FROM users WHERE typeID = 2").fetchone()[0]
+    conn.close()
+    central = LocalBackend()
+    user = central.authenticate(login=f"login{master_id}", password=f"pass{master_id}")
+    replica = MasterReplica(str(tmp_path / "replica.db"))
+    replica.init(user, f"pass{master_id}")
+    replica.sync(central)
+    return replica
+
+
+def query(path, sql, params=()):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
+
+
+def request_in_progress(replica):
+    return query(replica.path, "SELECT IDrequest FROM requests WHERE requestStatusID = 1 ORDER BY IDrequest")[0][0]
+
+
+def test_pull_copies_only_master_requests(replica, db_path):
+    local = query(replica.path, "SELECT IDrequest, requestStatusID FROM requests ORDER BY IDrequest")
+    central = query(db_path, "SELECT IDrequest, requestStatusID FROM requests WHERE masterID = ? ORDER BY IDrequest",
+                    (replica.master_id,))
+    assert local == central
+    assert replica.sync(LocalBackend())['received'] == 0
+
+
+def test_offline_change_is_pushed(replica, db_path):
+    request_id = request_in_progress(replica)
+    replica.record_writes([('change_status', (2, request_id))])
+    assert replica.pending_count() == 1
+
+    summary = replica.sync(LocalBackend())
+    assert summary['applied'] == 1 and summary['conflicts'] == []
+    assert replica.pending_count() == 0
+    assert query(db_path, "SELECT requestStatusID FROM requests WHERE IDrequest = ?", (request_id,)) == [(2,)]
+
+
+def test_resend_after_lost_response_is_applied_once(replica, db_path):
+    request_id = request_in_progress(replica)
+    replica.record_writes([('complete_request', (2, "01.02.2024", request_id))])
+    central = LostResponse()
+
+    with pytest.raises(sqlite3.OperationalError):
+        replica.push(central)
+    assert replica.pending_count() == 1
+
+    # Изменение уже в центральной БД; после этого ее данные меняет менеджер
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE requests SET completionDate = '03.02.2024' WHERE IDrequest = ?", (request_id,))
+    conn.commit()
+    conn.close()
+
+    result = replica.push(central)
+    assert result['conflicts'] == [] and len(result['applied']) == 1
+    assert replica.pending_count() == 0
+    events = query(db_path, "SELECT oldValue, newValue FROM request_events WHERE requestID = ? AND eventType = ?",
+                   (request_id, database.EVENT_STATUS))
+    assert events == [(1, 2)]
+    # Повтор не выполнил UPDATE второй раз
+    assert query(db_path, "SELECT completionDate FROM requests WHERE IDrequest = ?",
+                 (request_id,)) == [("03.02.2024",)]
+
+
+def test_status_changed_centrally_is_a_conflict(replica, db_path):
+    request_id = request_in_progress(replica)
+    replica.record_writes([('change_status', (2, request_id))])
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE requests SET requestStatusID = 3 WHERE IDrequest = ?", (request_id,))
+    conn.commit()
+    conn.close()
+
+    summary = replica.sync(LocalBackend())
+    assert summary['applied'] == 0
+    assert [conflict[1:3] for conflict in summary['conflicts']] == [[request_id, 'status']]
+    assert [conflict[1] for conflict in replica.get_conflicts()] == [request_id]
+    # Реплика получила состояние центральной БД
+    assert query(replica.path, "SELECT requestStatusID FROM requests WHERE IDrequest = ?", (request_id,)) == [(3,)]
@@ -0,0 +1,60 @@
+import sqlite3
+
+import pytest
+
+import write_queue
+from backend import LocalBackend, ServerUnavailable
+from write_queue import JournalLocked, WriteBehindQueue, is_retryable_error
+
+
+def status_events(db_path, request_id):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("SELECT oldValue, newValue FROM request_events WHERE requestID = ? AND eventType = 2",
+                            (request_id,)).fetchall()
+    finally:
+        conn.close()
+
+
+def test_replayed_journal_skips_writes_already_committed(db_path, monkeypatch):
+    monkeypatch.setattr(write_queue, 'FLUSH_INTERVAL', 0)
+    backend = LocalBackend()
+    journal = "pending.jsonl"
+
+    # Запись попала в журнал и в БД, но отметка о завершении не успела записаться (сбой)
+    queue = WriteBehindQueue(backend, journal)
+    queue.enqueue('change_status', (2, 10), "Статус заявки №10")
+    write = queue.pending[0]
+    backend.apply_writes(writes=[(write.operation, write.params, write.key)])
+    queue.stop()
+    assert len(status_events(db_path, 10)) == 1
+
+    # Следующий сеанс воспроизводит журнал: ключ уже применен, второго события нет
+    queue = WriteBehindQueue(backend, journal)
+    assert [w.key for w in queue.pending] == [write.key]
+    queue.start()
+    assert queue.flush()
+    queue.stop()
+    assert len(status_events(db_path, 10)) == 1
+
+    # Журнал пуст: третий сеанс ничего не воспроизводит
+    queue = WriteBehindQueue(backend, journal)
+    assert queue.pending == []
+    queue.stop()
+
+
+def test_second_owner_of_journal_is_refused(db_path):
+    queue = WriteBehindQueue(LocalBackend(), "pending.jsonl")
+    try:
+        with pytest.raises(JournalLocked):
+            WriteBehindQueue(LocalBackend(), "pending.jsonl")
+    finally:
+        queue.stop()
+
+
+def test_only_lock_and_connection_errors_are_retried():
+    assert is_retryable_error(sqlite3.OperationalError("database is locked"))
+    assert is_retryable_error(ServerUnavailable("Сервер недоступен"))
+    assert not is_retryable_error(ValueError("Сервер отклонил запрос (400): ..."))
+    assert not is_retryable_error(PermissionError("отказано в доступе"))
+    assert not is_retryable_error(sqlite3.IntegrityError("FOREIGN KEY constraint failed"))
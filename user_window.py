@@ -5,54 +5,115 @@ from PyQt5.QtWidgets import (QApplication, QWidget, QMessageBox, QTableWidget,
                              QTableWidgetItem, QVBoxLayout, QPushButton, QLabel,
                              QMainWindow, QHBoxLayout, QHeaderView, QDateEdit,
                              QComboBox, QLineEdit, QFormLayout, QDialog, QTextEdit,
-                             QInputDialog, QSplitter, QFrame)
+                             QInputDialog, QSplitter, QFrame, QCheckBox, QCompleter, QFileDialog, QShortcut,
+                             QStyledItemDelegate)
 from PyQt5.uic import loadUi
-from PyQt5.QtCore import Qt, QDate
+from PyQt5.QtCore import Qt, QDate, QSettings, QStringListModel, QTimer, pyqtSignal
+from PyQt5.QtGui import QKeySequence
 from datetime import datetime
+import threading
+
+from backend import get_backend, HttpBackend, OfflineBackend
+from batch_intake import parse_intake_file
+from client_search import ClientIndex, CLIENT_TYPE_ID
+from database import configure_database, connect, get_schema_version, is_locked_error, get_lock_stats, SCHEMA_VERSION
+from maintenance import start_scheduler_from_config
+from model_index import ModelIndex
+from profiling import profiler, profiled
+from records import RequestRecord, to_int
+from replica import CONFLICT_REASONS
+from sla_panel import SlaDialog
+from write_queue import WriteBehindQueue, journal_path_for
 
 # Пути к UI файлам для разных ролей
 USER_User = "QtCreator/user.ui"
 USER_Manager = "QtCreator/manager.ui"
 USER_Master = "QtCreator/master.ui"
 USER_Operator = "QtCreator/operator.ui"
-DB_PATH = "uchet.db"
+
+# Автоподбор ширины столбцов: сколько строк измерять и максимальная ширина
+COLUMN_SAMPLE_ROWS = 50
+COLUMN_PADDING = 24
+MAX_COLUMN_WIDTH = 400
+
+# Задержка поиска клиента после последнего нажатия клавиши, мс
+CLIENT_SEARCH_DELAY_MS = 200
+
+# Названия статусов заявок
+STATUS_NAMES = {
+    1: "В процессе ремонта",
+    2: "Готова к выдаче",
+    3: "Новая заявка"
+}
+
+
+def date_sort_key(value):
+    """Преобразует дату 'дд.мм.гггг' в число ггггммдд для сортировки и фильтрации"""
+    try:
+        day, month, year = str(value).split(".")
+        return int(year) * 10000 + int(month) * 100 + int(day)
+    except (TypeError, ValueError):
+        return 0
+
+
+def date_sort_value(value):
+    """Преобразует дату 'дд.мм.гггг' в QDate для ячейки таблицы (пустая или неверная дата - QDate())"""
+    try:
+        day, month, year = str(value).split(".")
+        return QDate(int(year), int(month), int(day))
+    except (TypeError, ValueError):
+        return QDate()
+
+
+class SortableTableItem(QTableWidgetItem):
+    """
+    Ячейка таблицы, которую Qt сортирует без вызовов Python.
+    QTableWidget сравнивает значения DisplayRole в C++, поэтому ключ сортировки
+    хранится прямо в них: ID - числом, дата - QDate (см. date_sort_value и
+    DateItemDelegate). Ячейка без ключа сортируется по тексту.
+    """
+    def __init__(self, text, sort_key=None):
+        super().__init__(text)
+        self.sort_key = text if sort_key is None else sort_key
+        if sort_key is not None:
+            self.setData(Qt.DisplayRole, sort_key)
+        # Ключи фильтра (статус, тип, мастер, дата) хранятся в ячейке ID
+        self.filter_key = None
+
+
+class DateItemDelegate(QStyledItemDelegate):
+    """Показывает даты ячеек (QDate) в виде дд.мм.гггг, пустую дату - пустой строкой"""
+    def displayText(self, value, locale):
+        if isinstance(value, QDate):
+            return value.toString("dd.MM.yyyy") if value.isValid() else ""
+        return super().displayText(value, locale)
+
 
 def check_database_structure():
-    """Проверяет структуру базы данных"""
+    """Проверяет версию схемы БД (недостающие миграции применяются при подключении)"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # Проверяем таблицу requests
-        cursor.execute("PRAGMA table_info(requests)")
-        requests_columns = cursor.fetchall()
-        print("=== Структура таблицы requests ===")
-        for col in requests_columns:
-            print(f"  {col}")
-        
-        # Проверяем таблицу users
-        cursor.execute("PRAGMA table_info(users)")
-        users_columns = cursor.fetchall()
-        print("=== Структура таблицы users ===")
-        for col in users_columns:
-            print(f"  {col}")
-        
-        # Проверяем, есть ли записи в requests
-        cursor.execute("SELECT COUNT(*) FROM requests")
-        count = cursor.fetchone()[0]
-        print(f"Количество записей в requests: {count}")
-        
+        conn = connect()
+        version = get_schema_version(conn)
+        count = conn.execute("SELECT COUNT(*) FROM requests").fetchone()[0]
         conn.close()
+        print(f"=== Схема БД: версия {version} из {SCHEMA_VERSION}, заявок: {count} ===")
     except Exception as e:
         print(f"❌ Ошибка проверки структуры БД: {e}")
 
 class RequestDialog(QDialog):
     """Диалоговое окно для создания/редактирования заявки"""
-    def __init__(self, user_data, parent=None, request_id=None):
+    def __init__(self, user_data, parent=None, request_id=None, client_index=None,
+                 model_index=None, tech_types=None):
         super().__init__(parent)
         self.user_data = user_data
         self.request_id = request_id
         self.conn = None
+        # Поиск клиента по телефону или ФИО (для оператора и менеджера)
+        self.client_index = client_index
+        self.selected_client = None
+        # Подсказки моделей и типы техники из кэша окна (не запрашиваются при каждом открытии)
+        self.model_index = model_index
+        self.tech_types = tech_types
         self.init_ui()
         
     def init_ui(self):
@@ -69,6 +130,7 @@ class RequestDialog(QDialog):
         self.load_equipment_types()
         
         self.equipment_model = QLineEdit()
+        self.setup_model_completion()
         self.problem_desc = QTextEdit()
         self.problem_desc.setMaximumHeight(100)
         
@@ -86,6 +148,8 @@ class RequestDialog(QDialog):
         else:
             self.client_name = QLineEdit()
             self.client_phone = QLineEdit()
+            self.client_name.setPlaceholderText("Начните вводить ФИО или телефон")
+            self.setup_client_search()
         
         form_layout.addRow("Тип оборудования:", self.equipment_type)
         form_layout.addRow("Модель:", self.equipment_model)
@@ -115,6 +179,79 @@ class RequestDialog(QDialog):
         if self.request_id:
             self.load_request_data()
     
+    def setup_client_search(self):
+        """Подсказки клиентов при вводе ФИО или телефона (поиск после паузы в наборе)"""
+        if self.client_index is None:
+            return
+        try:
+            # Клиенты, зарегистрированные после загрузки справочников
+            self.client_index.refresh(get_backend())
+        except Exception as e:
+            print(f"⚠️ Не удалось обновить список клиентов: {e}")
+        
+        self.client_matches = {}
+        self.client_model = QStringListModel(self)
+        self.client_completer = QCompleter(self.client_model, self)
+        self.client_completer.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        self.client_completer.activated[str].connect(self.select_client)
+        
+        self.client_search_timer = QTimer(self)
+        self.client_search_timer.setSingleShot(True)
+        self.client_search_timer.setInterval(CLIENT_SEARCH_DELAY_MS)
+        self.client_search_timer.timeout.connect(self.search_clients)
+        
+        for field in (self.client_name, self.client_phone):
+            field.textEdited.connect(lambda text, field=field: self.on_client_text_edited(field))
+    
+    def setup_model_completion(self):
+        """Подсказка моделей выбранного типа техники по мере ввода, частые модели первыми"""
+        if self.model_index is None:
+            return
+        self.model_list = QStringListModel(self)
+        self.model_completer = QCompleter(self.model_list, self)
+        self.model_completer.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        self.model_completer.setWidget(self.equipment_model)
+        self.model_completer.activated[str].connect(self.equipment_model.setText)
+        self.equipment_model.textEdited.connect(self.suggest_models)
+        self.equipment_type.currentIndexChanged.connect(lambda index: self.model_list.setStringList([]))
+    
+    def suggest_models(self, text):
+        """Показывает модели, подходящие к введенному тексту (поиск в памяти, без запроса к БД)"""
+        models = self.model_index.suggest(self.equipment_type.currentData(), text)
+        self.model_list.setStringList(models)
+        if models and text.strip():
+            self.model_completer.complete()
+        else:
+            self.model_completer.popup().hide()
+    
+    def on_client_text_edited(self, field):
+        """Перезапускает таймер поиска: запрос выполняется, когда ввод затих"""
+        self.selected_client = None
+        self.client_search_field = field
+        self.client_search_timer.start()
+    
+    def search_clients(self):
+        """Показывает первые совпадения по ФИО или телефону"""
+        field = self.client_search_field
+        matches = self.client_index.search(field.text())
+        self.client_matches = {f"{fio} — {phone or ''}": [user_id, fio, phone, type_id]
+                               for user_id, fio, phone, type_id in matches}
+        self.client_model.setStringList(list(self.client_matches))
+        if self.client_matches:
+            self.client_completer.setWidget(field)
+            self.client_completer.complete()
+        else:
+            self.client_completer.popup().hide()
+    
+    def select_client(self, text):
+        """Заполняет поля выбранным клиентом"""
+        client = self.client_matches.get(text)
+        if client is None:
+            return
+        self.selected_client = client
+        self.client_name.setText(client[1] or "")
+        self.client_phone.setText(str(client[2]) if client[2] is not None else "")
+    
     def closeEvent(self, event):
         """Закрываем соединение при закрытии диалога"""
         if self.conn:
@@ -125,13 +262,9 @@ class RequestDialog(QDialog):
         super().closeEvent(event)
     
     def load_equipment_types(self):
-        """Загружает типы оборудования из БД"""
+        """Загружает типы оборудования (из кэша окна, если он передан, иначе из БД)"""
         try:
-            conn = sqlite3.connect(DB_PATH, timeout=10)
-            cursor = conn.cursor()
-            cursor.execute("SELECT IDorgTechType, orgTechType FROM orgTechTypes ORDER BY orgTechType")
-            types = cursor.fetchall()
-            conn.close()
+            types = self.tech_types.items() if self.tech_types else get_backend().get_reference_data()['tech_types']
             
             for type_id, type_name in types:
                 self.equipment_type.addItem(type_name, type_id)
@@ -139,90 +272,46 @@ class RequestDialog(QDialog):
             print(f"❌ Ошибка загрузки типов оборудования: {e}")
             self.equipment_type.addItems(["Компьютер", "Ноутбук", "Принтер"])
     
+    @profiled
     def save_request(self):
         """Сохраняет заявку в БД"""
-        conn = None
+        # Получаем ID пользователя
+        user_id = self.user_data.get('id', self.user_data.get('IDuser', 0))
+        
         try:
-            # Открываем соединение с таймаутом
-            conn = sqlite3.connect(DB_PATH, timeout=10)
-            cursor = conn.cursor()
-            
-            # Получаем ID пользователя
-            user_id = self.user_data.get('id', self.user_data.get('IDuser', 0))
-            
-            if not self.request_id:  # Новая заявка
-                # Сначала пробуем вариант с автоинкрементом (без указания IDrequest)
-                try:
-                    query = """
-                    INSERT INTO requests (startDate, orgTechTypeID, orgTechModel, problemDescryption, 
-                                         requestStatusID, clientID)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                    """
-                    values = (
-                        datetime.now().strftime("%d.%m.%Y"),
-                        self.equipment_type.currentData(),
-                        self.equipment_model.text(),
-                        self.problem_desc.toPlainText(),
-                        3,  # Статус "Новая заявка"
-                        user_id if self.user_data.get('type_id', 0) == 4 else None
-                    )
-                    
-                    print(f"Пробуем вставить без IDrequest")
-                    cursor.execute(query, values)
-                    
-                except sqlite3.IntegrityError as e:
-                    if "NOT NULL constraint failed: requests.IDrequest" in str(e):
-                        print(f"Автоинкремент не настроен, вычисляем следующий ID")
-                        # Вычисляем следующий ID
-                        cursor.execute("SELECT MAX(IDrequest) FROM requests")
-                        max_id = cursor.fetchone()[0]
-                        next_id = (max_id or 0) + 1
-                        
-                        query = """
-                        INSERT INTO requests (IDrequest, startDate, orgTechTypeID, orgTechModel, problemDescryption, 
-                                             requestStatusID, clientID)
-                        VALUES (?, ?, ?, ?, ?, ?, ?)
-                        """
-                        values = (
-                            next_id,
-                            datetime.now().strftime("%d.%m.%Y"),
-                            self.equipment_type.currentData(),
-                            self.equipment_model.text(),
-                            self.problem_desc.toPlainText(),
-                            3,  # Статус "Новая заявка"
-                            user_id if self.user_data.get('type_id', 0) == 4 else None
-                        )
-                        
-                        cursor.execute(query, values)
-                    else:
-                        # Другая ошибка целостности
-                        raise e
-            
-            conn.commit()
-            print(f"Заявка успешно сохранена")
+            # Блокировки БД обрабатываются повторами внутри run_with_retry
+            request_id = get_backend().create_request(
+                tech_type_id=self.equipment_type.currentData(),
+                model=self.equipment_model.text(),
+                problem=self.problem_desc.toPlainText(),
+                client_id=user_id if self.user_data.get('type_id', 0) == 4 else
+                          (self.selected_client[0] if self.selected_client else None)
+            )
+            print(f"Заявка №{request_id} успешно сохранена")
+            if self.model_index is not None:
+                self.model_index.note(self.equipment_type.currentData(), self.equipment_model.text())
             self.accept()
             
         except sqlite3.OperationalError as e:
-            if "locked" in str(e):
+            if is_locked_error(e):
                 QMessageBox.critical(self, "Ошибка", 
-                    "База данных заблокирована другим процессом.\nПожалуйста, попробуйте через несколько секунд.")
+                    "База данных слишком долго занята другими пользователями.\nЗаявка не сохранена.")
             else:
                 QMessageBox.critical(self, "Ошибка", f"Не удалось сохранить заявку: {e}")
         except sqlite3.IntegrityError as e:
             QMessageBox.critical(self, "Ошибка", f"Ошибка целостности данных: {e}")
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Не удалось сохранить заявку: {e}")
-        finally:
-            # Всегда закрываем соединение
-            if conn:
-                try:
-                    cursor.close()
-                    conn.close()
-                except:
-                    pass
 
 class UserWindow(QMainWindow):
-    def __init__(self, user_data):
+    # Сигнал из фонового потока записи: (описание изменения, текст ошибки)
+    write_failed = pyqtSignal(str, str)
+    # Сигнал из фонового потока записи: изменения долго не сохраняются (число в очереди, ошибка)
+    write_delayed = pyqtSignal(int, str)
+    # Сигнал о завершении предварительной загрузки данных при входе
+    prefetch_finished = pyqtSignal()
+    
+    def __init__(self, user_data, prefetch=None):
         super().__init__()
         
         print(f"🚀 Инициализация UserWindow...")
@@ -230,6 +319,8 @@ class UserWindow(QMainWindow):
         print(f"🏷️ Роль: {user_data.get('type_name', 'Unknown')}")
         
         self.user_data = user_data
+        # Доступ к данным: файл БД или сервер (см. settings.ini)
+        self.backend = get_backend()
         
         # Определяем путь к UI файлу в зависимости от роли
         self.ui_path = self.get_ui_path_for_role()
@@ -241,8 +332,45 @@ class UserWindow(QMainWindow):
         self.action_button = None
         self.logout_button = None
         self.new_request_btn = None
+        self.sla_dialog = None
         self.table_visible = False
         self.table_frame = None
+        self.filter_panel = None
+        
+        # Справочники (типы техники, пользователи) загружаются один раз за сеанс
+        self.tech_types = None
+        self.users_by_id = None
+        # Индекс клиентов для поиска при создании заявки (строится в фоне)
+        self.client_index = ClientIndex()
+        # Подсказки моделей техники при создании заявки (загружаются в фоне)
+        self.model_index = ModelIndex()
+        # Заявки, загруженные заранее во время входа (используются один раз)
+        self.prefetch = prefetch
+        self.prefetched_requests = None
+        # Таблица уже загружалась: заранее загруженные данные устарели
+        self.table_loaded = False
+        # Показывать ли архивные заявки (по выбору пользователя, требует запроса к БД)
+        self.include_archive = False
+        
+        # Самые длинные значения по столбцам (собираются при загрузке таблицы)
+        self.longest_cell_texts = {}
+        # Флаг программного изменения ширины столбцов (не сохраняем как пользовательское)
+        self.auto_resizing = False
+        self.settings = QSettings("Stepik", "uchet")
+        
+        # Очередь отложенной записи статусов и назначений
+        self.write_failed.connect(self.on_write_failed)
+        self.write_delayed.connect(self.on_write_delayed)
+        self.write_queue = WriteBehindQueue(
+            self.backend, journal_path_for(self.get_user_id(), self.backend),
+            on_error=lambda write, error: self.write_failed.emit(write.description, str(error)),
+            on_delay=lambda count, error: self.write_delayed.emit(count, str(error)))
+        self.write_queue.start()
+        
+        # Обслуживание БД в периоды простоя (при работе через сервер его выполняет сервер,
+        # реплика мастера - небольшой файл с заявками одного мастера, ее не обслуживаем)
+        self.maintenance = (None if isinstance(self.backend, (HttpBackend, OfflineBackend))
+                            else start_scheduler_from_config())
         
         # Создаем интерфейс с таблицей снизу
         self.create_interface_with_bottom_table()
@@ -251,34 +379,31 @@ class UserWindow(QMainWindow):
         self.setWindowTitle(f"Учет заявок - {user_data['fio']} ({user_data['type_name']})")
         self.setMinimumSize(1200, 800)
         
+        # Профили подписываются ролью; скрытое действие включает/выключает профилирование
+        profiler.context['role'] = self.get_user_type_id()
+        QShortcut(QKeySequence("Ctrl+Shift+F12"), self, activated=profiler.toggle)
+        
+        # Данные роли грузятся с момента проверки пароля: показываем таблицу, как только они готовы
+        if self.prefetch is not None:
+            self.prefetch_finished.connect(self.on_prefetch_finished)
+            self.prefetch.add_done_callback(lambda future: self.prefetch_finished.emit())
+        
         print("✅ UserWindow инициализирован успешно!")
     
-    def execute_db_query(self, query, params=None, fetch=False):
-        """Безопасное выполнение запроса к БД"""
-        conn = None
+    def call_backend(self, method, **params):
+        """
+        Безопасный вызов бэкенда (БД или сервера).
+        При блокировке БД запрос повторяется автоматически (см. run_with_retry).
+        Возвращает результат вызова или None при ошибке.
+        """
         try:
-            conn = sqlite3.connect(DB_PATH, timeout=10)
-            cursor = conn.cursor()
-            
-            if params:
-                cursor.execute(query, params)
-            else:
-                cursor.execute(query)
-                
-            if fetch:
-                result = cursor.fetchall()
-            else:
-                conn.commit()
-                result = None
-                
-            cursor.close()
-            return result
+            return self.backend.call(method, **params)
             
         except sqlite3.OperationalError as e:
-            if "locked" in str(e):
-                print(f"⚠️ База данных заблокирована: {e}")
-                QMessageBox.warning(self, "Ошибка БД", 
-                    "База данных временно заблокирована.\nПожалуйста, подождите несколько секунд и попробуйте снова.")
+            if is_locked_error(e):
+                print(f"⚠️ База данных заблокирована, повторы исчерпаны: {e}")
+                if self.status_label:
+                    self.status_label.setText("База данных занята другими пользователями, операция не выполнена")
             else:
                 print(f"❌ Ошибка БД: {e}")
                 QMessageBox.warning(self, "Ошибка БД", f"Ошибка доступа к базе данных: {e}")
@@ -286,9 +411,6 @@ class UserWindow(QMainWindow):
         except Exception as e:
             print(f"❌ Ошибка при выполнении запроса: {e}")
             return None
-        finally:
-            if conn:
-                conn.close()
     
     def get_role_button_name(self):
         """Возвращает название кнопки в зависимости от роли"""
@@ -428,6 +550,48 @@ class UserWindow(QMainWindow):
             """)
             self.new_request_btn.clicked.connect(self.create_new_request)
             top_layout.addWidget(self.new_request_btn)
+            if type_id == 3:
+                import_btn = QPushButton("📥 Принять заявки из файла CSV")
+                import_btn.setMinimumHeight(40)
+                import_btn.setStyleSheet(self.new_request_btn.styleSheet())
+                import_btn.clicked.connect(self.import_requests_file)
+                top_layout.addWidget(import_btn)
+        elif type_id == 1:
+            sla_btn = QPushButton("⏰ Просрочки и статистика")
+            sla_btn.setMinimumHeight(40)
+            sla_btn.setStyleSheet("""
+                QPushButton {
+                    font-size: 14px;
+                    background-color: #e67e22;
+                    color: white;
+                    border-radius: 6px;
+                    border: none;
+                    padding: 8px;
+                }
+                QPushButton:hover {
+                    background-color: #ca6f1e;
+                }
+            """)
+            sla_btn.clicked.connect(self.show_sla_panel)
+            top_layout.addWidget(sla_btn)
+        elif type_id == 2 and isinstance(self.backend, OfflineBackend):
+            sync_btn = QPushButton("🔄 Синхронизировать")
+            sync_btn.setMinimumHeight(40)
+            sync_btn.setStyleSheet("""
+                QPushButton {
+                    font-size: 14px;
+                    background-color: #8e44ad;
+                    color: white;
+                    border-radius: 6px;
+                    border: none;
+                    padding: 8px;
+                }
+                QPushButton:hover {
+                    background-color: #76448a;
+                }
+            """)
+            sync_btn.clicked.connect(self.sync_replica)
+            top_layout.addWidget(sync_btn)
         
         # Разделительная линия
         separator2 = QFrame()
@@ -462,8 +626,13 @@ class UserWindow(QMainWindow):
         table_header.setAlignment(Qt.AlignCenter)
         table_layout.addWidget(table_header)
         
+        # Панель фильтров (работает по уже загруженным строкам, без запросов к БД)
+        self.filter_panel = self.create_filter_panel()
+        table_layout.addWidget(self.filter_panel)
+        
         # Создаем таблицу
         self.table_widget = QTableWidget()
+        self.table_widget.setItemDelegate(DateItemDelegate(self.table_widget))
         self.table_widget.setAlternatingRowColors(True)
         self.table_widget.setStyleSheet("""
             QTableWidget {
@@ -523,6 +692,192 @@ class UserWindow(QMainWindow):
         self.table_frame.setVisible(False)
         self.table_visible = False
     
+    def create_filter_panel(self):
+        """Создает панель фильтров по статусу, типу техники, мастеру и дате"""
+        panel = QWidget()
+        layout = QHBoxLayout(panel)
+        layout.setContentsMargins(5, 0, 5, 0)
+        
+        self.status_filter = QComboBox()
+        self.status_filter.addItem("Все статусы", None)
+        for status_id, status_name in STATUS_NAMES.items():
+            self.status_filter.addItem(status_name, status_id)
+        
+        self.type_filter = QComboBox()
+        self.type_filter.addItem("Все типы", None)
+        
+        self.master_filter = QComboBox()
+        self.master_filter.addItem("Все мастера", None)
+        # У мастера в таблице только его собственные заявки
+        self.master_filter.setVisible(self.get_user_type_id() != 2)
+        
+        # Минимальная дата означает "не задано"
+        self.date_from_filter = QDateEdit()
+        self.date_to_filter = QDateEdit()
+        for date_edit in (self.date_from_filter, self.date_to_filter):
+            date_edit.setCalendarPopup(True)
+            date_edit.setDisplayFormat("dd.MM.yyyy")
+            date_edit.setMinimumDate(QDate(2000, 1, 1))
+            date_edit.setSpecialValueText("—")
+            date_edit.setDate(date_edit.minimumDate())
+        
+        # Архив не загружается заранее: переключатель перечитывает таблицу из БД
+        self.archive_checkbox = QCheckBox("Включая архив")
+        self.archive_checkbox.toggled.connect(self.toggle_archive)
+        
+        reset_btn = QPushButton("Сбросить")
+        reset_btn.clicked.connect(self.reset_filters)
+        
+        self.filter_info_label = QLabel("")
+        self.filter_info_label.setStyleSheet("font-size: 12px; color: #7f8c8d;")
+        
+        layout.addWidget(QLabel("Статус:"))
+        layout.addWidget(self.status_filter)
+        layout.addWidget(QLabel("Тип:"))
+        layout.addWidget(self.type_filter)
+        layout.addWidget(self.master_filter)
+        layout.addWidget(QLabel("С:"))
+        layout.addWidget(self.date_from_filter)
+        layout.addWidget(QLabel("По:"))
+        layout.addWidget(self.date_to_filter)
+        layout.addWidget(self.archive_checkbox)
+        layout.addWidget(reset_btn)
+        layout.addStretch()
+        layout.addWidget(self.filter_info_label)
+        
+        for combo in (self.status_filter, self.type_filter, self.master_filter):
+            combo.currentIndexChanged.connect(self.apply_filters)
+        for date_edit in (self.date_from_filter, self.date_to_filter):
+            date_edit.dateChanged.connect(self.apply_filters)
+        
+        return panel
+    
+    def load_reference_data(self):
+        """Загружает справочники типов техники и пользователей один раз за сеанс"""
+        if self.tech_types is not None:
+            return
+        try:
+            reference = self.backend.get_reference_data()
+        except sqlite3.Error as e:
+            print(f"❌ Ошибка загрузки справочников: {e}")
+            return
+        self.apply_reference_data(reference)
+    
+    def apply_reference_data(self, reference):
+        """Заполняет кэш справочников и списки фильтров"""
+        if self.tech_types is not None:
+            return
+        self.tech_types = dict(reference['tech_types'])
+        self.users_by_id = {user[0]: user for user in reference['users']}
+        threading.Thread(target=self.client_index.build, args=(reference['users'],),
+                         name="client-index", daemon=True).start()
+        if self.get_user_type_id() in (3, 4):
+            threading.Thread(target=self.load_model_index, name="model-index", daemon=True).start()
+        
+        # Заполняем списки фильтров
+        for type_id, type_name in sorted(self.tech_types.items(), key=lambda item: item[1]):
+            self.type_filter.addItem(type_name, type_id)
+        for user_id, fio, phone, type_id in sorted(self.users_by_id.values(), key=lambda user: user[1] or ""):
+            if type_id == 2:
+                self.master_filter.addItem(fio, user_id)
+    
+    def load_model_index(self):
+        """Загружает частоты моделей техники для подсказок (в фоновом потоке)"""
+        try:
+            self.model_index.load(self.backend)
+        except sqlite3.Error as e:
+            print(f"⚠️ Подсказки моделей недоступны: {e}")
+    
+    def on_prefetch_finished(self):
+        """Принимает данные, загруженные во время входа, и сразу показывает таблицу"""
+        try:
+            result = self.prefetch.result()
+        except Exception as e:
+            print(f"⚠️ Предварительная загрузка не удалась, данные загрузятся по кнопке: {e}")
+            return
+        finally:
+            self.prefetch = None
+        
+        self.apply_reference_data(result['reference'])
+        # Заявки при входе нужны только для первого показа таблицы: если она уже загружена,
+        # в ней могут быть более новые данные (изменения статусов, архив)
+        if not self.table_loaded:
+            self.prefetched_requests = result['requests']
+            self.show_role_table()
+    
+    def fetch_role_requests(self, role_id, user_id):
+        """Возвращает заявки роли: заранее загруженные при входе или из бэкенда"""
+        if self.prefetched_requests is not None:
+            requests, self.prefetched_requests = self.prefetched_requests, None
+            return requests
+        return self.call_backend('get_role_requests', role_id=role_id, user_id=user_id,
+                                 include_archive=self.include_archive)
+    
+    def toggle_archive(self, checked):
+        """Включает или выключает показ архивных заявок"""
+        self.include_archive = checked
+        self.reload_role_table()
+    
+    def make_id_item(self, request_id, status_id, type_id, master_id, start_date):
+        """Создает ячейку ID с ключами фильтра строки"""
+        item = SortableTableItem(str(request_id), to_int(request_id))
+        item.filter_key = (to_int(status_id), to_int(type_id), to_int(master_id), date_sort_key(start_date))
+        return item
+    
+    def finish_table_load(self):
+        """Включает сортировку по заголовкам и применяет фильтры после загрузки"""
+        self.table_widget.setSortingEnabled(True)
+        self.apply_filters()
+    
+    def get_date_filter_key(self, date_edit):
+        """Возвращает ключ даты из поля фильтра или None, если дата не задана"""
+        date = date_edit.date()
+        if date == date_edit.minimumDate():
+            return None
+        return date.year() * 10000 + date.month() * 100 + date.day()
+    
+    def apply_filters(self):
+        """Скрывает строки, не подходящие под фильтры (без повторного запроса к БД)"""
+        if self.table_widget is None or self.filter_panel is None:
+            return
+        
+        status_id = self.status_filter.currentData()
+        type_id = self.type_filter.currentData()
+        master_id = self.master_filter.currentData()
+        date_from = self.get_date_filter_key(self.date_from_filter)
+        date_to = self.get_date_filter_key(self.date_to_filter)
+        
+        total = self.table_widget.rowCount()
+        visible = 0
+        for row in range(total):
+            item = self.table_widget.item(row, 0)
+            key = getattr(item, 'filter_key', None)
+            matches = True
+            if key is not None:
+                row_status, row_type, row_master, row_date = key
+                matches = ((status_id is None or row_status == status_id) and
+                           (type_id is None or row_type == type_id) and
+                           (master_id is None or row_master == master_id) and
+                           (date_from is None or row_date >= date_from) and
+                           (date_to is None or row_date <= date_to))
+            self.table_widget.setRowHidden(row, not matches)
+            if matches:
+                visible += 1
+        
+        self.filter_info_label.setText(f"Показано: {visible} из {total}")
+    
+    def reset_filters(self):
+        """Сбрасывает все фильтры"""
+        for combo in (self.status_filter, self.type_filter, self.master_filter):
+            combo.blockSignals(True)
+            combo.setCurrentIndex(0)
+            combo.blockSignals(False)
+        for date_edit in (self.date_from_filter, self.date_to_filter):
+            date_edit.blockSignals(True)
+            date_edit.setDate(date_edit.minimumDate())
+            date_edit.blockSignals(False)
+        self.apply_filters()
+    
     def setup_role_table(self):
         """Настраивает таблицу в зависимости от роли пользователя"""
         # Проверяем, что table_widget существует
@@ -611,7 +966,69 @@ class UserWindow(QMainWindow):
         header = self.table_widget.horizontalHeader()
         header.setStretchLastSection(True)
         header.setDefaultSectionSize(120)
+        header.sectionResized.connect(self.save_column_width)
+    
+    def set_table_item(self, row, col, item):
+        """Ставит ячейку в таблицу и запоминает самое длинное значение столбца"""
+        text = item.text()
+        if len(text) > len(self.longest_cell_texts.get(col, "")):
+            self.longest_cell_texts[col] = text
+        self.table_widget.setItem(row, col, item)
+    
+    def get_column_widths_key(self):
+        """Ключ настроек с шириной столбцов для роли текущего пользователя"""
+        return f"column_widths/role_{self.get_user_type_id()}"
+    
+    def resize_columns(self):
+        """
+        Подбирает ширину столбцов по выборке строк вместо resizeColumnsToContents.
+        Измеряются заголовок, видимые строки и самое длинное значение столбца,
+        поэтому время не зависит от количества строк. Ширины, измененные
+        пользователем, берутся из настроек.
+        """
+        saved_widths = self.settings.value(self.get_column_widths_key(), {}) or {}
+        metrics = self.table_widget.fontMetrics()
+        header = self.table_widget.horizontalHeader()
+        
+        # Видимые строки (или первые строки, если таблица еще не отрисована)
+        first_row = max(self.table_widget.rowAt(0), 0)
+        sample_rows = range(first_row, min(first_row + COLUMN_SAMPLE_ROWS, self.table_widget.rowCount()))
+        
+        self.auto_resizing = True
+        try:
+            for col in range(self.table_widget.columnCount()):
+                if str(col) in saved_widths:
+                    self.table_widget.setColumnWidth(col, int(saved_widths[str(col)]))
+                    continue
+                
+                header_item = self.table_widget.horizontalHeaderItem(col)
+                texts = [header_item.text() if header_item else ""]
+                texts.append(self.longest_cell_texts.get(col, ""))
+                width = 0
+                for row in sample_rows:
+                    item = self.table_widget.item(row, col)
+                    if item is not None:
+                        texts.append(item.text())
+                    widget = self.table_widget.cellWidget(row, col)
+                    if widget is not None:
+                        width = max(width, widget.sizeHint().width())
+                
+                width = max([width] + [metrics.horizontalAdvance(text) for text in texts])
+                self.table_widget.setColumnWidth(col, min(width + COLUMN_PADDING, MAX_COLUMN_WIDTH))
+        finally:
+            self.auto_resizing = False
+    
+    def save_column_width(self, col, old_width, new_width):
+        """Запоминает ширину столбца, измененную пользователем, для его роли"""
+        # Последний столбец растягивается вместе с окном, его ширину не сохраняем
+        if self.auto_resizing or col == self.table_widget.columnCount() - 1:
+            return
+        key = self.get_column_widths_key()
+        saved_widths = dict(self.settings.value(key, {}) or {})
+        saved_widths[str(col)] = new_width
+        self.settings.setValue(key, saved_widths)
     
+    @profiled
     def show_role_table(self):
         """Показывает/скрывает таблицу заявок"""
         print(f"📋 Загрузка таблицы для роли: {self.user_data['type_name']}")
@@ -625,9 +1042,11 @@ class UserWindow(QMainWindow):
             # Показываем таблицу
             self.table_frame.setVisible(True)
             self.table_visible = True
+            self.table_loaded = True
             
             # Загружаем данные
             try:
+                self.load_reference_data()
                 role_id = self.get_user_type_id()
                 
                 if role_id == 1:  # Менеджер
@@ -659,69 +1078,50 @@ class UserWindow(QMainWindow):
         """Получает ФИО пользователя по ID"""
         if not user_id:
             return "Не указан"
-        conn = None
+        if self.users_by_id is not None and user_id in self.users_by_id:
+            return self.users_by_id[user_id][1]
         try:
-            conn = sqlite3.connect(DB_PATH, timeout=10)
-            cursor = conn.cursor()
-            cursor.execute("SELECT fio FROM users WHERE IDuser = ?", (user_id,))
-            result = cursor.fetchone()
-            cursor.close()
-            return result[0] if result else "Неизвестно"
+            user = self.backend.get_user(user_id=user_id)
+            if user and self.users_by_id is not None:
+                self.users_by_id[user_id] = user
+            return user[1] if user else "Неизвестно"
         except:
             return "Неизвестно"
-        finally:
-            if conn:
-                conn.close()
     
     def get_tech_type_name(self, type_id):
         """Получает название типа техники по ID"""
         if not type_id:
             return ""
-        conn = None
+        if self.tech_types is not None and type_id in self.tech_types:
+            return self.tech_types[type_id]
         try:
-            conn = sqlite3.connect(DB_PATH, timeout=10)
-            cursor = conn.cursor()
-            cursor.execute("SELECT orgTechType FROM orgTechTypes WHERE IDorgTechType = ?", (type_id,))
-            result = cursor.fetchone()
-            cursor.close()
-            return result[0] if result else str(type_id)
+            tech_types = dict(self.backend.get_reference_data()['tech_types'])
+            return tech_types.get(type_id, str(type_id))
         except:
             return str(type_id)
-        finally:
-            if conn:
-                conn.close()
     
     def get_status_name(self, status_id):
         """Получает название статуса по ID"""
-        status_names = {
-            1: "В процессе ремонта",
-            2: "Готова к выдаче", 
-            3: "Новая заявка"
-        }
-        return status_names.get(status_id, str(status_id))
+        return STATUS_NAMES.get(to_int(status_id), str(status_id))
     
     def get_client_phone(self, client_id):
         """Получает телефон клиента по ID"""
         if not client_id:
             return ""
-        conn = None
+        if self.users_by_id is not None and client_id in self.users_by_id:
+            phone = self.users_by_id[client_id][2]
+            return str(phone) if phone else ""
         try:
-            conn = sqlite3.connect(DB_PATH, timeout=10)
-            cursor = conn.cursor()
-            cursor.execute("SELECT phone FROM users WHERE IDuser = ?", (client_id,))
-            result = cursor.fetchone()
-            cursor.close()
-            if result and result[0]:
-                return str(result[0])
+            user = self.backend.get_user(user_id=client_id)
+            if user and user[2]:
+                return str(user[2])
             else:
                 return ""
         except Exception as e:
             print(f"❌ Ошибка получения телефона для ID {client_id}: {e}")
             return ""
-        finally:
-            if conn:
-                conn.close()
     
+    @profiled
     def load_all_requests(self):
         """Загружает все заявки для менеджера"""
         if self.table_widget is None:
@@ -729,15 +1129,7 @@ class UserWindow(QMainWindow):
             return
             
         try:
-            query = """
-            SELECT r.IDrequest, r.startDate, r.orgTechTypeID, r.orgTechModel, 
-                   r.problemDescryption, r.requestStatusID, r.completionDate, 
-                   r.repairParts, r.masterID, r.clientID
-            FROM requests r
-            ORDER BY r.startDate DESC
-            """
-            
-            requests = self.execute_db_query(query, fetch=True)
+            requests = self.fetch_role_requests(role_id=1, user_id=0)
             
             if requests is None:
                 self.table_widget.setRowCount(0)
@@ -745,35 +1137,38 @@ class UserWindow(QMainWindow):
                     self.status_label.setText("Не удалось загрузить данные")
                 return
             
+            self.table_widget.setSortingEnabled(False)
+            self.longest_cell_texts = {}
             self.table_widget.setRowCount(len(requests))
             
             for row, request in enumerate(requests):
                 # ID
-                self.table_widget.setItem(row, 0, QTableWidgetItem(str(request[0])))
+                self.set_table_item(row, 0, self.make_id_item(request.id, request.status_id, request.tech_type_id, request.master_id, request.start_date))
                 # Дата
-                self.table_widget.setItem(row, 1, QTableWidgetItem(str(request[1])))
+                self.set_table_item(row, 1, SortableTableItem(RequestRecord.text(request.start_date), date_sort_value(request.start_date)))
                 # Тип оборудования
-                type_name = self.get_tech_type_name(request[2])
-                self.table_widget.setItem(row, 2, QTableWidgetItem(type_name))
+                type_name = self.get_tech_type_name(request.tech_type_id)
+                self.set_table_item(row, 2, SortableTableItem(type_name))
                 # Модель
-                self.table_widget.setItem(row, 3, QTableWidgetItem(str(request[3])))
+                self.set_table_item(row, 3, SortableTableItem(RequestRecord.text(request.model)))
                 # Проблема
-                self.table_widget.setItem(row, 4, QTableWidgetItem(str(request[4])))
+                self.set_table_item(row, 4, SortableTableItem(RequestRecord.text(request.problem)))
                 # Статус
-                status_name = self.get_status_name(request[5])
-                self.table_widget.setItem(row, 5, QTableWidgetItem(status_name))
+                status_name = self.get_status_name(request.status_id)
+                self.set_table_item(row, 5, SortableTableItem(status_name))
                 # Мастер
-                master_name = self.get_user_name(request[8])
-                self.table_widget.setItem(row, 6, QTableWidgetItem(master_name))
+                master_name = self.get_user_name(request.master_id)
+                self.set_table_item(row, 6, SortableTableItem(master_name))
                 # Дата завершения
-                self.table_widget.setItem(row, 7, QTableWidgetItem(str(request[6] if request[6] else "")))
+                self.set_table_item(row, 7, SortableTableItem(RequestRecord.text(request.completion_date), date_sort_value(request.completion_date)))
                 # Запчасти
-                self.table_widget.setItem(row, 8, QTableWidgetItem(str(request[7] if request[7] else "")))
+                self.set_table_item(row, 8, SortableTableItem(RequestRecord.text(request.repair_parts)))
                 # Клиент
-                client_name = self.get_user_name(request[9])
-                self.table_widget.setItem(row, 9, QTableWidgetItem(client_name))
+                client_name = self.get_user_name(request.client_id)
+                self.set_table_item(row, 9, SortableTableItem(client_name))
         
-            self.table_widget.resizeColumnsToContents()
+            self.finish_table_load()
+            self.resize_columns()
             if self.status_label:
                 self.status_label.setText(f"Загружено записей: {len(requests)}")
             
@@ -781,6 +1176,7 @@ class UserWindow(QMainWindow):
             print(f"❌ Ошибка загрузки всех заявок: {e}")
             QMessageBox.warning(self, "Ошибка", f"Ошибка загрузки данных: {e}")
     
+    @profiled
     def load_master_requests(self):
         """Загружает заявки для мастера"""
         if self.table_widget is None:
@@ -790,15 +1186,7 @@ class UserWindow(QMainWindow):
         try:
             user_id = self.get_user_id()
             
-            query = """
-            SELECT r.IDrequest, r.startDate, r.orgTechTypeID, r.orgTechModel,
-                   r.problemDescryption, r.requestStatusID, r.completionDate, r.repairParts
-            FROM requests r
-            WHERE r.masterID = ?
-            ORDER BY r.startDate DESC
-            """
-            
-            requests = self.execute_db_query(query, (user_id,), fetch=True)
+            requests = self.fetch_role_requests(role_id=2, user_id=user_id)
             
             if requests is None:
                 self.table_widget.setRowCount(0)
@@ -806,27 +1194,35 @@ class UserWindow(QMainWindow):
                     self.status_label.setText("Не удалось загрузить данные")
                 return
             
+            self.table_widget.setSortingEnabled(False)
+            self.longest_cell_texts = {}
             self.table_widget.setRowCount(len(requests))
             
             for row, request in enumerate(requests):
                 # ID
-                self.table_widget.setItem(row, 0, QTableWidgetItem(str(request[0])))
+                self.set_table_item(row, 0, self.make_id_item(request.id, request.status_id, request.tech_type_id, self.get_user_id(), request.start_date))
                 # Дата
-                self.table_widget.setItem(row, 1, QTableWidgetItem(str(request[1])))
+                self.set_table_item(row, 1, SortableTableItem(RequestRecord.text(request.start_date), date_sort_value(request.start_date)))
                 # Тип оборудования
-                type_name = self.get_tech_type_name(request[2])
-                self.table_widget.setItem(row, 2, QTableWidgetItem(type_name))
+                type_name = self.get_tech_type_name(request.tech_type_id)
+                self.set_table_item(row, 2, SortableTableItem(type_name))
                 # Модель
-                self.table_widget.setItem(row, 3, QTableWidgetItem(str(request[3])))
+                self.set_table_item(row, 3, SortableTableItem(RequestRecord.text(request.model)))
                 # Проблема
-                self.table_widget.setItem(row, 4, QTableWidgetItem(str(request[4])))
+                self.set_table_item(row, 4, SortableTableItem(RequestRecord.text(request.problem)))
                 # Статус
-                status_name = self.get_status_name(request[5])
-                self.table_widget.setItem(row, 5, QTableWidgetItem(status_name))
+                status_name = self.get_status_name(request.status_id)
+                self.set_table_item(row, 5, SortableTableItem(status_name))
                 # Дата завершения
-                self.table_widget.setItem(row, 6, QTableWidgetItem(str(request[6] if request[6] else "")))
+                self.set_table_item(row, 6, SortableTableItem(RequestRecord.text(request.completion_date), date_sort_value(request.completion_date)))
                 # Запчасти
-                self.table_widget.setItem(row, 7, QTableWidgetItem(str(request[7] if request[7] else "")))
+                self.set_table_item(row, 7, SortableTableItem(RequestRecord.text(request.repair_parts)))
+                
+                # Архивную заявку изменить нельзя: UPDATE requests ее не найдет
+                if request.archived:
+                    self.table_widget.removeCellWidget(row, 8)
+                    self.set_table_item(row, 8, SortableTableItem("📦 В архиве"))
+                    continue
                 
                 # Кнопка действий
                 action_btn = QPushButton("Изменить")
@@ -842,10 +1238,11 @@ class UserWindow(QMainWindow):
                         background-color: #e67e22;
                     }
                 """)
-                action_btn.clicked.connect(lambda checked, req_id=request[0]: self.change_request_status(req_id))
+                action_btn.clicked.connect(lambda checked, req_id=request.id: self.change_request_status(req_id))
                 self.table_widget.setCellWidget(row, 8, action_btn)
             
-            self.table_widget.resizeColumnsToContents()
+            self.finish_table_load()
+            self.resize_columns()
             if self.status_label:
                 self.status_label.setText(f"Загружено заданий: {len(requests)}")
             
@@ -853,6 +1250,7 @@ class UserWindow(QMainWindow):
             print(f"❌ Ошибка загрузки заявок мастера: {e}")
             QMessageBox.warning(self, "Ошибка", f"Ошибка загрузки данных: {e}")
     
+    @profiled
     def load_operator_requests(self):
         """Загружает заявки для оператора"""
         if self.table_widget is None:
@@ -860,14 +1258,7 @@ class UserWindow(QMainWindow):
             return
             
         try:
-            query = """
-            SELECT r.IDrequest, r.startDate, r.orgTechTypeID, r.orgTechModel,
-                   r.problemDescryption, r.requestStatusID, r.masterID, r.clientID
-            FROM requests r
-            ORDER BY r.startDate DESC
-            """
-            
-            requests = self.execute_db_query(query, fetch=True)
+            requests = self.fetch_role_requests(role_id=3, user_id=0)
             
             if requests is None:
                 self.table_widget.setRowCount(0)
@@ -877,6 +1268,8 @@ class UserWindow(QMainWindow):
             
             print(f"📊 Найдено заявок: {len(requests)}")
             
+            self.table_widget.setSortingEnabled(False)
+            self.longest_cell_texts = {}
             self.table_widget.setRowCount(len(requests))
             
             # Проверяем количество столбцов
@@ -885,40 +1278,47 @@ class UserWindow(QMainWindow):
             
             for row, request in enumerate(requests):
                 # ID (колонка 0)
-                self.table_widget.setItem(row, 0, QTableWidgetItem(str(request[0])))
+                self.set_table_item(row, 0, self.make_id_item(request.id, request.status_id, request.tech_type_id, request.master_id, request.start_date))
                 
                 # Дата (колонка 1)
-                self.table_widget.setItem(row, 1, QTableWidgetItem(str(request[1])))
+                self.set_table_item(row, 1, SortableTableItem(RequestRecord.text(request.start_date), date_sort_value(request.start_date)))
                 
                 # Тип оборудования (колонка 2)
-                type_name = self.get_tech_type_name(request[2])
-                self.table_widget.setItem(row, 2, QTableWidgetItem(type_name))
+                type_name = self.get_tech_type_name(request.tech_type_id)
+                self.set_table_item(row, 2, SortableTableItem(type_name))
                 
                 # Модель (колонка 3)
-                self.table_widget.setItem(row, 3, QTableWidgetItem(str(request[3])))
+                self.set_table_item(row, 3, SortableTableItem(RequestRecord.text(request.model)))
                 
                 # Проблема (колонка 4)
-                self.table_widget.setItem(row, 4, QTableWidgetItem(str(request[4])))
+                self.set_table_item(row, 4, SortableTableItem(RequestRecord.text(request.problem)))
                 
                 # Статус (колонка 5)
-                status_name = self.get_status_name(request[5])
-                self.table_widget.setItem(row, 5, QTableWidgetItem(status_name))
+                status_name = self.get_status_name(request.status_id)
+                self.set_table_item(row, 5, SortableTableItem(status_name))
                 
                 # Мастер (колонка 6)
-                master_name = self.get_user_name(request[6])
-                self.table_widget.setItem(row, 6, QTableWidgetItem(master_name))
+                master_name = self.get_user_name(request.master_id)
+                self.set_table_item(row, 6, SortableTableItem(master_name))
                 
                 # Клиент (колонка 7)
-                client_name = self.get_user_name(request[7])
-                self.table_widget.setItem(row, 7, QTableWidgetItem(client_name))
+                client_name = self.get_user_name(request.client_id)
+                self.set_table_item(row, 7, SortableTableItem(client_name))
                 
                 # Телефон клиента (колонка 8)
-                client_phone = self.get_client_phone(request[7])
-                print(f"Телефон для клиента ID={request[7]}: '{client_phone}'")
+                client_phone = self.get_client_phone(request.client_id)
+                print(f"Телефон для клиента ID={request.client_id}: '{client_phone}'")
                 
                 # Создаем QTableWidgetItem с телефоном
-                phone_item = QTableWidgetItem(str(client_phone) if client_phone else "")
-                self.table_widget.setItem(row, 8, phone_item)
+                phone_item = SortableTableItem(str(client_phone) if client_phone else "")
+                self.set_table_item(row, 8, phone_item)
+                
+                # Архивную заявку изменить нельзя: UPDATE requests ее не найдет
+                if request.archived:
+                    if column_count > 9:
+                        self.table_widget.removeCellWidget(row, 9)
+                        self.set_table_item(row, 9, SortableTableItem("📦 В архиве"))
+                    continue
                 
                 # Кнопка действий (колонка 9)
                 if column_count > 9:  # Проверяем, есть ли 10-я колонка
@@ -935,12 +1335,13 @@ class UserWindow(QMainWindow):
                             background-color: #8e44ad;
                         }
                     """)
-                    action_btn.clicked.connect(lambda checked, req_id=request[0]: self.assign_master(req_id))
+                    action_btn.clicked.connect(lambda checked, req_id=request.id: self.assign_master(req_id))
                     self.table_widget.setCellWidget(row, 9, action_btn)
                 else:
                     print(f"⚠️ Нет 10-й колонки для кнопки действий")
             
-            self.table_widget.resizeColumnsToContents()
+            self.finish_table_load()
+            self.resize_columns()
             if self.status_label:
                 self.status_label.setText(f"Загружено заявок: {len(requests)}")
             
@@ -950,6 +1351,7 @@ class UserWindow(QMainWindow):
             traceback.print_exc()
             QMessageBox.warning(self, "Ошибка", f"Не удалось загрузить заявки: {e}")
     
+    @profiled
     def load_client_requests(self):
         """Загружает заявки для заказчика"""
         if self.table_widget is None:
@@ -959,15 +1361,7 @@ class UserWindow(QMainWindow):
         try:
             user_id = self.get_user_id()
             
-            query = """
-            SELECT r.IDrequest, r.startDate, r.orgTechTypeID, r.orgTechModel,
-                   r.problemDescryption, r.requestStatusID, r.masterID, r.completionDate
-            FROM requests r
-            WHERE r.clientID = ?
-            ORDER BY r.startDate DESC
-            """
-            
-            requests = self.execute_db_query(query, (user_id,), fetch=True)
+            requests = self.fetch_role_requests(role_id=4, user_id=user_id)
             
             if requests is None:
                 self.table_widget.setRowCount(0)
@@ -975,34 +1369,37 @@ class UserWindow(QMainWindow):
                     self.status_label.setText("Не удалось загрузить данные")
                 return
             
+            self.table_widget.setSortingEnabled(False)
+            self.longest_cell_texts = {}
             self.table_widget.setRowCount(len(requests))
             
             for row, request in enumerate(requests):
                 # ID
-                self.table_widget.setItem(row, 0, QTableWidgetItem(str(request[0])))
+                self.set_table_item(row, 0, self.make_id_item(request.id, request.status_id, request.tech_type_id, request.master_id, request.start_date))
                 # Дата
-                self.table_widget.setItem(row, 1, QTableWidgetItem(str(request[1])))
+                self.set_table_item(row, 1, SortableTableItem(RequestRecord.text(request.start_date), date_sort_value(request.start_date)))
                 # Тип оборудования
-                type_name = self.get_tech_type_name(request[2])
-                self.table_widget.setItem(row, 2, QTableWidgetItem(type_name))
+                type_name = self.get_tech_type_name(request.tech_type_id)
+                self.set_table_item(row, 2, SortableTableItem(type_name))
                 # Модель
-                self.table_widget.setItem(row, 3, QTableWidgetItem(str(request[3])))
+                self.set_table_item(row, 3, SortableTableItem(RequestRecord.text(request.model)))
                 # Проблема
-                self.table_widget.setItem(row, 4, QTableWidgetItem(str(request[4])))
+                self.set_table_item(row, 4, SortableTableItem(RequestRecord.text(request.problem)))
                 # Статус
-                status_name = self.get_status_name(request[5])
-                self.table_widget.setItem(row, 5, QTableWidgetItem(status_name))
+                status_name = self.get_status_name(request.status_id)
+                self.set_table_item(row, 5, SortableTableItem(status_name))
                 # Мастер
-                master_name = self.get_user_name(request[6])
-                self.table_widget.setItem(row, 6, QTableWidgetItem(master_name))
+                master_name = self.get_user_name(request.master_id)
+                self.set_table_item(row, 6, SortableTableItem(master_name))
                 # Дата завершения
-                self.table_widget.setItem(row, 7, QTableWidgetItem(str(request[7] if request[7] else "")))
+                self.set_table_item(row, 7, SortableTableItem(RequestRecord.text(request.completion_date), date_sort_value(request.completion_date)))
                 
                 # Комментарии
-                comments = self.get_request_comments(request[0])
-                self.table_widget.setItem(row, 8, QTableWidgetItem(comments))
+                comments = self.get_request_comments(request.id)
+                self.set_table_item(row, 8, SortableTableItem(comments))
             
-            self.table_widget.resizeColumnsToContents()
+            self.finish_table_load()
+            self.resize_columns()
             if self.status_label:
                 self.status_label.setText(f"Загружено ваших заявок: {len(requests)}")
             
@@ -1012,23 +1409,16 @@ class UserWindow(QMainWindow):
     
     def get_request_comments(self, request_id):
         """Получает комментарии к заявке"""
-        conn = None
         try:
-            conn = sqlite3.connect(DB_PATH, timeout=10)
-            cursor = conn.cursor()
-            cursor.execute("SELECT message FROM comments WHERE requestID = ?", (request_id,))
-            comments = cursor.fetchall()
-            cursor.close()
+            comments = self.backend.get_request_comments(request_id=request_id)
             
             if comments:
-                return "; ".join([c[0] for c in comments])
+                return "; ".join(comments)
             return "Нет комментариев"
         except:
             return "Нет комментариев"
-        finally:
-            if conn:
-                conn.close()
     
+    @profiled
     def load_general_requests(self):
         """Загружает общие заявки"""
         if self.table_widget is None:
@@ -1036,14 +1426,7 @@ class UserWindow(QMainWindow):
             return
             
         try:
-            query = """
-            SELECT IDrequest, startDate, orgTechTypeID, problemDescryption, requestStatusID
-            FROM requests
-            ORDER BY startDate DESC
-            LIMIT 50
-            """
-            
-            requests = self.execute_db_query(query, fetch=True)
+            requests = self.fetch_role_requests(role_id=None, user_id=0)
             
             if requests is None:
                 self.table_widget.setRowCount(0)
@@ -1051,19 +1434,24 @@ class UserWindow(QMainWindow):
                     self.status_label.setText("Не удалось загрузить данные")
                 return
             
+            self.table_widget.setSortingEnabled(False)
+            self.longest_cell_texts = {}
             self.table_widget.setRowCount(len(requests))
             
             for row, request in enumerate(requests):
-                for col, value in enumerate(request):
-                    if col == 2:  # Тип оборудования
-                        value = self.get_tech_type_name(value)
-                    elif col == 4:  # Статус
-                        value = self.get_status_name(value)
-                    
-                    item = QTableWidgetItem(str(value) if value is not None else "")
-                    self.table_widget.setItem(row, col, item)
+                # ID с ключами фильтра
+                self.set_table_item(row, 0, self.make_id_item(request.id, request.status_id, request.tech_type_id, None, request.start_date))
+                # Дата
+                self.set_table_item(row, 1, SortableTableItem(RequestRecord.text(request.start_date), date_sort_value(request.start_date)))
+                # Тип оборудования
+                self.set_table_item(row, 2, SortableTableItem(self.get_tech_type_name(request.tech_type_id)))
+                # Проблема
+                self.set_table_item(row, 3, SortableTableItem(RequestRecord.text(request.problem)))
+                # Статус
+                self.set_table_item(row, 4, SortableTableItem(self.get_status_name(request.status_id)))
             
-            self.table_widget.resizeColumnsToContents()
+            self.finish_table_load()
+            self.resize_columns()
             if self.status_label:
                 self.status_label.setText(f"Загружено записей: {len(requests)}")
             
@@ -1081,25 +1469,22 @@ class UserWindow(QMainWindow):
             try:
                 # Находим ID статуса
                 status_id = statuses.index(status) + 1
+                completion_date = None
                 
-                query = "UPDATE requests SET requestStatusID = ? WHERE IDrequest = ?"
+                operation = 'change_status'
+                params = (status_id, request_id)
                 
                 # Если статус "Готова к выдаче", ставим дату завершения
                 if status_id == 2:
-                    query = """
-                    UPDATE requests 
-                    SET requestStatusID = ?, completionDate = ?
-                    WHERE IDrequest = ?
-                    """
-                    result = self.execute_db_query(query, (status_id, datetime.now().strftime("%d.%m.%Y"), request_id))
-                else:
-                    result = self.execute_db_query(query, (status_id, request_id))
+                    completion_date = datetime.now().strftime("%d.%m.%Y")
+                    operation = 'complete_request'
+                    params = (status_id, completion_date, request_id)
                 
-                if result is None:
-                    QMessageBox.warning(self, "Ошибка", "Не удалось обновить статус")
-                else:
-                    QMessageBox.information(self, "Успех", "Статус обновлен!")
-                    self.show_role_table()  # Обновляем таблицу
+                # Запись уходит в БД в фоне, таблицу обновляем сразу
+                self.write_queue.enqueue(operation, params, f"Статус заявки №{request_id}: {status}")
+                self.update_table_row(request_id, status_id=status_id, completion_date=completion_date)
+                if self.status_label:
+                    self.status_label.setText(f"Статус заявки №{request_id} обновлен")
                 
             except Exception as e:
                 QMessageBox.critical(self, "Ошибка", f"Не удалось обновить статус: {e}")
@@ -1108,10 +1493,9 @@ class UserWindow(QMainWindow):
         """Назначает мастера на заявку (для оператора)"""
         # Получаем список мастеров
         try:
-            query = "SELECT IDuser, fio FROM users WHERE typeID = 2"
-            masters = self.execute_db_query(query, fetch=True)
+            masters = self.call_backend('get_masters')
             
-            if masters is None:
+            if not masters:
                 QMessageBox.warning(self, "Предупреждение", "Нет доступных мастеров")
                 return
             
@@ -1122,25 +1506,172 @@ class UserWindow(QMainWindow):
             if ok and master_name:
                 master_id = int(master_name.split(" - ")[0])
                 
-                query = "UPDATE requests SET masterID = ?, requestStatusID = 1 WHERE IDrequest = ?"
-                result = self.execute_db_query(query, (master_id, request_id))
-                
-                if result is None:
-                    QMessageBox.warning(self, "Ошибка", "Не удалось назначить мастера")
-                else:
-                    QMessageBox.information(self, "Успех", "Мастер назначен!")
-                    self.show_role_table()  # Обновляем таблицу
+                # Запись уходит в БД в фоне, таблицу обновляем сразу
+                self.write_queue.enqueue('assign_master', (master_id, request_id),
+                                         f"Назначение мастера на заявку №{request_id}")
+                self.update_table_row(request_id, status_id=1, master_id=master_id)
+                if self.status_label:
+                    self.status_label.setText(f"Мастер назначен на заявку №{request_id}")
                 
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Не удалось назначить мастера: {e}")
     
+    def find_column(self, header_text):
+        """Возвращает номер столбца по заголовку или -1"""
+        for col in range(self.table_widget.columnCount()):
+            header_item = self.table_widget.horizontalHeaderItem(col)
+            if header_item and header_item.text() == header_text:
+                return col
+        return -1
+    
+    def update_table_row(self, request_id, status_id=None, master_id=None, completion_date=None):
+        """Обновляет строку заявки в таблице без перезагрузки (оптимистично)"""
+        for row in range(self.table_widget.rowCount()):
+            id_item = self.table_widget.item(row, 0)
+            if id_item is None or getattr(id_item, 'sort_key', None) != request_id:
+                continue
+            
+            row_status, row_type, row_master, row_date = id_item.filter_key or (None, None, None, 0)
+            updates = []
+            if status_id is not None:
+                row_status = status_id
+                updates.append(("Статус", self.get_status_name(status_id), None))
+            if master_id is not None:
+                row_master = master_id
+                updates.append(("Мастер", self.get_user_name(master_id), None))
+            if completion_date is not None:
+                updates.append(("Дата завершения", completion_date, date_sort_value(completion_date)))
+            
+            # Без отключения сортировки строка переместится после первой же ячейки
+            self.table_widget.setSortingEnabled(False)
+            for header_text, text, sort_key in updates:
+                col = self.find_column(header_text)
+                if col >= 0:
+                    self.table_widget.setItem(row, col, SortableTableItem(text, sort_key))
+            self.table_widget.setSortingEnabled(True)
+            id_item.filter_key = (row_status, row_type, row_master, row_date)
+            break
+        self.apply_filters()
+    
+    def on_write_failed(self, description, error):
+        """Сообщает об отклоненном изменении и возвращает таблицу к данным из БД"""
+        QMessageBox.warning(self, "Изменение не сохранено", f"{description}\n\nОшибка: {error}")
+        self.reload_role_table()
+    
+    def on_write_delayed(self, count, error):
+        """Сообщает, что изменения долго не удается сохранить (они остаются в очереди и журнале)"""
+        if self.status_label:
+            self.status_label.setText(f"Не сохранено изменений: {count}, повторяю попытки")
+        QMessageBox.warning(self, "Изменения пока не сохранены",
+                            f"Не удается сохранить изменений: {count}.\n"
+                            "Они не потеряны и будут записаны, когда БД освободится или появится связь.\n\n"
+                            f"Ошибка: {error}")
+    
+    def reload_role_table(self):
+        """Перезагружает открытую таблицу из БД"""
+        self.prefetched_requests = None
+        if self.table_visible:
+            self.table_visible = False
+            self.show_role_table()
+    
+    def closeEvent(self, event):
+        """Дописывает очередь изменений в БД перед закрытием окна"""
+        self.write_queue.stop()
+        if self.maintenance:
+            self.maintenance.stop()
+        super().closeEvent(event)
+    
     def create_new_request(self):
         """Создает новую заявку"""
-        dialog = RequestDialog(self.user_data, self)
+        self.load_reference_data()
+        dialog = RequestDialog(self.user_data, self, client_index=self.client_index,
+                               model_index=self.model_index, tech_types=self.tech_types)
         if dialog.exec_() == QDialog.Accepted:
             QMessageBox.information(self, "Успех", "Заявка создана!")
             self.show_role_table()  # Обновляем таблицу
     
+    def sync_replica(self):
+        """Отправляет изменения из реплики мастера и получает новые (при появлении связи)"""
+        # Сначала дописываем в реплику изменения из очереди записи: иначе они уйдут
+        # только при следующей синхронизации
+        if not self.write_queue.flush():
+            QMessageBox.warning(self, "Синхронизация отложена",
+                                "Не все изменения еще сохранены в реплике. Повторите синхронизацию позже.")
+            return
+        try:
+            summary = self.backend.sync()
+        except (sqlite3.Error, OSError) as e:
+            print(f"⚠️ Синхронизация не удалась: {e}")
+            QMessageBox.warning(self, "Нет связи",
+                                "Центральная БД недоступна. Изменения сохранены и будут отправлены позже.")
+            return
+        except ValueError as e:
+            # Сервер отклонил запрос синхронизации: повтор без исправления не поможет
+            QMessageBox.critical(self, "Синхронизация отклонена", f"{e}\n\nИзменения остаются в реплике.")
+            return
+        
+        if self.status_label:
+            self.status_label.setText(f"Синхронизировано: отправлено {summary['applied']}, "
+                                      f"получено {summary['received']}")
+        if summary['conflicts']:
+            lines = [f"Заявка №{request_id}: {CONFLICT_REASONS.get(reason, reason)}"
+                     for change_id, request_id, reason, status in summary['conflicts']]
+            QMessageBox.warning(self, "Изменения отклонены",
+                                "Эти изменения не применены, в таблице показано текущее состояние:\n"
+                                + "\n".join(lines))
+        self.reload_role_table()
+    
+    def show_sla_panel(self):
+        """Открывает панель просрочек (немодальная, обновляется по таймеру, пока открыта)"""
+        self.load_reference_data()
+        if self.sla_dialog is None:
+            self.sla_dialog = SlaDialog(self.backend, self.tech_types, STATUS_NAMES, self)
+        self.sla_dialog.show()
+        self.sla_dialog.raise_()
+    
+    def import_requests_file(self):
+        """Пакетный прием заявок из CSV в формате requests.csv (одна транзакция, одно обновление таблицы)"""
+        path, _ = QFileDialog.getOpenFileName(self, "Заявки из файла", "", "CSV (*.csv);;Все файлы (*)")
+        if not path:
+            return
+        
+        # Проверка по справочникам сеанса; заказчики, добавленные после входа, - из индекса клиентов
+        self.load_reference_data()
+        self.client_index.refresh(self.backend)
+        client_ids = {user_id for user_id, user in (self.users_by_id or {}).items() if user[3] == CLIENT_TYPE_ID}
+        client_ids |= set(self.client_index.users)
+        try:
+            with open(path, encoding='utf-8-sig', newline='') as csv_file:
+                rows, errors = parse_intake_file(csv_file, set(self.tech_types or {}), client_ids)
+        except (OSError, UnicodeDecodeError) as e:
+            QMessageBox.warning(self, "Ошибка", f"Не удалось прочитать файл: {e}")
+            return
+        
+        error_text = "\n".join(f"Строка {line}: {message}" for line, message in errors[:20])
+        if len(errors) > 20:
+            error_text += f"\n... и еще {len(errors) - 20}"
+        if not rows:
+            QMessageBox.warning(self, "Нет заявок", f"В файле нет заявок для приема.\n{error_text}")
+            return
+        question = f"Принять заявок: {len(rows)}."
+        if errors:
+            question += f"\nСтроки с ошибками будут пропущены ({len(errors)}):\n{error_text}"
+        if QMessageBox.question(self, "Прием заявок из файла", question,
+                                QMessageBox.Yes | QMessageBox.No) != QMessageBox.Yes:
+            return
+        
+        request_ids = self.call_backend('create_requests', rows=rows)
+        if request_ids is None:
+            return
+        print(f"📥 Принято заявок из {path}: {len(request_ids)}, пропущено строк: {len(errors)}")
+        QMessageBox.information(self, "Заявки приняты",
+                                f"Принято заявок: {len(request_ids)} (№{request_ids[0]}-{request_ids[-1]})")
+        # Одна перезагрузка таблицы на весь пакет
+        if self.table_visible:
+            self.reload_role_table()
+        else:
+            self.show_role_table()
+    
     def logout(self):
         """Выход из системы"""
         reply = QMessageBox.question(
@@ -1152,10 +1683,12 @@ class UserWindow(QMainWindow):
         
         if reply == QMessageBox.Yes:
             print("🚪 Выход из системы...")
+            print(f"📈 Блокировки БД за сеанс: {get_lock_stats()}")
             self.close()
 
 if __name__ == "__main__":
     # Сначала проверяем структуру БД
+    configure_database()
     check_database_structure()
     
     # Тестирование
@@ -0,0 +1,281 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Callable, Optional
+
+import database
+from backend import get_backend, ServerUnavailable
+from database import is_locked_error
+
+# Журнал очереди: каждая запись сохраняется на локальный диск до ответа интерфейсу,
+# поэтому при падении программы неотправленные изменения не теряются.
+# У каждого пользователя и каждой БД (файла или сервера) свой журнал (см. journal_path_for)
+WRITE_JOURNAL_PATH = "pending_writes.jsonl"
+
+# Сколько ждать накопления записей перед отправкой и сколько записей в одной транзакции
+FLUSH_INTERVAL = 0.2
+MAX_BATCH_SIZE = 100
+# Пауза перед повтором, если БД так и не освободилась
+LOCKED_RETRY_DELAY = 2.0
+# После стольких неудачных попыток подряд пользователю сообщается, что изменения не сохраняются
+DELAY_NOTIFY_ATTEMPTS = 5
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """
+    Запись не отклонена, а не дошла: БД занята или нет связи с сервером.
+    Остальные ошибки (в том числе отказ сервера 4xx и ошибки доступа к файлу) повтором не исправить.
+    """
+    return is_locked_error(error) or isinstance(error, ServerUnavailable)
+
+
+class JournalLocked(RuntimeError):
+    """Журналом уже владеет другая запущенная программа (тот же пользователь и та же БД)"""
+
+
+def journal_path_for(user_id, backend=None) -> str:
+    """
+    Путь журнала для пользователя и БД, с которой работает бэкенд (адрес сервера
+    или путь к файлу БД): pending_writes-<пользователь>-<хеш БД>.jsonl рядом с WRITE_JOURNAL_PATH.
+    """
+    target = getattr(backend, 'url', None) or os.path.abspath(database.DB_PATH)
+    digest = hashlib.sha1(target.encode('utf-8')).hexdigest()[:10]
+    base, extension = os.path.splitext(WRITE_JOURNAL_PATH)
+    return f"{base}-{user_id}-{digest}{extension}"
+
+
+def lock_file(handle) -> bool:
+    """Берет исключительную блокировку открытого файла без ожидания; False - файл заблокирован"""
+    try:
+        if os.name == 'nt':
+            import msvcrt
+            msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return False
+    return True
+
+
+class PendingWrite:
+    """
+    Одна отложенная запись: операция из WRITE_OPERATIONS, параметры и описание для пользователя.
+    key - уникальный ключ записи: БД запоминает примененные ключи (applied_writes)
+    и пропускает повтор записи, уже зафиксированной до сбоя.
+    """
+    __slots__ = ('write_id', 'operation', 'params', 'description', 'key')
+
+    def __init__(self, write_id, operation, params, description, key=None):
+        self.write_id = write_id
+        self.operation = operation
+        self.params = params
+        self.description = description
+        self.key = key
+
+    def to_json(self):
+        return json.dumps({'id': self.write_id, 'operation': self.operation, 'params': list(self.params),
+                           'description': self.description, 'key': self.key},
+                          ensure_ascii=False)
+
+
+class WriteBehindQueue:
+    """
+    Очередь отложенной записи.
+
+    Интерфейс ставит запись в очередь и сразу продолжает работу, а фоновый поток
+    собирает накопившиеся записи в одну транзакцию. Если транзакция не прошла,
+    записи применяются по одной, и о каждой неудачной сообщается через on_error.
+    Записи применяются через бэкенд (локальная БД или сервер). Пока БД занята или
+    сервер недоступен, пачка повторяется каждые LOCKED_RETRY_DELAY секунд и остается
+    в журнале; после DELAY_NOTIFY_ATTEMPTS неудач подряд вызывается on_delay.
+    После сбоя журнал воспроизводится повторно; записи, зафиксированные в БД
+    до сбоя, узнаются по ключу и не применяются второй раз (в том числе не
+    дублируются события request_events).
+    """
+
+    def __init__(self, backend=None, journal_path: str = WRITE_JOURNAL_PATH,
+                 on_error: Optional[Callable[[PendingWrite, Exception], None]] = None,
+                 on_commit: Optional[Callable[[list], None]] = None,
+                 on_delay: Optional[Callable[[int, Exception], None]] = None):
+        self.backend = backend or get_backend()
+        self.journal_path = journal_path
+        self.on_error = on_error
+        self.on_commit = on_commit
+        self.on_delay = on_delay
+        # Неудачные попытки подряд (БД занята, нет связи) и последняя ошибка
+        self.failed_attempts = 0
+        self.last_error = None
+
+        self.pending = []
+        self.next_id = 1
+        self.condition = threading.Condition()
+        self.journal_lock = threading.Lock()
+        self.stopping = False
+        self.thread = None
+
+        self.journal = None
+        self.journal_owner = None
+        self.acquire_journal()
+        self.restore_journal()
+
+    def acquire_journal(self):
+        """
+        Блокирует журнал на время работы очереди (файл <журнал>.lock). Вторая программа
+        с тем же журналом получает JournalLocked: иначе она воспроизвела бы или
+        обнулила чужие неотправленные записи. Блокировка снимается при завершении процесса.
+        """
+        owner = open(self.journal_path + ".lock", 'a')
+        if not lock_file(owner):
+            owner.close()
+            raise JournalLocked(f"Журнал изменений {self.journal_path} используется другой запущенной программой")
+        self.journal_owner = owner
+
+    def restore_journal(self):
+        """Загружает из журнала записи, не примененные в прошлом сеансе"""
+        restored = {}
+        done = set()
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, encoding='utf-8') as journal:
+                for line in journal:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Недописанная строка при аварийном завершении
+                        continue
+                    if 'done' in entry:
+                        done.add(entry['done'])
+                    else:
+                        restored[entry['id']] = PendingWrite(entry['id'], entry['operation'],
+                                                             tuple(entry['params']), entry['description'],
+                                                             entry.get('key'))
+
+        self.pending = [write for write_id, write in sorted(restored.items()) if write_id not in done]
+        self.next_id = max(restored, default=0) + 1
+
+        # Переписываем журнал только с незавершенными записями
+        with open(self.journal_path, 'w', encoding='utf-8') as journal:
+            for write in self.pending:
+                journal.write(write.to_json() + "\n")
+            journal.flush()
+            os.fsync(journal.fileno())
+        self.journal = open(self.journal_path, 'a', encoding='utf-8')
+
+        if self.pending:
+            print(f"📥 Восстановлено неотправленных изменений: {len(self.pending)}")
+
+    def append_journal(self, lines):
+        """Дописывает строки в журнал и сбрасывает их на диск"""
+        with self.journal_lock:
+            self.journal.write("".join(line + "\n" for line in lines))
+            self.journal.flush()
+            os.fsync(self.journal.fileno())
+
+    def start(self):
+        """Запускает фоновый поток записи"""
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name="write-behind", daemon=True)
+            self.thread.start()
+
+    def enqueue(self, operation, params, description) -> int:
+        """Ставит запись в очередь и возвращает ее номер"""
+        with self.condition:
+            write = PendingWrite(self.next_id, operation, tuple(params), description, uuid.uuid4().hex)
+            self.next_id += 1
+            self.append_journal([write.to_json()])
+            self.pending.append(write)
+            self.condition.notify()
+        return write.write_id
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Ждет, пока фоновый поток запишет всю очередь; возвращает False по таймауту"""
+        with self.condition:
+            self.condition.notify()
+            return self.condition.wait_for(lambda: not self.pending, timeout)
+
+    def stop(self, timeout: float = 10.0):
+        """Отправляет оставшиеся записи и останавливает фоновый поток"""
+        with self.condition:
+            self.stopping = True
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
+        with self.journal_lock:
+            self.journal.close()
+        self.journal_owner.close()
+
+    def run(self):
+        """Основной цикл фонового потока"""
+        while True:
+            with self.condition:
+                while not self.pending and not self.stopping:
+                    self.condition.wait()
+                if not self.pending and self.stopping:
+                    return
+
+            # Даем накопиться записям, пришедшим почти одновременно
+            if not self.stopping:
+                time.sleep(FLUSH_INTERVAL)
+
+            with self.condition:
+                batch = self.pending[:MAX_BATCH_SIZE]
+
+            if self.write_batch(batch):
+                self.failed_attempts = 0
+                continue
+            if self.stopping:
+                # Остаток очереди сохранен в журнале и уйдет в следующем сеансе
+                return
+            self.failed_attempts += 1
+            # Сообщаем один раз за серию неудач; записи продолжают повторяться
+            if self.failed_attempts == DELAY_NOTIFY_ATTEMPTS and self.on_delay:
+                self.on_delay(len(self.pending), self.last_error)
+            time.sleep(LOCKED_RETRY_DELAY)
+
+    def write_batch(self, batch) -> bool:
+        """Записывает пачку в одной транзакции; возвращает False, если БД занята или сервер недоступен"""
+        def apply(writes):
+            self.backend.apply_writes(writes=[(write.operation, write.params, write.key) for write in writes])
+
+        finished = []
+        try:
+            apply(batch)
+            finished = batch
+        except (sqlite3.Error, ValueError, OSError) as e:
+            if is_retryable_error(e):
+                print(f"⚠️ БД занята или сервер недоступен, изменения остаются в очереди: {len(batch)} ({e})")
+                self.last_error = e
+                return False
+            # Транзакция откатилась целиком: находим неудачные записи по одной
+            print(f"⚠️ Ошибка пакетной записи, применяю изменения по одной: {e}")
+            for write in batch:
+                try:
+                    apply([write])
+                except (sqlite3.Error, ValueError, OSError) as single_error:
+                    if is_retryable_error(single_error):
+                        self.last_error = single_error
+                        break
+                    print(f"❌ Изменение отклонено ({write.description}): {single_error}")
+                    if self.on_error:
+                        self.on_error(write, single_error)
+                finished.append(write)
+
+        if finished:
+            self.append_journal([json.dumps({'done': write.write_id}) for write in finished])
+            with self.condition:
+                finished_ids = {write.write_id for write in finished}
+                self.pending = [write for write in self.pending if write.write_id not in finished_ids]
+                self.condition.notify_all()
+                # Очередь опустела: журнал больше не нужен, обнуляем его
+                if not self.pending:
+                    with self.journal_lock:
+                        self.journal.seek(0)
+                        self.journal.truncate()
+            if self.on_commit:
+                self.on_commit(finished)
+        return len(finished) == len(batch)